@@ -0,0 +1,196 @@
+import argparse
+import asyncio
+import json
+
+from actorle_solver import make_actor_name_index, load_filmography_index, Solver
+from cli import SmartFormatter
+from clue_cache import ClueCache, DEFAULT_CLUE_CACHE_SIZE
+from data_store import read_data_table, is_data_store, get_dataset_version, MOVIES_TABLE, PERFORMANCES_TABLE, \
+    ACTORS_TABLE
+from movie_clues import MovieClue
+
+HTTP_REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    500: 'Internal Server Error',
+}
+
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser(description="Run a long-lived Actorle solving service. The IMDb data is "
+                                                     "loaded once at start-up, and puzzles are then solved by "
+                                                     "POSTing their clues as JSON to /solve.",
+                                         formatter_class=SmartFormatter)
+    arg_parser.add_argument('-mf',
+                            '--movies-file',
+                            help="R|the full path to a title.basics.tsv.gz file written by imdb_data_grabber.py.\n"
+                                 "Mandatory unless --data-store is set.")
+    arg_parser.add_argument('-af',
+                            '--actors-file',
+                            help="R|the full path to a name.basics.tsv.gz file written by imdb_data_grabber.py.\n"
+                                 "Mandatory unless --data-store is set.")
+    arg_parser.add_argument('-pf',
+                            '--performances-file',
+                            help="R|the full path to a title.principals.tsv.gz file written by "
+                                 "imdb_data_grabber.py.\n"
+                                 "Mandatory unless --data-store is set.")
+    arg_parser.add_argument('-ds',
+                            '--data-store',
+                            help="R|the full path to a binary data store directory written by "
+                                 "imdb_data_grabber.py.\n"
+                                 "Optional; the TSV files are used as a fallback.")
+    arg_parser.add_argument('--host',
+                            help='The interface to listen on. Optional, default is 127.0.0.1.',
+                            default='127.0.0.1')
+    arg_parser.add_argument('-p',
+                            '--port',
+                            help='The TCP port to listen on. Optional, default is 8080.',
+                            type=int,
+                            default=8080)
+    arg_parser.add_argument('-u',
+                            '--unix-socket',
+                            help='R|the path of a Unix domain socket to listen on instead of a TCP port.\n'
+                                 'Optional.')
+    arg_parser.add_argument('-cs',
+                            '--clue-cache-size',
+                            help='R|the number of entries to keep in the cache of what each clue solved so far\n'
+                                 'matched, shared by every solve. Optional, default is {}.'
+                                 .format(DEFAULT_CLUE_CACHE_SIZE),
+                            type=int,
+                            default=DEFAULT_CLUE_CACHE_SIZE)
+    args = arg_parser.parse_args()
+    data_files = [args.movies_file, args.actors_file, args.performances_file]
+    if not args.data_store and not all(data_files):
+        arg_parser.error("the --movies-file, --actors-file and --performances-file arguments are required "
+                         "when no --data-store is given")
+    return vars(args)
+
+
+def parse_clues_json(clues_json):
+    return [MovieClue(title_pattern=clue['title_pattern'].strip(),
+                      year=str(clue['year']),
+                      genre_list=clue.get('genre_list', ''),
+                      score=float(clue['score']))
+            for clue in clues_json]
+
+
+class PuzzleSolvingService:
+
+    def __init__(self, movies_df, performances_df, actor_names_df, dataset_version=None,
+                 clue_cache_size=DEFAULT_CLUE_CACHE_SIZE, data_store=None):
+        # a quiet solver, as nobody reads the console output of each solve
+        # the filmography index is loaded, or built, up front, so the first solve doesn't pay for it
+        self.solver = Solver(movies_df, performances_df, make_actor_name_index(actor_names_df),
+                             clue_cache=ClueCache(clue_cache_size), dataset_version=dataset_version,
+                             filmography_index=load_filmography_index(movies_df, performances_df, data_store))
+        # solves currently being computed, keyed by their clues and parameters
+        self.in_flight_solves = {}
+        self.computed_solves = 0
+
+    def solve_now(self, puzzle_clues, num_options, rating_tolerance):
+        solve_result = self.solver.solve(puzzle_clues, num_options, rating_tolerance)
+        self.computed_solves += 1
+        return solve_result
+
+    async def solve(self, puzzle_clues, num_options=3, rating_tolerance=0.1):
+        solve_key = (tuple(puzzle_clues), num_options, rating_tolerance)
+        solve_future = self.in_flight_solves.get(solve_key)
+        if solve_future is None:
+            loop = asyncio.get_running_loop()
+            solve_future = loop.run_in_executor(None, self.solve_now, puzzle_clues, num_options, rating_tolerance)
+            self.in_flight_solves[solve_key] = solve_future
+            solve_future.add_done_callback(lambda _: self.in_flight_solves.pop(solve_key, None))
+        else:
+            print("Coalescing request with an identical in-flight solve")
+        # shielded, so one client going away does not cancel the solve for everybody else waiting on it
+        return await asyncio.shield(solve_future)
+
+    async def route(self, method, path, body):
+        if path == '/health':
+            return 200, {
+                'status': 'ok',
+                'movies': self.solver.movies_df.shape[0],
+                'performances': self.solver.performances_df.shape[0],
+                'actors': self.solver.actor_name_index[0].shape[0],
+                'computed_solves': self.computed_solves,
+                'clue_cache': self.solver.clue_cache.get_stats(),
+            }
+        if path != '/solve':
+            return 404, {'error': "No such resource {}".format(path)}
+        if method != 'POST':
+            return 405, {'error': "Use POST to solve a puzzle"}
+        try:
+            request = json.loads(body)
+            puzzle_clues = parse_clues_json(request['clues'])
+            num_options = int(request.get('num_options', 3))
+            rating_tolerance = float(request.get('rating_tolerance', 0.1))
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            return 400, {'error': "Malformed solve request: {}".format(e)}
+        if not puzzle_clues:
+            return 400, {'error': "A puzzle needs at least one clue"}
+        return 200, await self.solve(puzzle_clues, num_options, rating_tolerance)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            method, path, _ = request_line.decode('latin-1').split(' ', 2)
+            headers = {}
+            while True:
+                header_line = await reader.readline()
+                if header_line in (b'\r\n', b'\n', b''):
+                    break
+                name, value = header_line.decode('latin-1').split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get('content-length', 0)))
+            status, payload = await self.route(method, path, body)
+        except (ValueError, asyncio.IncompleteReadError) as e:
+            status, payload = 400, {'error': "Malformed HTTP request: {}".format(e)}
+        except Exception as e:
+            status, payload = 500, {'error': str(e)}
+        response_body = json.dumps(payload).encode('utf-8')
+        writer.write("HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n"
+                     "Connection: close\r\n\r\n".format(status, HTTP_REASONS[status], len(response_body))
+                     .encode('latin-1'))
+        writer.write(response_body)
+        await writer.drain()
+        writer.close()
+
+
+def load_solving_service(movies_file, performances_file, actors_file, data_store=None,
+                         clue_cache_size=DEFAULT_CLUE_CACHE_SIZE):
+    print("Loading IMDb movie data from {}".format(data_store or movies_file))
+    movies_df = read_data_table(MOVIES_TABLE, movies_file, data_store)
+    print("Loading IMDb actor performances data from {}".format(data_store or performances_file))
+    performances_df = read_data_table(PERFORMANCES_TABLE, performances_file, data_store)
+    print("Loading IMDb actor names data from {}".format(data_store or actors_file))
+    actor_names_df = read_data_table(ACTORS_TABLE, actors_file, data_store)
+    print("Loaded {:,} movies, {:,} performances and {:,} actors"
+          .format(movies_df.shape[0], performances_df.shape[0], actor_names_df.shape[0]))
+    if not is_data_store(data_store):
+        return PuzzleSolvingService(movies_df, performances_df, actor_names_df, clue_cache_size=clue_cache_size)
+    # the characters played are left mapped in the store until a solve shows them
+    return PuzzleSolvingService(movies_df, performances_df, actor_names_df, get_dataset_version(data_store),
+                                clue_cache_size, data_store)
+
+
+async def serve(service, host='127.0.0.1', port=8080, unix_socket=None):
+    if unix_socket:
+        server = await asyncio.start_unix_server(service.handle_connection, path=unix_socket)
+        print("Listening for puzzles on the Unix socket {}".format(unix_socket))
+    else:
+        server = await asyncio.start_server(service.handle_connection, host=host, port=port)
+        print("Listening for puzzles on http://{}:{}/solve".format(host, port))
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    solving_service = load_solving_service(args['movies_file'],
+                                           args['performances_file'],
+                                           args['actors_file'],
+                                           args['data_store'],
+                                           args['clue_cache_size'])
+    asyncio.run(serve(solving_service, args['host'], args['port'], args['unix_socket']))
@@ -1,143 +1,957 @@
-import collections
+import contextlib
+import contextvars
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
 
-import pandas as pd
+import numpy as np
 
 from cli import parse_cli_args
-from movie_clues import write_movie_clues_file, read_puzzle_clues, make_movie_title_regex, movie_title_to_clues_pattern
+from clue_cache import ClueCache
+from data_store import read_data_table, read_table, read_index, format_imdb_id, is_data_store, map_actor_names, \
+    make_incidence_arrays, make_filmography_arrays, get_dataset_version, encode_column, \
+    year_to_number, get_string_values, has_string_column, MOVIES_TABLE, PERFORMANCES_TABLE, ACTORS_TABLE, \
+    INCIDENCE_INDEX, FILMOGRAPHY_INDEX
+from movie_clues import write_movie_clues_file, read_movie_clues_file, read_puzzle_clues, normalise_title_pattern, \
+    movie_title_to_clues_pattern
+from profiler import profile_stage, profiling
+from result_cache import ResultCache, get_data_version, get_data_source
 
+NO_INDEXED_TITLES = (np.empty(0, dtype=np.int64), np.empty(0))
+# the fields of a batch result that describe the run of the solve, rather than its answer, so are never cached
+BATCH_RUN_FIELDS = ['puzzle', 'clues_file', 'timings', 'duration_seconds', 'cached']
 
-def get_actors_in_movies(performances_dataframe, movie_ids):
-    matching_actors = performances_dataframe[performances_dataframe.tconst.isin(movie_ids.tconst)]
-    print("Found {} actors for these {} movies".format(matching_actors.shape[0], len(movie_ids)))
-    return matching_actors[['nconst', 'characters']]
+# whether the solver prints its working as it goes; quiet solvers switch it off for just their own solves
+solver_logging = contextvars.ContextVar('solver_logging', default=True)
 
 
-def get_matching_movies_dataframe(titles_data_frame, movie_clue, rating_match_tolerance):
-    matches_data_frame = titles_data_frame[titles_data_frame.startYear == movie_clue.year]
+def log(message, *format_args):
+    # the message is only formatted when it is printed, so a quiet solve does not pay for it
+    if solver_logging.get():
+        print(message.format(*format_args))
+
+
+@contextlib.contextmanager
+def solver_logging_enabled(enabled):
+    reset_token = solver_logging.set(enabled)
+    try:
+        yield
+    finally:
+        solver_logging.reset(reset_token)
+
+
+def make_title_pattern_index(titles_data_frame, movie_years=None):
+    with profile_stage('build_title_index') as stage:
+        # positions are always rows of the whole titles_data_frame, even when only some years are indexed. The
+        # index is keyed by numeric year, whether the years were read in as numbers or not.
+        years = encode_column('year', titles_data_frame['startYear'])
+        if movie_years is None:
+            indexed_positions = np.arange(titles_data_frame.shape[0])
+        else:
+            indexed_positions = np.flatnonzero(np.isin(years, [year_to_number(year) for year in movie_years]))
+        if has_string_column(titles_data_frame, 'titlePattern'):
+            title_patterns = get_string_values(titles_data_frame, 'titlePattern', indexed_positions)
+        else:
+            log("No precomputed title patterns available - computing them for {:,} titles...", len(indexed_positions))
+            title_patterns = np.array([movie_title_to_clues_pattern(str(title)) for title in
+                                       get_string_values(titles_data_frame, 'primaryTitle', indexed_positions)],
+                                      dtype=object)
+        ratings = titles_data_frame['averageRating'].to_numpy()
+        grouped_titles = titles_data_frame.iloc[indexed_positions].groupby([title_patterns, years[indexed_positions]])
+        title_index = {}
+        for key, positions in grouped_titles.indices.items():
+            # each group is kept in rating order, so a clue's rating tolerance window is one contiguous slice of it. The
+            # data store holds movies sorted by (year, rating), so its groups come out of groupby in order already.
+            positions = indexed_positions[positions]
+            rating_order = np.argsort(ratings[positions], kind='stable')
+            title_index[key] = (positions[rating_order], ratings[positions[rating_order]])
+        stage['rows'] = len(indexed_positions)
+    return title_index
+
+
+def get_rating_window(sorted_ratings, rating_floor, rating_ceiling):
+    # compared at the precision the ratings are held at, as a float32 6.8 is a little over the float 6.8
+    rating_floor, rating_ceiling = sorted_ratings.dtype.type(rating_floor), sorted_ratings.dtype.type(rating_ceiling)
+    return slice(np.searchsorted(sorted_ratings, rating_floor, side='left'),
+                 np.searchsorted(sorted_ratings, rating_ceiling, side='right'))
+
+
+def get_matching_movie_positions(titles_data_frame, movie_clue, rating_match_tolerance, title_index):
+    title_pattern = normalise_title_pattern(movie_clue.title_pattern)
+    positions, ratings = title_index.get((title_pattern, year_to_number(movie_clue.year)), NO_INDEXED_TITLES)
+    log("Found {} movies from the year {} matching the pattern '{}'", len(positions), movie_clue.year, title_pattern)
     rating_floor = round(movie_clue.score - rating_match_tolerance, 2)
     rating_ceiling = round(movie_clue.score + rating_match_tolerance, 2)
-    matches_data_frame = matches_data_frame[matches_data_frame.averageRating.between(
-        rating_floor, rating_ceiling, inclusive="both")]
-    print("Found {} movies from the year {} with review score between {} and {}"
-          .format(matches_data_frame.shape[0],
-                  movie_clue.year,
-                  rating_floor,
-                  rating_ceiling))
-    match_pattern = make_movie_title_regex(movie_clue.title_pattern)
-    query = "primaryTitle.str.match('{}')".format(match_pattern)
-    print("Filtering remaining movies with query '{}'".format(query))
-    results = matches_data_frame.query(query)
-    sample_size = min(results.shape[0], 3)
-    print("{} Matches for pattern '{}', year {}, review score {} (Sample: {})"
-          .format(results.shape[0],
-                  movie_clue.title_pattern,
-                  movie_clue.year,
-                  movie_clue.score,
-                  results['primaryTitle'].sample(n=sample_size).to_list()))
-    return results[['tconst', 'primaryTitle']]
-
-
-def filter_movies_by_release_date(movies_file, movies_clues):
-    print("Reading movies in from {}...".format(movies_file))
-    titles_data_frame = pd.read_csv(movies_file, sep='\t')
+    matching_positions = positions[get_rating_window(ratings, rating_floor, rating_ceiling)]
+    if solver_logging.get():
+        sample_size = min(len(matching_positions), 3)
+        log("{} Matches for pattern '{}', year {}, review score between {} and {} (Sample: {})",
+            len(matching_positions),
+            movie_clue.title_pattern,
+            movie_clue.year,
+            rating_floor,
+            rating_ceiling,
+            get_string_values(titles_data_frame, 'primaryTitle',
+                              np.random.choice(matching_positions, size=sample_size, replace=False)).tolist())
+    return matching_positions
+
+
+def get_clue_cache_key(movie_clue, rating_match_tolerance, dataset_version):
+    # clues that differ only in the spacing of their pattern or year, or in a score and tolerance giving the same rating
+    # window, have the same candidate movies
+    return (dataset_version,
+            normalise_title_pattern(movie_clue.title_pattern),
+            year_to_number(movie_clue.year),
+            round(movie_clue.score - rating_match_tolerance, 2),
+            round(movie_clue.score + rating_match_tolerance, 2))
+
+
+def get_matching_movies_dataframe(titles_data_frame, movie_clue, rating_match_tolerance, title_index):
+    # the index is built by the caller, once for all of its clues, as building it is far slower than a lookup
+    matching_positions = get_matching_movie_positions(titles_data_frame, movie_clue, rating_match_tolerance,
+                                                      title_index)
+    return titles_data_frame.iloc[matching_positions][['tconst']] \
+        .assign(primaryTitle=get_string_values(titles_data_frame, 'primaryTitle', matching_positions))
+
+
+def filter_movies_by_release_date(movies_file, movies_clues, data_store=None):
+    import pandas as pd
+    movie_years = set([year_to_number(mv.year) for mv in movies_clues])
+    log("Reading movies from the years {} in from {}...", movie_years, data_store or movies_file)
+    # a data store only reads the partitions for the clue years, whereas the TSV file is read in full and filtered
+    with profile_stage('read_movies') as stage:
+        titles_data_frame = read_data_table(MOVIES_TABLE, movies_file, data_store, years=movie_years)
+        stage['rows'] = titles_data_frame.shape[0]
     pd.set_option('display.max_columns', None)
-    print("Read in {:,} titles".format(titles_data_frame.shape[0]))
+    log("Read in {:,} titles", titles_data_frame.shape[0])
 
-    movie_years = set([mv.year for mv in movies_clues])
-    print("Filtering out movies NOT from the years {}...".format(movie_years))
-    titles_data_frame = titles_data_frame[titles_data_frame.startYear.isin(movie_years)]
-    print("Filtered down to {:,} movie titles".format(titles_data_frame.shape[0]))
+    log("Filtering out movies NOT from the years {}...", movie_years)
+    with profile_stage('filter_movie_years') as stage:
+        titles_data_frame = titles_data_frame[titles_data_frame.startYear.isin(movie_years)]
+        stage['rows'] = titles_data_frame.shape[0]
+    log("Filtered down to {:,} movie titles", titles_data_frame.shape[0])
 
     return titles_data_frame
 
 
-def get_candidate_performances(performances_data_file, movies_df):
-    actors_data_frame = pd.read_csv(performances_data_file, sep='\t')
-    print("Read in data on {:,} performances".format(actors_data_frame.shape[0]))
+def get_candidate_performances(performances_data_file, movies_df, data_store=None):
+    # the performances are partitioned by the release year of their movie, just like the movies themselves
+    with profile_stage('read_performances') as stage:
+        actors_data_frame = read_data_table(PERFORMANCES_TABLE, performances_data_file, data_store,
+                                            years=set(movies_df.startYear))
+        stage['rows'] = actors_data_frame.shape[0]
+    log("Read in data on {:,} performances", actors_data_frame.shape[0])
 
-    print("Filtering out performances NOT in one of the {:,} candidate movies...".format(movies_df.shape[0]))
-    actors_data_frame = actors_data_frame[actors_data_frame.tconst.isin(movies_df.tconst)]
-    print("Filtered down to {:,} performances".format(actors_data_frame.shape[0]))
+    log("Filtering out performances NOT in one of the {:,} candidate movies...", movies_df.shape[0])
+    with profile_stage('filter_performances') as stage:
+        actors_data_frame = actors_data_frame[actors_data_frame.tconst.isin(movies_df.tconst)]
+        stage['rows'] = actors_data_frame.shape[0]
+    log("Filtered down to {:,} performances", actors_data_frame.shape[0])
 
     return actors_data_frame
 
 
-def get_most_likely_actors_for_clues(puzzle_clues, movies_data_frame, performances_df, num_options, rating_tolerance):
-    print("\nWorking through the clues...")
-    all_potential_performances = []
-    for clue in puzzle_clues:
-        print('----------------------------')
-        print("Looking for movie matches for {}".format(clue))
-        matching_movies = get_matching_movies_dataframe(movies_data_frame, clue, rating_tolerance)
-        actors_ids = get_actors_in_movies(performances_df, matching_movies)
-        all_potential_performances.extend(actors_ids.nconst.tolist())
-    print('----------------------------')
-    print("Made a list of {:,} individual movie performances from all the clues"
-          .format(len(all_potential_performances)))
-    return collections.Counter(all_potential_performances).most_common(num_options)
-
-
-def get_actor_name(actor_id, actor_names_df):
-    return actor_names_df[actor_names_df.nconst == actor_id].iloc[0]['primaryName']
-
-
-def get_matching_movies_for_actor(movie_clues, actor_id, performances_df, movies_df):
-    all_actor_performances = performances_df[performances_df.nconst == actor_id][['tconst', 'characters']]
-    actor_movies = \
-        movies_df[movies_df.tconst.isin(all_actor_performances['tconst'])][['tconst', 'primaryTitle', 'startYear']]
-    actor_movies = pd.merge(all_actor_performances, actor_movies, on=['tconst'])
-    clue_title_patterns = set([clue.title_pattern for clue in movie_clues])
-    filtered_movie_titles = [title for title in actor_movies['primaryTitle'].tolist()
-                             if movie_title_to_clues_pattern(title) in clue_title_patterns]
-    actor_movies = actor_movies[actor_movies['primaryTitle'].isin(filtered_movie_titles)][['primaryTitle',
-                                                                                           'startYear',
-                                                                                           'characters']]
-    actor_movies = actor_movies.rename(columns={
-        'primaryTitle': 'Movie',
-        'startYear': 'Year',
-        'characters': 'Character'
-    })
-    return actor_movies.sort_values(by=['Year']).reset_index(drop=True)
+def make_incidence_matrix(movies_df, performances_df):
+    # rows are actors (in nconst order) and columns are the rows of movies_df, each cell counting performances
+    with profile_stage('build_incidence_matrix') as stage:
+        stage['rows'] = performances_df.shape[0]
+        return incidence_matrix_from_arrays(make_incidence_arrays(movies_df['tconst'].to_numpy(),
+                                                                  performances_df['tconst'].to_numpy(),
+                                                                  performances_df['nconst'].to_numpy()),
+                                            movies_df.shape[0])
 
 
-if __name__ == '__main__':
-    args = parse_cli_args()
+def incidence_matrix_from_arrays(incidence_arrays, number_of_movies):
+    import scipy.sparse
+    # the arrays are used as they are, so a matrix over memory-mapped arrays stays mapped
+    number_of_actors = len(incidence_arrays['actor_ids'])
+    incidence_matrix = scipy.sparse.csr_matrix(
+        (incidence_arrays['data'], incidence_arrays['indices'], incidence_arrays['indptr']),
+        shape=(number_of_actors, number_of_movies),
+        copy=False)
+    movie_incidence_matrix = scipy.sparse.csr_matrix(
+        (incidence_arrays['movie_data'], incidence_arrays['movie_indices'], incidence_arrays['movie_indptr']),
+        shape=(number_of_movies, number_of_actors),
+        copy=False)
+    if solver_logging.get():
+        log("Built a {:,} actor x {:,} movie incidence matrix holding {:,} performances",
+            incidence_matrix.shape[0], incidence_matrix.shape[1], incidence_matrix.sum())
+    return incidence_arrays['actor_ids'], incidence_matrix, movie_incidence_matrix
+
+
+def get_top_scoring_actors(actor_ids, actor_scores, num_options):
+    candidate_rows = np.flatnonzero(actor_scores)
+    # ties are broken by nconst, folded into one sort key so the top-k selection is deterministic
+    sort_keys = -actor_scores[candidate_rows].astype(np.int64) * len(actor_ids) + candidate_rows
+    if len(candidate_rows) > num_options:
+        top_k = np.argpartition(sort_keys, num_options - 1)[:num_options]
+        candidate_rows, sort_keys = candidate_rows[top_k], sort_keys[top_k]
+    ranked_rows = candidate_rows[np.argsort(sort_keys)]
+    return [(int(actor_ids[row]), int(actor_scores[row])) for row in ranked_rows]
+
+
+def get_clue_scores(movie_incidence_matrix, matching_positions):
+    # only the rows of the matching movies are touched, however many actors and movies there are in total
+    clue_cells = movie_incidence_matrix[matching_positions]
+    return np.bincount(clue_cells.indices, weights=clue_cells.data,
+                       minlength=movie_incidence_matrix.shape[1]).astype(np.int64)
+
+
+def get_clue_scores_for_actors(incidence_matrix, actor_rows, matching_positions):
+    # only the filmographies of the given actors are touched, however many movies match the clue
+    start_cells = incidence_matrix.indptr[actor_rows]
+    filmography_lengths = incidence_matrix.indptr[actor_rows + 1] - start_cells
+    filmography_cells = np.repeat(start_cells - np.cumsum(filmography_lengths) + filmography_lengths,
+                                  filmography_lengths) + np.arange(filmography_lengths.sum())
+    in_matching_movies = np.isin(incidence_matrix.indices[filmography_cells], matching_positions)
+    filmography_owners = np.repeat(np.arange(len(actor_rows)), filmography_lengths)
+    return np.bincount(filmography_owners[in_matching_movies],
+                       weights=incidence_matrix.data[filmography_cells][in_matching_movies],
+                       minlength=len(actor_rows)).astype(np.int64)
+
+
+def get_sparse_clue_scores(movie_incidence_matrix, matching_positions):
+    # just the actors who performed in the candidate movies, which is all that needs keeping between solves
+    clue_scores = get_clue_scores(movie_incidence_matrix, matching_positions)
+    scored_rows = np.flatnonzero(clue_scores)
+    return scored_rows, clue_scores[scored_rows]
+
+
+def get_sparse_clue_scores_for_actors(sparse_clue_scores, actor_rows):
+    scored_rows, scores = sparse_clue_scores
+    if not len(scored_rows):
+        return np.zeros(len(actor_rows), dtype=np.int64)
+    found_at = np.minimum(np.searchsorted(scored_rows, actor_rows), len(scored_rows) - 1)
+    return np.where(scored_rows[found_at] == actor_rows, scores[found_at], 0)
+
+
+def get_kth_best_score(actor_scores, num_options):
+    scored = actor_scores[actor_scores > 0]
+    if len(scored) < num_options:
+        return 0
+    return np.partition(scored, len(scored) - num_options)[len(scored) - num_options]
+
+
+def find_clue_candidates(puzzle_clues, movies_data_frame, rating_tolerance, title_index, clue_cache=None,
+                         dataset_version=None):
+    clue_candidates = []
+    with profile_stage('match_titles') as stage:
+        for clue in puzzle_clues:
+            log('----------------------------')
+            log("Looking for movie matches for {}", clue)
+            if clue_cache is None:
+                matching_positions = get_matching_movie_positions(movies_data_frame, clue, rating_tolerance,
+                                                                  title_index)
+            else:
+                cache_key = ('candidate_movies',) + get_clue_cache_key(clue, rating_tolerance, dataset_version)
+                matching_positions = clue_cache.get(cache_key)
+                if matching_positions is None:
+                    matching_positions = get_matching_movie_positions(movies_data_frame, clue, rating_tolerance,
+                                                                      title_index)
+                    clue_cache.put(cache_key, matching_positions)
+                else:
+                    log("Reusing the {} cached candidate movies", len(matching_positions))
+            clue_candidates.append((clue, matching_positions))
+        stage['rows'] = sum(len(candidates) for _, candidates in clue_candidates)
+    return clue_candidates
+
+
+def plan_clue_evaluation(clue_candidates):
+    # the exact number of candidate movies for each clue is cheap to find from the title index, and the most
+    # selective clues go first, as they separate out the likely actors for the least work
+    return sorted(clue_candidates, key=lambda clue_candidate: len(clue_candidate[1]))
+
+
+def get_most_likely_actors_for_clues(puzzle_clues, movies_data_frame, performances_df, num_options, rating_tolerance,
+                                     title_index=None, actor_movie_incidence=None, prune=True, clue_cache=None,
+                                     dataset_version=None):
+    """Ranks the actors by how many of the clues' candidate movies they performed in.
+
+    With pruning, the clues are evaluated most selective first, and once an actor could no longer reach the
+    current top num_options scores even by performing in every candidate movie of the remaining clues, they are
+    dropped (branch and bound). The remaining clues are then only checked against the surviving actors'
+    filmographies. The ranking is the same either way.
+    """
+    log("\nWorking through the clues...")
+    if title_index is None:
+        title_index = make_title_pattern_index(movies_data_frame)
+    if actor_movie_incidence is None:
+        actor_movie_incidence = make_incidence_matrix(movies_data_frame, performances_df)
+    clue_candidates = find_clue_candidates(puzzle_clues, movies_data_frame, rating_tolerance, title_index, clue_cache,
+                                           dataset_version)
+    return rank_actors_for_clue_candidates(clue_candidates, actor_movie_incidence, num_options, prune, clue_cache,
+                                           rating_tolerance, dataset_version)
+
+
+def rank_actors_for_clue_candidates(clue_candidates, actor_movie_incidence, num_options, prune=True, clue_cache=None,
+                                    rating_tolerance=None, dataset_version=None):
+    """Ranks the actors over the candidate movies found for each clue. With a clue cache, the actors' scores for
+    each clue are looked up in it, and the scores of every actor are kept in it for the next solve."""
+    actor_ids, incidence_matrix, movie_incidence_matrix = actor_movie_incidence
+    if prune:
+        clue_candidates = plan_clue_evaluation(clue_candidates)
+    with profile_stage('count_performances') as stage:
+        # the most performances any one actor can gain from each clue, and so from all the clues after it
+        most_performances_per_movie = int(incidence_matrix.data.max()) if incidence_matrix.nnz else 0
+        remaining_score_bounds = np.cumsum([len(candidates) * most_performances_per_movie
+                                            for _, candidates in clue_candidates][::-1])[::-1].tolist() + [0]
+        actor_scores = np.zeros(len(actor_ids), dtype=np.int64)
+        # None while every actor is still in contention
+        surviving_rows = None
+        log('----------------------------')
+        for clue_number, (clue, matching_positions) in enumerate(clue_candidates):
+            sparse_clue_scores = None
+            if clue_cache is not None:
+                cache_key = ('actor_scores',) + get_clue_cache_key(clue, rating_tolerance, dataset_version)
+                sparse_clue_scores = clue_cache.get(cache_key)
+            if surviving_rows is None:
+                if sparse_clue_scores is None and clue_cache is not None:
+                    sparse_clue_scores = get_sparse_clue_scores(movie_incidence_matrix, matching_positions)
+                    clue_cache.put(cache_key, sparse_clue_scores)
+                if sparse_clue_scores is None:
+                    clue_scores = get_clue_scores(movie_incidence_matrix, matching_positions)
+                    actor_scores += clue_scores
+                else:
+                    scored_rows, clue_scores = sparse_clue_scores
+                    actor_scores[scored_rows] += clue_scores
+            elif sparse_clue_scores is not None:
+                clue_scores = get_sparse_clue_scores_for_actors(sparse_clue_scores, surviving_rows)
+                actor_scores[surviving_rows] += clue_scores
+            else:
+                # only some actors' scores are counted, so there is nothing worth keeping in the cache
+                clue_scores = get_clue_scores_for_actors(incidence_matrix, surviving_rows, matching_positions)
+                actor_scores[surviving_rows] += clue_scores
+            log("Found {} actors for the {} movies matching {}", clue_scores.sum(), len(matching_positions), clue)
+            if not prune:
+                continue
+            kth_best_score = get_kth_best_score(actor_scores, num_options)
+            remaining_score_bound = remaining_score_bounds[clue_number + 1]
+            if surviving_rows is None and remaining_score_bound < kth_best_score:
+                # nobody who has not scored yet can catch up any more
+                surviving_rows = np.flatnonzero(actor_scores + remaining_score_bound >= kth_best_score)
+            elif surviving_rows is not None:
+                surviving_rows = surviving_rows[actor_scores[surviving_rows] + remaining_score_bound >= kth_best_score]
+            if surviving_rows is not None:
+                log("{:,} actors can still make the top {}", len(surviving_rows), num_options)
+        log('----------------------------')
+        log("Counted {:,} individual movie performances from all the clues", actor_scores.sum())
+        if surviving_rows is not None:
+            # the scores of pruned actors stopped being counted, but could never have put them in the top num_options
+            ranked_scores = np.zeros_like(actor_scores)
+            ranked_scores[surviving_rows] = actor_scores[surviving_rows]
+            actor_scores = ranked_scores
+        stage['rows'] = int(actor_scores.sum())
+    return get_top_scoring_actors(actor_ids, actor_scores, num_options)
+
+
+def get_tolerance_rings(positions, sorted_ratings, clue_score, rating_tolerances):
+    # the windows of ascending tolerances nest, so each ring is just the movies a tolerance adds to the one before it
+    previous_window = None
+    for rating_tolerance in rating_tolerances:
+        window = get_rating_window(sorted_ratings,
+                                   round(clue_score - rating_tolerance, 2),
+                                   round(clue_score + rating_tolerance, 2))
+        if previous_window is None:
+            yield positions[window]
+        else:
+            yield np.concatenate([positions[window.start:previous_window.start],
+                                  positions[previous_window.stop:window.stop]])
+        previous_window = window
+
+
+def get_most_likely_actors_for_tolerances(puzzle_clues, movies_data_frame, performances_df, num_options,
+                                          rating_tolerances, title_index=None, actor_movie_incidence=None):
+    """Ranks the actors for each of several rating tolerances in a single pass over the clues.
+
+    Each clue's candidate movies are looked up once, and split into rings by how far their rating is from the
+    clue's score. Every ring is scored once, and the scores for a tolerance are the running total of the rings up
+    to it. Returns the ranking for each tolerance, keyed by tolerance.
+    """
+    rating_tolerances = sorted(set(rating_tolerances))
+    log("\nWorking through the clues for the rating tolerances {}...", rating_tolerances)
+    if title_index is None:
+        title_index = make_title_pattern_index(movies_data_frame)
+    if actor_movie_incidence is None:
+        actor_movie_incidence = make_incidence_matrix(movies_data_frame, performances_df)
+    actor_ids, _, movie_incidence_matrix = actor_movie_incidence
+    with profile_stage('count_tolerance_rings') as stage:
+        ring_scores = np.zeros((len(rating_tolerances), len(actor_ids)), dtype=np.int64)
+        for clue in puzzle_clues:
+            positions, ratings = title_index.get((normalise_title_pattern(clue.title_pattern),
+                                                  year_to_number(clue.year)), NO_INDEXED_TITLES)
+            rings = list(get_tolerance_rings(positions, ratings, clue.score, rating_tolerances))
+            log("Found {} movies matching {} within each of the tolerances",
+                np.cumsum([len(ring) for ring in rings]).tolist(), clue)
+            for ring_number, ring in enumerate(rings):
+                ring_scores[ring_number] += get_clue_scores(movie_incidence_matrix, ring)
+        actor_scores = np.cumsum(ring_scores, axis=0)
+        stage['rows'] = int(ring_scores.sum())
+    return {rating_tolerance: get_top_scoring_actors(actor_ids, actor_scores[tolerance_number], num_options)
+            for tolerance_number, rating_tolerance in enumerate(rating_tolerances)}
+
+
+def make_actor_name_index(actor_names_df):
+    sorted_order = np.argsort(actor_names_df.nconst.to_numpy(), kind='stable')
+    return actor_names_df.nconst.to_numpy()[sorted_order], actor_names_df.primaryName.to_numpy()[sorted_order]
+
+
+def get_actor_names(actor_ids, actor_name_index):
+    with profile_stage('resolve_names') as stage:
+        stage['rows'] = len(actor_ids)
+        sorted_actor_ids, actor_names = actor_name_index
+        actor_ids = np.asarray(actor_ids, dtype=sorted_actor_ids.dtype)
+        positions = np.searchsorted(sorted_actor_ids, actor_ids)
+        return [actor_names[position]
+                if position < sorted_actor_ids.shape[0] and sorted_actor_ids[position] == actor_id else None
+                for actor_id, position in zip(actor_ids, positions)]
+
+
+def get_actor_name(actor_id, actor_name_index):
+    return get_actor_names([actor_id], actor_name_index)[0]
+
+
+def resolve_actor_names(actor_ids, actors_file, data_store=None):
+    if is_data_store(data_store):
+        # the store's actors table is sorted, so only the names asked for ever need reading
+        return get_actor_names(actor_ids, map_actor_names(data_store))
+    with profile_stage('read_actors') as stage:
+        actor_name_index = make_actor_name_index(read_data_table(ACTORS_TABLE, actors_file))
+        stage['rows'] = actor_name_index[0].shape[0]
+    return get_actor_names(actor_ids, actor_name_index)
+
+
+def describe_actor_options(puzzle_clues, most_likely_actors, actor_names):
+    return [
+        {
+            'nconst': format_imdb_id('nconst', actor_id),
+            'name': actor_name,
+            'clue_matches': number_of_clue_matches,
+            'percent_match': (number_of_clue_matches / len(puzzle_clues)) * 100.0
+        }
+        for (actor_id, number_of_clue_matches), actor_name in zip(most_likely_actors, actor_names)
+    ]
+
+
+def describe_tolerance_sweep(puzzle_clues, tolerance_rankings, actor_names_by_id):
+    tolerance_sweep = []
+    for rating_tolerance, most_likely_actors in tolerance_rankings.items():
+        options = describe_actor_options(puzzle_clues, most_likely_actors,
+                                         [actor_names_by_id[actor_id] for actor_id, _ in most_likely_actors])
+        tolerance_sweep.append({
+            'rating_tolerance': rating_tolerance,
+            'answer': options[0]['name'] if options else None,
+            'options': options,
+        })
+    return tolerance_sweep
+
+
+def get_ranked_actor_ids(tolerance_rankings):
+    return sorted(set(actor_id for most_likely_actors in tolerance_rankings.values()
+                      for actor_id, _ in most_likely_actors))
+
 
-    puzzle_clues = read_puzzle_clues(args['clues_file'])
+def make_filmography_index(movies_df, performances_df):
+    return filmography_index_from_arrays(make_filmography_arrays(movies_df['tconst'].to_numpy(),
+                                                                 performances_df['tconst'].to_numpy(),
+                                                                 performances_df['nconst'].to_numpy()))
+
+
+def filmography_index_from_arrays(filmography_arrays):
+    return (filmography_arrays['actor_ids'], filmography_arrays['indptr'], filmography_arrays['performance_rows'],
+            filmography_arrays['movie_rows'])
+
+
+def load_filmography_index(movies_df, performances_df, data_store=None):
+    # the store's index is over the whole movies and performances tables, so only lines up with them read in full
+    if data_store is not None:
+        return filmography_index_from_arrays(read_index(data_store, FILMOGRAPHY_INDEX))
+    with profile_stage('build_filmography_index') as stage:
+        stage['rows'] = performances_df.shape[0]
+        return make_filmography_index(movies_df, performances_df)
+
+
+def get_filmographies(actor_ids, movies_df, performances_df, filmography_index=None):
+    """The rows of performances_df holding any of the actors' performances, in table order, and the rows of
+    movies_df for their movies (-1 for movies not in it). Without an index, a single scan of the table finds them for
+    every actor at once."""
+    import pandas as pd
+    if filmography_index is None:
+        performance_rows = np.flatnonzero(np.isin(performances_df['nconst'].to_numpy(), actor_ids))
+        movie_ids = performances_df['tconst'].to_numpy()[performance_rows]
+        return performance_rows, pd.Index(movies_df['tconst'].to_numpy()).get_indexer(movie_ids)
+    indexed_actor_ids, indptr, performance_rows, movie_rows = filmography_index
+    actor_ids = np.asarray(actor_ids, dtype=indexed_actor_ids.dtype)
+    index_rows = np.searchsorted(indexed_actor_ids, actor_ids)
+    filmography_slices = [slice(indptr[index_row], indptr[index_row + 1])
+                          for actor_id, index_row in zip(actor_ids, index_rows)
+                          if index_row < len(indexed_actor_ids) and indexed_actor_ids[index_row] == actor_id]
+    if not filmography_slices:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    actor_performance_rows = np.concatenate([performance_rows[filmography] for filmography in filmography_slices])
+    actor_movie_rows = np.concatenate([movie_rows[filmography] for filmography in filmography_slices])
+    table_order = np.argsort(actor_performance_rows)
+    return actor_performance_rows[table_order], actor_movie_rows[table_order]
+
+
+def get_matching_roles_for_actors(movie_clues, actor_ids, performances_df, movies_df, filmography_index=None):
+    """Each actor's roles in the movies whose titles match one of the clues' title patterns, found in one pass for
+    every actor. Performances read from a data store left their characters mapped in it, and only the characters of
+    the roles found are decoded."""
+    import pandas as pd
+    with profile_stage('find_roles') as stage:
+        performance_rows, movie_positions = get_filmographies(actor_ids, movies_df, performances_df, filmography_index)
+        in_movies = movie_positions >= 0
+        performance_rows, movie_positions = performance_rows[in_movies], movie_positions[in_movies]
+        if has_string_column(movies_df, 'titlePattern'):
+            title_patterns = get_string_values(movies_df, 'titlePattern', movie_positions)
+        else:
+            title_patterns = [movie_title_to_clues_pattern(str(title))
+                              for title in get_string_values(movies_df, 'primaryTitle', movie_positions)]
+        clue_title_patterns = set(normalise_title_pattern(clue.title_pattern) for clue in movie_clues)
+        matches_clue = np.array([title_pattern in clue_title_patterns for title_pattern in title_patterns], dtype=bool)
+        performance_rows, movie_positions = performance_rows[matches_clue], movie_positions[matches_clue]
+        characters = get_string_values(performances_df, 'characters', performance_rows)
+        roles = pd.DataFrame(data={
+            'nconst': performances_df['nconst'].to_numpy()[performance_rows],
+            'Movie': get_string_values(movies_df, 'primaryTitle', movie_positions),
+            'Year': movies_df['startYear'].to_numpy()[movie_positions],
+            'Character': characters,
+        })
+        stage['rows'] = roles.shape[0]
+    return {
+        actor_id: roles[roles['nconst'] == actor_id].drop(columns='nconst').sort_values(by=['Year'], kind='stable')
+        .reset_index(drop=True)
+        for actor_id in actor_ids
+    }
+
+
+def solve_single_puzzle(args):
+    with profile_stage('read_clues') as stage:
+        puzzle_clues = read_puzzle_clues(args['clues_file'], args['clues_cache_dir'])
+        stage['rows'] = len(puzzle_clues)
     if args['write_clues_file']:
         write_movie_clues_file(args['write_clues_file'], puzzle_clues)
 
+    solve_params = get_solve_params(args)
+    result_cache = make_result_cache(args)
+    if result_cache:
+        with profile_stage('read_cached_result'):
+            result = result_cache.get(puzzle_clues, solve_params)
+        if result is not None:
+            print("Found this puzzle already solved against the same IMDb data in {}".format(args['result_cache_dir']))
+            print_puzzle_solution(result)
+            return result
+
+    result = solve_puzzle_from_imdb_data(puzzle_clues, args)
+    if result_cache:
+        result_cache.put(puzzle_clues, solve_params, result)
+    print_puzzle_solution(result)
+    return result
+
+
+def make_result_cache(args):
+    if not args['result_cache_dir']:
+        return None
+    data_files = [args['movies_file'], args['performances_file'], args['actors_file'], args['data_store']]
+    return ResultCache(args['result_cache_dir'], get_data_version(*data_files), get_data_source(*data_files))
+
+
+def get_solve_params(args):
+    # everything besides the clues and the data that a cached result depends on. Single and batch solves give the same
+    # answers, so share their cached results.
+    return {
+        'num_options': args['num_options'],
+        'rating_tolerance': args['rating_tolerance'],
+        'tolerance_sweep': sorted(args['tolerance_sweep']) if args['tolerance_sweep'] else None,
+    }
+
+
+def solve_puzzle_from_imdb_data(puzzle_clues, args):
+    data_store = args['data_store']
     movies_file = args['movies_file']
-    print("Reading IMDb movie data from {}".format(movies_file))
-    movies_df = filter_movies_by_release_date(movies_file, puzzle_clues)
+    print("Reading IMDb movie data from {}".format(data_store or movies_file))
+    movies_df = filter_movies_by_release_date(movies_file, puzzle_clues, data_store)
 
     performances_file = args['performances_file']
-    print("Reading IMDb actor performances data from {}".format(performances_file))
-    performances_df = get_candidate_performances(performances_file, movies_df)
+    print("Reading IMDb actor performances data from {}".format(data_store or performances_file))
+    performances_df = get_candidate_performances(performances_file, movies_df, data_store)
 
-    most_likely_actors = get_most_likely_actors_for_clues(puzzle_clues,
-                                                          movies_df,
-                                                          performances_df,
-                                                          args['num_options'],
-                                                          args['rating_tolerance'])
-    print("\n\nActor IDs occurring most often across all possible candidate movies:{}".format(most_likely_actors))
-    total_count = sum(count for actor_id, count in most_likely_actors)
+    tolerance_rankings = None
+    if args['tolerance_sweep']:
+        tolerance_rankings = get_most_likely_actors_for_tolerances(puzzle_clues,
+                                                                   movies_df,
+                                                                   performances_df,
+                                                                   args['num_options'],
+                                                                   args['tolerance_sweep'] + [args['rating_tolerance']])
+        most_likely_actors = tolerance_rankings[args['rating_tolerance']]
+    else:
+        most_likely_actors = get_most_likely_actors_for_clues(puzzle_clues,
+                                                              movies_df,
+                                                              performances_df,
+                                                              args['num_options'],
+                                                              args['rating_tolerance'])
+    print("\n\nActor IDs occurring most often across all possible candidate movies:{}"
+          .format([(format_imdb_id('nconst', actor_id), count) for actor_id, count in most_likely_actors]))
 
     actors_file = args['actors_file']
-    print("Converting actor IDs to names using {}".format(actors_file))
-    actor_names_df = pd.read_csv(actors_file, sep='\t')
+    print("Converting actor IDs to names using {}".format(data_store or actors_file))
+    actor_names = resolve_actor_names([actor_id for actor_id, _ in most_likely_actors], actors_file, data_store)
+
+    options = describe_actor_options(puzzle_clues, most_likely_actors, actor_names)
+    # just the clue years' performances are read in, so one scan of them, for every option at once, is quicker than
+    # building an index
+    add_option_roles(options, puzzle_clues, most_likely_actors, performances_df, movies_df, None)
+    result = {
+        'number_of_clues': len(puzzle_clues),
+        'answer': options[0]['name'] if options else None,
+        'options': options,
+        'actor_roles': options[0]['roles'] if options else [],
+    }
+    if tolerance_rankings:
+        ranked_actor_ids = get_ranked_actor_ids(tolerance_rankings)
+        actor_names_by_id = dict(zip(ranked_actor_ids, resolve_actor_names(ranked_actor_ids, actors_file, data_store)))
+        result['tolerance_sweep'] = describe_tolerance_sweep(puzzle_clues, tolerance_rankings, actor_names_by_id)
+    return result
 
-    actor = most_likely_actors[0][0]
-    actor_name = get_actor_name(actor, actor_names_df)
+
+def print_puzzle_solution(result):
+    import pandas as pd
+    actor_name = result['answer']
     print("\nDude - I think it's... {}!".format(actor_name))
     print("Here are some {} film roles from movies that match clues:\n".format(actor_name))
-    actor_roles = get_matching_movies_for_actor(puzzle_clues, actor, performances_df, movies_df)
     pd.set_option('display.width', 1000)
-    print(actor_roles)
+    print(pd.DataFrame(result['actor_roles'], columns=['Movie', 'Year', 'Character']))
     print("\nOptions\n----------------")
     option_num = 1
-    for actor_id, number_of_clue_matches in most_likely_actors:
-        actor_name = get_actor_name(actor_id, actor_names_df)
-        percent_match = (number_of_clue_matches / len(puzzle_clues)) * 100.0
-        print("{}) {} is a {:.2f}% match".format(option_num, actor_name, percent_match))
+    for option in result['options']:
+        print("{}) {} is a {:.2f}% match".format(option_num, option['name'], option['percent_match']))
         option_num += 1
+    if result.get('tolerance_sweep'):
+        print("\nOptions by rating tolerance\n----------------")
+        for tolerance_options in result['tolerance_sweep']:
+            print("{}: {}".format(tolerance_options['rating_tolerance'],
+                                  ", ".join("{} ({:.2f}%)".format(option['name'], option['percent_match'])
+                                            for option in tolerance_options['options'])))
+
+
+def find_clues_files(clues_paths):
+    clues_files = []
+    for clues_path in clues_paths:
+        if os.path.isdir(clues_path):
+            clues_files.extend(os.path.join(clues_path, clues_file) for clues_file in sorted(os.listdir(clues_path)))
+        else:
+            clues_files.append(clues_path)
+    return clues_files
+
+
+# the data every batch worker solves against, loaded once per process
+_batch_data = {}
+
+
+def init_batch_worker(movies_df, performances_df, actor_name_index, title_index, actor_movie_incidence,
+                      filmography_index=None, solver_log=None):
+    if solver_log:
+        sys.stdout = open(solver_log, 'a')
+    _batch_data['movies_df'] = movies_df
+    _batch_data['performances_df'] = performances_df
+    _batch_data['actor_name_index'] = actor_name_index
+    _batch_data['title_index'] = title_index
+    _batch_data['actor_movie_incidence'] = actor_movie_incidence
+    # the data is the same for the whole batch, so puzzles sharing clues share what was worked out for them
+    _batch_data['clue_cache'] = ClueCache()
+    # only a data store has one, as building an index takes far longer than the single scan for each puzzle that it
+    # saves on a batch
+    _batch_data['filmography_index'] = filmography_index
+
+
+def add_option_roles(options, puzzle_clues, most_likely_actors, performances_df, movies_df, filmography_index):
+    option_roles = get_matching_roles_for_actors(puzzle_clues, [actor_id for actor_id, _ in most_likely_actors],
+                                                 performances_df, movies_df, filmography_index)
+    for option, (actor_id, _) in zip(options, most_likely_actors):
+        option['roles'] = option_roles[actor_id].to_dict('records')
+
+
+def solve_batch_puzzle(clues_file, puzzle_clues, num_options, rating_tolerance, rating_tolerances=None):
+    with profile_stage('solve_puzzle') as stage:
+        stage['rows'] = len(puzzle_clues)
+        start_time = datetime.now()
+        if rating_tolerances:
+            # one pass ranks the actors for every tolerance, including the one the answer is given for
+            tolerance_rankings = get_most_likely_actors_for_tolerances(puzzle_clues,
+                                                                       _batch_data['movies_df'],
+                                                                       _batch_data['performances_df'],
+                                                                       num_options,
+                                                                       list(rating_tolerances) + [rating_tolerance],
+                                                                       _batch_data['title_index'],
+                                                                       _batch_data['actor_movie_incidence'])
+            most_likely_actors = tolerance_rankings[rating_tolerance]
+        else:
+            tolerance_rankings = None
+            most_likely_actors = get_most_likely_actors_for_clues(puzzle_clues,
+                                                                  _batch_data['movies_df'],
+                                                                  _batch_data['performances_df'],
+                                                                  num_options,
+                                                                  rating_tolerance,
+                                                                  _batch_data['title_index'],
+                                                                  _batch_data['actor_movie_incidence'],
+                                                                  clue_cache=_batch_data['clue_cache'])
+        ranked_time = datetime.now()
+        actor_names = get_actor_names([actor_id for actor_id, _ in most_likely_actors], _batch_data['actor_name_index'])
+        options = describe_actor_options(puzzle_clues, most_likely_actors, actor_names)
+        tolerance_sweep = None
+        if tolerance_rankings:
+            ranked_actor_ids = get_ranked_actor_ids(tolerance_rankings)
+            actor_names_by_id = dict(zip(ranked_actor_ids,
+                                         get_actor_names(ranked_actor_ids, _batch_data['actor_name_index'])))
+            tolerance_sweep = describe_tolerance_sweep(puzzle_clues, tolerance_rankings, actor_names_by_id)
+        named_time = datetime.now()
+        add_option_roles(options, puzzle_clues, most_likely_actors, _batch_data['performances_df'],
+                         _batch_data['movies_df'], _batch_data['filmography_index'])
+        end_time = datetime.now()
+        result = {
+            'puzzle': os.path.basename(clues_file),
+            'clues_file': clues_file,
+            'number_of_clues': len(puzzle_clues),
+            'answer': options[0]['name'] if options else None,
+            'options': options,
+            'actor_roles': options[0]['roles'] if options else [],
+        }
+        if tolerance_sweep:
+            result['tolerance_sweep'] = tolerance_sweep
+        # every stage of the solve, which between them make up the whole of it
+        result['timings'] = {
+            'ranking_seconds': (ranked_time - start_time).total_seconds(),
+            'naming_seconds': (named_time - ranked_time).total_seconds(),
+            'roles_seconds': (end_time - named_time).total_seconds(),
+            'solve_seconds': (end_time - start_time).total_seconds(),
+        }
+        result['duration_seconds'] = (end_time - start_time).total_seconds()
+        return result
+
+
+def init_batch_worker_from_store(data_store, movie_years, solver_log=None):
+    init_batch_worker(*load_shared_batch_data(data_store, movie_years), solver_log)
+
+
+def load_shared_batch_data(data_store, movie_years=None):
+    # every column, the actor names and the indexes are mapped read-only rather than copied, so any number of
+    # processes solving against the same store share one copy of them through the OS page cache. All of them are
+    # mapped up front, so they go on being read as they were however the store is refreshed in the meantime.
+    log("Mapping the data store at {}", data_store)
+    movies_df = read_table(data_store, MOVIES_TABLE, mmap=True)
+    performances_df = read_table(data_store, PERFORMANCES_TABLE, columns=['tconst', 'nconst'], mmap=True)
+    return (movies_df,
+            performances_df,
+            map_actor_names(data_store),
+            make_title_pattern_index(movies_df, movie_years),
+            incidence_matrix_from_arrays(read_index(data_store, INCIDENCE_INDEX), movies_df.shape[0]),
+            filmography_index_from_arrays(read_index(data_store, FILMOGRAPHY_INDEX)))
+
+
+def load_batch_data(all_clues, movies_file, performances_file, actors_file, data_store=None):
+    if is_data_store(data_store):
+        return load_shared_batch_data(data_store, set(clue.year for clue in all_clues))
+    # a single load, filtered on the union of every puzzle's clue years, serves the whole batch
+    movies_df = filter_movies_by_release_date(movies_file, all_clues, data_store)
+    performances_df = get_candidate_performances(performances_file, movies_df, data_store)
+    actor_name_index = make_actor_name_index(read_data_table(ACTORS_TABLE, actors_file, data_store))
+    return (movies_df,
+            performances_df,
+            actor_name_index,
+            make_title_pattern_index(movies_df),
+            make_incidence_matrix(movies_df, performances_df),
+            None)
+
+
+def solve_puzzles(puzzles, batch_data, num_options, rating_tolerance, workers=1, solver_log=None, data_store=None,
+                  rating_tolerances=None):
+    solve_args = [(clues_file, puzzle_clues, num_options, rating_tolerance, rating_tolerances)
+                  for clues_file, puzzle_clues in puzzles.items()]
+    if workers > 1:
+        print("Fanning the batch out across {} worker processes".format(workers))
+        if is_data_store(data_store):
+            # each worker maps the store itself, instead of being sent its own private copy of the batch data
+            movie_years = set(clue.year for puzzle_clues in puzzles.values() for clue in puzzle_clues)
+            initializer, initargs = init_batch_worker_from_store, (data_store, movie_years, solver_log)
+        else:
+            initializer, initargs = init_batch_worker, batch_data + (solver_log,)
+        with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as executor:
+            return list(executor.map(solve_batch_puzzle, *zip(*solve_args)))
+    init_batch_worker(*batch_data)
+    with open(solver_log or os.devnull, 'a') as log_file, \
+            contextlib.redirect_stdout(log_file) if solver_log else contextlib.nullcontext():
+        return [solve_batch_puzzle(*puzzle_args) for puzzle_args in solve_args]
+
+
+def get_cached_results(puzzles, result_cache, solve_params):
+    cached_results = {}
+    for clues_file, puzzle_clues in puzzles.items():
+        result = result_cache.get(puzzle_clues, solve_params)
+        if result is not None:
+            # the same clues may have been solved from a differently named file, or not in a batch at all
+            cached_results[clues_file] = dict(result, puzzle=os.path.basename(clues_file), clues_file=clues_file,
+                                              timings={}, duration_seconds=0.0, cached=True)
+    return cached_results
+
+
+def cache_results(puzzles, results, result_cache, solve_params):
+    for result in results:
+        result_cache.put(puzzles[result['clues_file']], solve_params,
+                         {field: value for field, value in result.items() if field not in BATCH_RUN_FIELDS})
+
+
+def solve_puzzle_batch(args):
+    clues_files = find_clues_files(args['batch'])
+    puzzles = {clues_file: read_movie_clues_file(clues_file) for clues_file in clues_files}
+    print("Solving a batch of {} puzzles".format(len(puzzles)))
+    cached_results = {}
+    solve_params = get_solve_params(args)
+    result_cache = make_result_cache(args)
+    if result_cache:
+        cached_results = get_cached_results(puzzles, result_cache, solve_params)
+        print("Found {} of the puzzles already solved against the same IMDb data in {}"
+              .format(len(cached_results), args['result_cache_dir']))
+    unsolved_puzzles = {clues_file: puzzle_clues for clues_file, puzzle_clues in puzzles.items()
+                        if clues_file not in cached_results}
+    solved_results = []
+    if unsolved_puzzles:
+        all_clues = [clue for puzzle_clues in unsolved_puzzles.values() for clue in puzzle_clues]
+        if args['workers'] > 1 and is_data_store(args['data_store']):
+            # the workers map the store for themselves
+            batch_data = None
+        else:
+            with profile_stage('load_batch_data'):
+                batch_data = load_batch_data(all_clues,
+                                             args['movies_file'],
+                                             args['performances_file'],
+                                             args['actors_file'],
+                                             args['data_store'])
+        solved_results = solve_puzzles(unsolved_puzzles, batch_data, args['num_options'], args['rating_tolerance'],
+                                       args['workers'], data_store=args['data_store'],
+                                       rating_tolerances=args['tolerance_sweep'])
+        if result_cache:
+            cache_results(unsolved_puzzles, solved_results, result_cache, solve_params)
+    solved_results = {result['clues_file']: result for result in solved_results}
+    results = [cached_results.get(clues_file) or solved_results[clues_file] for clues_file in puzzles]
+
+    print("\nResults\n----------------")
+    for result in results:
+        print(json.dumps(result))
+    if args['results_file']:
+        print("Writing {} results to {}".format(len(results), args['results_file']))
+        with open(args['results_file'], 'w') as results_file:
+            for result in results:
+                results_file.write("{}\n".format(json.dumps(result)))
+    return results
+
+
+class Solver:
+    """Solves puzzles against movie, performance and actor data loaded just once, for programs that embed the solver.
+
+    Nothing is printed unless the solver is verbose. As well as the ranked options, each solve gives the number of
+    candidate movies found for each clue, and the candidate movies that each option performed in. What each clue
+    matched is kept in a clue cache, which may be shared with other solvers as long as each is given the version of
+    its data. Data mapped from a data store is mapped in full when it is loaded, so a solver goes on solving against
+    the data it was loaded with however the store is refreshed in the meantime.
+    """
+
+    def __init__(self, movies_df, performances_df, actor_name_index, title_index=None, actor_movie_incidence=None,
+                 verbose=False, clue_cache=None, dataset_version=None, filmography_index=None):
+        self.verbose = verbose
+        self.clue_cache = ClueCache() if clue_cache is None else clue_cache
+        self.dataset_version = dataset_version
+        # if not given one, only built for the first solve
+        self.filmography_index = filmography_index
+        self.movies_df = movies_df
+        self.performances_df = performances_df
+        # the sorted actor IDs and names
+        self.actor_name_index = actor_name_index
+        with solver_logging_enabled(verbose):
+            self.title_index = make_title_pattern_index(movies_df) if title_index is None else title_index
+            self.actor_movie_incidence = make_incidence_matrix(movies_df, performances_df) \
+                if actor_movie_incidence is None else actor_movie_incidence
+
+    @classmethod
+    def load(cls, movies_file=None, performances_file=None, actors_file=None, data_store=None, movie_years=None,
+             verbose=False, clue_cache=None):
+        """Loads a solver from a data store, mapping it rather than reading it in, or else from the TSV files."""
+        with solver_logging_enabled(verbose):
+            if is_data_store(data_store):
+                movies_df, performances_df, actor_name_index, title_index, actor_movie_incidence, filmography_index = \
+                    load_shared_batch_data(data_store, movie_years)
+                return cls(movies_df, performances_df, actor_name_index, title_index, actor_movie_incidence,
+                           verbose=verbose, clue_cache=clue_cache, dataset_version=get_dataset_version(data_store),
+                           filmography_index=filmography_index)
+            return cls(read_data_table(MOVIES_TABLE, movies_file),
+                       read_data_table(PERFORMANCES_TABLE, performances_file),
+                       make_actor_name_index(read_data_table(ACTORS_TABLE, actors_file)),
+                       verbose=verbose,
+                       clue_cache=clue_cache)
+
+    def solve(self, puzzle_clues, num_options=3, rating_tolerance=0.1):
+        with solver_logging_enabled(self.verbose):
+            clue_candidates = find_clue_candidates(puzzle_clues, self.movies_df, rating_tolerance, self.title_index,
+                                                   self.clue_cache, self.dataset_version)
+            most_likely_actors = rank_actors_for_clue_candidates(clue_candidates, self.actor_movie_incidence,
+                                                                 num_options, clue_cache=self.clue_cache,
+                                                                 rating_tolerance=rating_tolerance,
+                                                                 dataset_version=self.dataset_version)
+            actor_names = get_actor_names([actor_id for actor_id, _ in most_likely_actors], self.actor_name_index)
+            options = describe_actor_options(puzzle_clues, most_likely_actors, actor_names)
+            add_option_roles(options, puzzle_clues, most_likely_actors, self.performances_df, self.movies_df,
+                             self.get_filmography_index())
+        for option, (actor_id, _) in zip(options, most_likely_actors):
+            option['matched_movies'] = self.get_matched_movies(actor_id, clue_candidates)
+        return {
+            'number_of_clues': len(puzzle_clues),
+            'answer': options[0]['name'] if options else None,
+            'options': options,
+            'clues': [
+                {
+                    'title_pattern': clue.title_pattern,
+                    'year': clue.year,
+                    'score': clue.score,
+                    'candidate_movies': len(candidate_positions),
+                }
+                for clue, candidate_positions in clue_candidates
+            ],
+        }
+
+    def get_filmography_index(self):
+        if self.filmography_index is None:
+            self.filmography_index = load_filmography_index(self.movies_df, self.performances_df)
+        return self.filmography_index
+
+    def get_matched_movies(self, actor_id, clue_candidates):
+        actor_ids, incidence_matrix, _ = self.actor_movie_incidence
+        actor_row = np.searchsorted(actor_ids, actor_id)
+        indptr = incidence_matrix.indptr
+        actor_movies = incidence_matrix.indices[indptr[actor_row]:indptr[actor_row + 1]]
+        matched_movies = []
+        for clue, candidate_positions in clue_candidates:
+            matched_positions = np.intersect1d(candidate_positions, actor_movies)
+            # read column by column, as a row of only numeric columns would come back all floats
+            for movie_id, title, year, rating in zip(
+                    self.movies_df['tconst'].to_numpy()[matched_positions],
+                    get_string_values(self.movies_df, 'primaryTitle', matched_positions),
+                    self.movies_df['startYear'].to_numpy()[matched_positions],
+                    self.movies_df['averageRating'].to_numpy()[matched_positions]):
+                matched_movies.append({
+                    'tconst': format_imdb_id('tconst', movie_id),
+                    'title': title,
+                    'year': int(year),
+                    # back from the float32 it is held as, to the rating as it was published
+                    'rating': round(float(rating), 2),
+                })
+        return matched_movies
+
+
+if __name__ == '__main__':
+    args = parse_cli_args()
+    with profiling('actorle_solver', args['profile']):
+        if args['batch']:
+            solve_puzzle_batch(args)
+        else:
+            solve_single_puzzle(args)
@@ -1,5 +1,7 @@
 import argparse
 
+from movie_clues import DEFAULT_CLUES_CACHE_DIR
+
 
 # allows the use of newlines inside help screen text
 class SmartFormatter(argparse.HelpFormatter):
@@ -20,20 +22,24 @@ def parse_cli_args():
                             help="R|the full path to an IMDb title.basics.tsv.gz file, as modified by the\n"
                                  "data grabber tool imdb_data_grabber.py using raw data downloaded from\n"
                                  "https://datasets.imdbws.com.\n"
-                                 "Mandatory.",
-                            required=True)
+                                 "Mandatory unless --data-store is set.")
     arg_parser.add_argument('-af',
                             '--actors-file',
                             help="R|the full path to an IMDb name.basics.tsv.gz file, as found at "
                                  "https://datasets.imdbws.com.\n"
-                                 "Mandatory.",
-                            required=True)
+                                 "Mandatory unless --data-store is set.")
     arg_parser.add_argument('-pf',
                             '--performances-file',
                             help="R|the full path to an IMDb title.principals.tsv.gz file, as found at "
                                  "https://datasets.imdbws.com.\n"
-                                 "Mandatory.",
-                            required=True)
+                                 "Mandatory unless --data-store is set.")
+    arg_parser.add_argument('-ds',
+                            '--data-store',
+                            help="R|the full path to a binary data store directory, as written by the data\n"
+                                 "grabber tool imdb_data_grabber.py. Optional. When this is set and holds a\n"
+                                 "complete store, the movies, actors and performances data is read from it\n"
+                                 "rather than from the TSV files, which is much quicker. The TSV files are\n"
+                                 "used as a fallback when the store is missing.")
     arg_parser.add_argument('-cf',
                             '--clues-file',
                             help="R|the full path to a puzzle file that contains the clues. Optional.\nWhen this "
@@ -52,6 +58,19 @@ def parse_cli_args():
                                  '<title pattern>|<year>|<genres>|<score>\n\n'
                                  'For example:\n\n'
                                  'xxx xxxxxxxxxxx|2002|Action,Crime,Thriller|7.1')
+    arg_parser.add_argument('-cc',
+                            '--clues-cache-dir',
+                            default=DEFAULT_CLUES_CACHE_DIR,
+                            help='R|the directory that today\'s clues are cached in once retrieved from\n'
+                                 'https://actorle.com/, as a dated clues file named actorle-<YYYY-MM-DD>.txt.\n'
+                                 'Optional. When the file for today already exists, the clues are read from it\n'
+                                 'and the website is not requested. Defaults to {}.'.format(DEFAULT_CLUES_CACHE_DIR))
+    arg_parser.add_argument('-rc',
+                            '--result-cache-dir',
+                            help='R|the directory to keep solved puzzle results in. Optional. When set, a puzzle\n'
+                                 'already solved with the same clues, options and IMDb data is answered from\n'
+                                 'its cached result without loading any IMDb data. Refreshing the data store or\n'
+                                 'the TSV files invalidates every cached result.')
     arg_parser.add_argument('-n',
                             '--num-options',
                             help='The number of potential answers to display. Optional, default is 3.',
@@ -65,4 +84,44 @@ def parse_cli_args():
                                  'time as more people provide review scores.',
                             type=float,
                             default=0.1)
-    return vars(arg_parser.parse_args())
+    arg_parser.add_argument('-ts',
+                            '--tolerance-sweep',
+                            nargs='+',
+                            type=float,
+                            help='R|one or more further rating tolerances to rank the actors for, e.g.\n'
+                                 '--tolerance-sweep 0.0 0.2 0.3. Optional. Every tolerance is ranked in a single\n'
+                                 'pass over the clues, and the options for each one are shown alongside the\n'
+                                 'answer for --rating-tolerance.')
+    arg_parser.add_argument('-b',
+                            '--batch',
+                            nargs='+',
+                            help="R|one or more clues files, or directories of clues files, to solve as a batch.\n"
+                                 "Optional. The IMDb data is loaded once, filtered on the years of every\n"
+                                 "puzzle's clues, and each puzzle is solved against it. A JSON result is\n"
+                                 "printed for each puzzle. Cannot be used with --clues-file.")
+    arg_parser.add_argument('-j',
+                            '--workers',
+                            help='R|the number of worker processes to solve a batch with. Optional, default is 1,\n'
+                                 'meaning the batch is solved in this process.',
+                            type=int,
+                            default=1)
+    arg_parser.add_argument('-o',
+                            '--results-file',
+                            help='R|the full path to write batch results out to, one JSON object per line.\n'
+                                 'Optional.')
+    arg_parser.add_argument('-p',
+                            '--profile',
+                            help='R|the full path to a directory to write a profile of the solve out to. Optional.\n'
+                                 'The time taken by each stage (reading, year filtering, title matching,\n'
+                                 'counting and name resolution), the rows it produced and the peak memory\n'
+                                 'are written as profile.json, as a Chrome trace in trace.json (open it in\n'
+                                 'chrome://tracing or https://ui.perfetto.dev) and as Prometheus-style\n'
+                                 'counters in metrics.prom.')
+    args = arg_parser.parse_args()
+    if args.batch and args.clues_file:
+        arg_parser.error("the --batch and --clues-file arguments cannot be used together")
+    data_files = [args.movies_file, args.actors_file, args.performances_file]
+    if not args.data_store and not all(data_files):
+        arg_parser.error("the --movies-file, --actors-file and --performances-file arguments are required "
+                         "when no --data-store is given")
+    return vars(args)
@@ -0,0 +1,47 @@
+import collections
+import threading
+
+DEFAULT_CLUE_CACHE_SIZE = 1024
+
+
+class ClueCache:
+    """A least recently used cache of what the solver worked out for each clue, holding at most max_entries of them.
+
+    Keys are built by the solver from the normalised clue, its rating window and the version of the data it was
+    matched against, so one cache can be shared by solvers over different data. Every lookup counts as a hit or a
+    miss.
+    """
+
+    def __init__(self, max_entries=DEFAULT_CLUE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # solves run on the threads of a server's executor share one cache
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
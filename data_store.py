@@ -0,0 +1,541 @@
+import contextlib
+import json
+import os
+import uuid
+from datetime import datetime
+
+import numpy as np
+
+STORE_FORMAT_VERSION = 10
+MANIFEST_FILE_NAME = 'manifest.json'
+DEFAULT_STORE_DIR_NAME = 'store'
+INDEXES_DIR_NAME = 'indexes'
+MISSING_YEAR = 0
+# the key, in a table's attrs, of the string columns left mapped in the store rather than read in
+MAPPED_COLUMNS = 'mapped_columns'
+
+# IMDb IDs are a two letter prefix and a zero-padded number of at least 7 digits, e.g. tt0079501 or nm0000154,
+# so they are held as just their number and formatted back for display
+IMDB_ID_PREFIXES = {
+    'tconst': 'tt',
+    'nconst': 'nm',
+}
+IMDB_ID_DIGITS = 7
+
+MOVIES_TABLE = 'movies'
+PERFORMANCES_TABLE = 'performances'
+ACTORS_TABLE = 'actors'
+
+# the actor x movie incidence matrix, as CSR arrays whose columns are the rows of the movies table
+INCIDENCE_INDEX = 'actor_movie_incidence'
+# each actor's performances, as the rows of the performances table (and of their movies in the movies table) sorted
+# by actor, with an offset to each actor's first
+FILMOGRAPHY_INDEX = 'actor_filmography'
+
+# The on-disk encoding of every column in each table, which is also its type once read in, from the store or a TSV
+# file: IMDb IDs as int32 numbers, years as int16 (MISSING_YEAR for '\N'), ratings as float32 and strings as
+# Python strings. Strings are written as a single UTF-8 "heap" of NUL-terminated values plus an offsets array,
+# everything else as a plain typed NumPy array.
+TABLE_SCHEMAS = {
+    MOVIES_TABLE: {
+        'tconst': 'imdb_id',
+        'primaryTitle': 'string',
+        'titlePattern': 'string',
+        'startYear': 'year',
+        'averageRating': 'float',
+    },
+    PERFORMANCES_TABLE: {
+        'tconst': 'imdb_id',
+        'nconst': 'imdb_id',
+        'characters': 'string',
+    },
+    ACTORS_TABLE: {
+        'nconst': 'imdb_id',
+        'primaryName': 'string',
+    },
+}
+
+# free-text columns only ever shown for a final answer, which are left out of a table unless asked for by name, and
+# are then best read from the store for just the rows needed
+TABLE_SIDE_COLUMNS = {
+    PERFORMANCES_TABLE: ['characters'],
+}
+
+# tables kept in key order on disk (within each year for the year-partitioned tables), so rows can be found by
+# binary search without reading or scanning the whole table
+TABLE_SORT_KEYS = {
+    MOVIES_TABLE: 'averageRating',
+    ACTORS_TABLE: 'nconst',
+}
+
+
+def imdb_ids_to_numbers(imdb_ids):
+    import pandas as pd
+    return pd.Series(imdb_ids).str.slice(2).astype(np.int32).to_numpy()
+
+
+def year_to_number(year):
+    # as in the TSV files, a year that is not a number is a missing one
+    try:
+        return int(year)
+    except (TypeError, ValueError):
+        return MISSING_YEAR
+
+
+def get_default_columns(table_name, available_columns):
+    side_columns = TABLE_SIDE_COLUMNS.get(table_name, [])
+    return [column_name for column_name in available_columns if column_name not in side_columns]
+
+
+def format_imdb_id(column_name, imdb_id_number):
+    return "{}{:0{}d}".format(IMDB_ID_PREFIXES[column_name], imdb_id_number, IMDB_ID_DIGITS)
+
+
+def format_imdb_ids(column_name, imdb_id_numbers):
+    return [format_imdb_id(column_name, imdb_id_number) for imdb_id_number in imdb_id_numbers]
+
+
+def is_data_store(store_dir):
+    if store_dir is None or not os.path.isfile(os.path.join(store_dir, MANIFEST_FILE_NAME)):
+        return False
+    return read_manifest(store_dir).get('format_version') == STORE_FORMAT_VERSION
+
+
+def read_manifest(store_dir):
+    with open(os.path.join(store_dir, MANIFEST_FILE_NAME)) as manifest_file:
+        return json.load(manifest_file)
+
+
+@contextlib.contextmanager
+def replacing_file(file_path, mode='wb'):
+    """Opens a file to be written alongside the given one and then moved into its place.
+
+    A process that has the old file memory-mapped keeps reading the old file, rather than having it truncated
+    underneath the mapping (which kills the process with SIGBUS).
+    """
+    partial_file_path = "{}.{}.partial".format(file_path, os.getpid())
+    try:
+        with open(partial_file_path, mode) as partial_file:
+            yield partial_file
+        os.replace(partial_file_path, file_path)
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(partial_file_path)
+
+
+def save_array(file_path, array):
+    # saved through a file object, as np.save would add .npy to the name of the partial file
+    with replacing_file(file_path) as array_file:
+        np.save(array_file, array)
+
+
+def write_manifest(store_dir, manifest):
+    with replacing_file(os.path.join(store_dir, MANIFEST_FILE_NAME), 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+
+
+def column_file_path(store_dir, table_name, column_name, extension):
+    return os.path.join(store_dir, table_name, "{}.{}".format(column_name, extension))
+
+
+def write_string_column(store_dir, table_name, column_name, values):
+    encoded_values = [str(value).encode('utf-8') + b'\x00' for value in values]
+    offsets = np.zeros(len(encoded_values) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded_values], out=offsets[1:])
+    with replacing_file(column_file_path(store_dir, table_name, column_name, 'heap')) as heap_file:
+        heap_file.write(b''.join(encoded_values))
+    save_array(column_file_path(store_dir, table_name, column_name, 'offsets.npy'), offsets)
+
+
+def read_string_column(store_dir, table_name, column_name, row_ranges=None):
+    with open(column_file_path(store_dir, table_name, column_name, 'heap'), 'rb') as heap_file:
+        if row_ranges is None:
+            # a single decode and split is far quicker than slicing out each value using the offsets
+            return heap_file.read().decode('utf-8').split('\x00')[:-1]
+        offsets = np.load(column_file_path(store_dir, table_name, column_name, 'offsets.npy'), mmap_mode='r')
+        values = []
+        for start_row, end_row in row_ranges:
+            heap_file.seek(offsets[start_row])
+            values.extend(heap_file.read(offsets[end_row] - offsets[start_row]).decode('utf-8').split('\x00')[:-1])
+        return values
+
+
+class MappedStringColumn:
+    """A string column of the store, its heap and offsets mapped read-only, whose values are only decoded for the
+    rows asked for.
+
+    Like the mapped fixed-width columns, the mapping is shared through the OS page cache by every process mapping the
+    same store. As the store's files are replaced rather than rewritten, it keeps reading the column as it was when it
+    was mapped, however the store changes afterwards.
+    """
+
+    def __init__(self, store_dir, table_name, column_name):
+        heap_file_path = column_file_path(store_dir, table_name, column_name, 'heap')
+        # an empty file cannot be mapped
+        self.heap = np.memmap(heap_file_path, dtype=np.uint8, mode='r') if os.path.getsize(heap_file_path) \
+            else np.zeros(0, dtype=np.uint8)
+        self.offsets = np.load(column_file_path(store_dir, table_name, column_name, 'offsets.npy'), mmap_mode='r')
+
+    def __len__(self):
+        return self.offsets.shape[0] - 1
+
+    def __getitem__(self, row):
+        # the stored length includes the NUL terminator
+        return self.heap[self.offsets[row]:self.offsets[row + 1] - 1].tobytes().decode('utf-8')
+
+    def take(self, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        if rows.shape[0] == 0:
+            return []
+        first_row, last_row = int(rows.min()), int(rows.max())
+        if rows.shape[0] * 16 < last_row - first_row:
+            return [self[row] for row in rows]
+        # when the rows are close together, a single decode and split of the span of them is far quicker
+        span_values = self.heap[self.offsets[first_row]:self.offsets[last_row + 1]].tobytes().decode('utf-8') \
+            .split('\x00')
+        return [span_values[row - first_row] for row in rows]
+
+    def __deepcopy__(self, memo):
+        # read-only, so every copy of a table can share it
+        return self
+
+
+def get_string_values(data_frame, column_name, rows):
+    """The values of a string column at the given rows (positions) of a table, whether the column was read in or
+    left mapped in the store."""
+    if column_name in data_frame.columns:
+        return data_frame[column_name].to_numpy()[rows]
+    # tables read from the store are indexed by the rows they are stored at
+    store_rows = data_frame.index.to_numpy()[rows]
+    return np.array(data_frame.attrs[MAPPED_COLUMNS][column_name].take(store_rows), dtype=object)
+
+
+def has_string_column(data_frame, column_name):
+    return column_name in data_frame.columns or column_name in data_frame.attrs.get(MAPPED_COLUMNS, {})
+
+
+def encode_column(column_type, values):
+    import pandas as pd
+    if column_type == 'imdb_id':
+        if pd.api.types.is_integer_dtype(values):
+            return values.to_numpy(dtype=np.int32)
+        return imdb_ids_to_numbers(values)
+    if column_type == 'year':
+        return pd.to_numeric(values, errors='coerce').fillna(MISSING_YEAR).to_numpy(dtype=np.int16)
+    return values.to_numpy(dtype=np.float32)
+
+
+def to_store_representation(table_name, data_frame):
+    """Converts a filtered TSV table to exactly the form read_table would give back for it."""
+    import pandas as pd
+    schema = TABLE_SCHEMAS[table_name]
+    table_data = {}
+    for column_name in data_frame.columns.intersection(schema.keys()):
+        column_type = schema[column_name]
+        if column_type == 'string':
+            table_data[column_name] = data_frame[column_name].astype(str).to_numpy()
+        else:
+            table_data[column_name] = encode_column(column_type, data_frame[column_name])
+    return pd.DataFrame(data=table_data)
+
+
+def read_tsv_table(table_name, tsv_file, columns=None):
+    """Reads a filtered TSV file straight into the typed columns of its table, leaving out any other columns."""
+    import pandas as pd
+    schema = TABLE_SCHEMAS[table_name]
+    # everything but the ratings is parsed as a string first, so a title such as 'NA' is never taken to be missing
+    data_frame = pd.read_csv(tsv_file, sep='\t', usecols=lambda column_name: column_name in (columns or schema),
+                             dtype={column_name: np.float32 if column_type == 'float' else str
+                                    for column_name, column_type in schema.items()},
+                             keep_default_na=False)
+    return to_store_representation(table_name, data_frame)
+
+
+def get_performance_years(movie_ids, movie_years, performance_movie_ids):
+    import pandas as pd
+    movie_rows = pd.Index(movie_ids).get_indexer(performance_movie_ids)
+    return np.where(movie_rows >= 0, np.asarray(movie_years)[movie_rows], MISSING_YEAR).astype(np.int16)
+
+
+def get_year_partitions(sorted_years):
+    years, start_rows = np.unique(sorted_years, return_index=True)
+    end_rows = np.append(start_rows[1:], len(sorted_years))
+    return {str(year): [int(start_row), int(end_row)] for year, start_row, end_row in zip(years, start_rows, end_rows)}
+
+
+def get_partition_years(table_manifest):
+    partition_years = np.full(table_manifest['rows'], MISSING_YEAR, dtype=np.int16)
+    for year, (start_row, end_row) in table_manifest.get('partitions', {}).items():
+        partition_years[start_row:end_row] = int(year)
+    return partition_years
+
+
+def get_partition_row_ranges(table_manifest, years):
+    if years is None or 'partitions' not in table_manifest:
+        return None
+    partitions = table_manifest['partitions']
+    return sorted(partitions[str(year)] for year in years if str(year) in partitions)
+
+
+def write_table(store_dir, table_name, data_frame, partition_years=None):
+    os.makedirs(os.path.join(store_dir, table_name), exist_ok=True)
+    schema = TABLE_SCHEMAS[table_name]
+    sort_key = TABLE_SORT_KEYS.get(table_name)
+    table_manifest = {
+        'rows': int(data_frame.shape[0]),
+        'columns': schema,
+        'sorted_by': sort_key,
+    }
+    # lexsort sorts on its last key first
+    sort_columns = [encode_column(schema[sort_key], data_frame[sort_key])] if sort_key else []
+    if partition_years is not None:
+        sort_columns.append(np.asarray(partition_years))
+    if sort_columns:
+        sorted_order = np.lexsort(sort_columns)
+        data_frame = data_frame.iloc[sorted_order]
+    if partition_years is not None:
+        table_manifest['partitioned_by'] = 'year'
+        table_manifest['partitions'] = get_year_partitions(np.asarray(partition_years)[sorted_order])
+    for column_name, column_type in schema.items():
+        if column_type == 'string':
+            write_string_column(store_dir, table_name, column_name, data_frame[column_name])
+        else:
+            save_array(column_file_path(store_dir, table_name, column_name, 'npy'),
+                       encode_column(column_type, data_frame[column_name]))
+    return table_manifest
+
+
+def read_table(store_dir, table_name, columns=None, mmap=False, years=None):
+    """Reads a table from the store, optionally memory-mapping its columns read-only.
+
+    Mapped columns are shared through the OS page cache by every process reading the same store, rather than
+    each holding a private copy. Mapped string columns are not decoded at all, but kept in the table's attrs, and
+    their values read with get_string_values for just the rows needed. Given some years, a year-partitioned table is
+    read for just those years, and indexed by the rows they are stored at. Side columns are only read in when asked
+    for by name, and are otherwise always left mapped, so the table can still read them once the store has changed.
+    """
+    import pandas as pd
+    table_manifest = read_manifest(store_dir)['tables'][table_name]
+    schema = table_manifest['columns']
+    row_ranges = get_partition_row_ranges(table_manifest, years)
+    row_index = None
+    if row_ranges is not None:
+        # so the mapped columns can still be read for any of the rows
+        row_index = pd.Index(np.concatenate([np.arange(0)] + [np.arange(start_row, end_row)
+                                                              for start_row, end_row in row_ranges]))
+    table_columns = {}
+    mapped_columns = {}
+    for column_name in columns or get_default_columns(table_name, schema.keys()):
+        column_type = schema[column_name]
+        if column_type == 'string' and mmap:
+            mapped_columns[column_name] = MappedStringColumn(store_dir, table_name, column_name)
+            continue
+        if column_type == 'string':
+            column_values = np.array(read_string_column(store_dir, table_name, column_name, row_ranges), dtype=object)
+        else:
+            column_values = np.load(column_file_path(store_dir, table_name, column_name, 'npy'),
+                                    mmap_mode='r' if mmap or row_ranges is not None else None)
+            if row_ranges is not None:
+                column_values = np.concatenate([column_values[:0]] + [column_values[start_row:end_row]
+                                                                      for start_row, end_row in row_ranges])
+        table_columns[column_name] = pd.Series(column_values, index=row_index, name=column_name, copy=False)
+    for column_name in TABLE_SIDE_COLUMNS.get(table_name, []):
+        if column_name not in table_columns and column_name not in mapped_columns:
+            mapped_columns[column_name] = MappedStringColumn(store_dir, table_name, column_name)
+    if table_columns:
+        # unlike the DataFrame constructor, concat leaves each column in its own (possibly mapped) array
+        data_frame = pd.concat(table_columns, axis=1, copy=False)
+    else:
+        data_frame = pd.DataFrame(index=pd.RangeIndex(table_manifest['rows']) if row_index is None else row_index)
+    if mapped_columns:
+        data_frame.attrs[MAPPED_COLUMNS] = mapped_columns
+    return data_frame
+
+
+def make_incidence_arrays(movie_ids, performance_movie_ids, performance_actor_ids):
+    """CSR arrays of the actor x movie incidence matrix, each cell counting an actor's performances in a movie.
+
+    The same cells are also given movie by movie (the transposed matrix), so the actors in a set of movies can be
+    found without scanning the whole matrix.
+    """
+    import pandas as pd
+    actor_ids, actor_rows = np.unique(performance_actor_ids, return_inverse=True)
+    number_of_movies = len(movie_ids)
+    movie_columns = pd.Index(movie_ids).get_indexer(performance_movie_ids)
+    in_movies = movie_columns >= 0
+    cell_keys, cell_counts = np.unique(actor_rows[in_movies].astype(np.int64) * max(number_of_movies, 1) +
+                                       movie_columns[in_movies], return_counts=True)
+    cell_rows, cell_columns = np.divmod(cell_keys, max(number_of_movies, 1))
+    # scipy copies index arrays that are not all of the same type, which would defeat mapping them
+    index_type = np.int32 if max(len(cell_keys), number_of_movies) < np.iinfo(np.int32).max else np.int64
+    indptr = np.zeros(len(actor_ids) + 1, dtype=index_type)
+    np.cumsum(np.bincount(cell_rows, minlength=len(actor_ids)), out=indptr[1:])
+    movie_indptr = np.zeros(number_of_movies + 1, dtype=index_type)
+    np.cumsum(np.bincount(cell_columns, minlength=number_of_movies), out=movie_indptr[1:])
+    movie_order = np.argsort(cell_columns, kind='stable')
+    return {
+        'actor_ids': actor_ids,
+        'indptr': indptr,
+        'indices': cell_columns.astype(index_type),
+        'data': cell_counts.astype(np.int16),
+        'movie_indptr': movie_indptr,
+        'movie_indices': cell_rows[movie_order].astype(index_type),
+        'movie_data': cell_counts[movie_order].astype(np.int16),
+    }
+
+
+def make_filmography_arrays(movie_ids, performance_movie_ids, performance_actor_ids):
+    """Each actor's performances, given by their rows in the performances table and the rows of their movies in the
+    movies table (-1 for a movie that is not in it), grouped by actor."""
+    import pandas as pd
+    performance_rows = np.argsort(performance_actor_ids, kind='stable')
+    actor_ids, first_performances = np.unique(np.asarray(performance_actor_ids)[performance_rows], return_index=True)
+    movie_rows = pd.Index(movie_ids).get_indexer(np.asarray(performance_movie_ids)[performance_rows])
+    index_type = np.int32 if max(len(performance_rows), len(movie_ids)) < np.iinfo(np.int32).max else np.int64
+    return {
+        'actor_ids': actor_ids,
+        'indptr': np.append(first_performances, len(performance_rows)).astype(index_type),
+        'performance_rows': performance_rows.astype(index_type),
+        'movie_rows': movie_rows.astype(index_type),
+    }
+
+
+def index_array_path(store_dir, index_name, array_name):
+    return os.path.join(store_dir, INDEXES_DIR_NAME, index_name, "{}.npy".format(array_name))
+
+
+def write_index(store_dir, index_name, index_arrays):
+    os.makedirs(os.path.join(store_dir, INDEXES_DIR_NAME, index_name), exist_ok=True)
+    for array_name, array in index_arrays.items():
+        save_array(index_array_path(store_dir, index_name, array_name), array)
+    return {
+        'arrays': {array_name: str(array.dtype) for array_name, array in index_arrays.items()},
+    }
+
+
+def read_index(store_dir, index_name, mmap=True):
+    array_names = read_manifest(store_dir)['indexes'][index_name]['arrays']
+    return {array_name: np.load(index_array_path(store_dir, index_name, array_name), mmap_mode='r' if mmap else None)
+            for array_name in array_names}
+
+
+def write_incidence_index(store_dir):
+    # built from the columns as written, so the matrix columns always line up with the stored movies
+    def stored_ids(table_name, column_name):
+        return np.load(column_file_path(store_dir, table_name, column_name, 'npy'))
+
+    return write_index(store_dir, INCIDENCE_INDEX, make_incidence_arrays(stored_ids(MOVIES_TABLE, 'tconst'),
+                                                                         stored_ids(PERFORMANCES_TABLE, 'tconst'),
+                                                                         stored_ids(PERFORMANCES_TABLE, 'nconst')))
+
+
+def write_filmography_index(store_dir):
+    def stored_ids(table_name, column_name):
+        return np.load(column_file_path(store_dir, table_name, column_name, 'npy'))
+
+    return write_index(store_dir, FILMOGRAPHY_INDEX, make_filmography_arrays(stored_ids(MOVIES_TABLE, 'tconst'),
+                                                                             stored_ids(PERFORMANCES_TABLE, 'tconst'),
+                                                                             stored_ids(PERFORMANCES_TABLE, 'nconst')))
+
+
+def map_actor_names(store_dir):
+    """The store's actor IDs, in order, and their names, mapped read-only rather than read in, for an actor name
+    index."""
+    actors_df = read_table(store_dir, ACTORS_TABLE, mmap=True)
+    return actors_df['nconst'].to_numpy(), actors_df.attrs[MAPPED_COLUMNS]['primaryName']
+
+
+def get_dataset_version(store_dir):
+    if store_dir is None or not os.path.isfile(os.path.join(store_dir, MANIFEST_FILE_NAME)):
+        return 0
+    return read_manifest(store_dir).get('dataset_version', 0)
+
+
+def get_build_id(store_dir):
+    # unlike the dataset version, which starts again at 1 when a store is deleted and rebuilt, unique to every write
+    return read_manifest(store_dir).get('build_id')
+
+
+def write_data_store(store_dir, movies_df, performances_df, actors_df):
+    print("Writing the binary data store to {}...".format(store_dir))
+    os.makedirs(store_dir, exist_ok=True)
+    dataset_version = get_dataset_version(store_dir) + 1
+    if os.path.exists(os.path.join(store_dir, MANIFEST_FILE_NAME)):
+        os.remove(os.path.join(store_dir, MANIFEST_FILE_NAME))
+    # the movies and performances are laid out as one contiguous run of rows per (movie) release year, so readers
+    # can skip the years they don't need - a puzzle's clues only ever touch a handful of them
+    movie_years = encode_column('year', movies_df['startYear'])
+    performance_years = get_performance_years(encode_column('imdb_id', movies_df['tconst']),
+                                              movie_years,
+                                              encode_column('imdb_id', performances_df['tconst']))
+    manifest = {
+        'format_version': STORE_FORMAT_VERSION,
+        'dataset_version': dataset_version,
+        'build_id': uuid.uuid4().hex,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'tables': {
+            MOVIES_TABLE: write_table(store_dir, MOVIES_TABLE, movies_df, movie_years),
+            PERFORMANCES_TABLE: write_table(store_dir, PERFORMANCES_TABLE, performances_df, performance_years),
+            ACTORS_TABLE: write_table(store_dir, ACTORS_TABLE, actors_df),
+        }
+    }
+    manifest['indexes'] = {
+        INCIDENCE_INDEX: write_incidence_index(store_dir),
+        FILMOGRAPHY_INDEX: write_filmography_index(store_dir),
+    }
+    # the manifest goes last, so a half-written store is never mistaken for a usable one
+    write_manifest(store_dir, manifest)
+    print("Finished writing the binary data store to {}".format(store_dir))
+    return manifest
+
+
+def update_data_store(store_dir, changed_tables, refresh_summary):
+    """Rewrites only the given tables of an existing store, and stamps it with the next dataset version."""
+    manifest = read_manifest(store_dir)
+    manifest['dataset_version'] = manifest.get('dataset_version', 0) + 1
+    manifest['build_id'] = uuid.uuid4().hex
+    print("Updating the {} table(s) of the data store at {} to dataset version {}..."
+          .format(', '.join(changed_tables) or 'no', store_dir, manifest['dataset_version']))
+    changed_tables = dict(changed_tables)
+    if MOVIES_TABLE in changed_tables:
+        movies_df = changed_tables[MOVIES_TABLE]
+        movie_ids, movie_years = movies_df['tconst'].to_numpy(), encode_column('year', movies_df['startYear'])
+    else:
+        movie_ids = np.load(column_file_path(store_dir, MOVIES_TABLE, 'tconst', 'npy'))
+        movie_years = get_partition_years(manifest['tables'][MOVIES_TABLE])
+    if MOVIES_TABLE in changed_tables and PERFORMANCES_TABLE not in changed_tables:
+        # a movie changing year moves its performances to another partition, even when they have not changed
+        stored_performance_years = get_performance_years(
+            movie_ids, movie_years, np.load(column_file_path(store_dir, PERFORMANCES_TABLE, 'tconst', 'npy')))
+        if not np.array_equal(stored_performance_years, get_partition_years(manifest['tables'][PERFORMANCES_TABLE])):
+            changed_tables[PERFORMANCES_TABLE] = read_table(store_dir, PERFORMANCES_TABLE,
+                                                            columns=list(TABLE_SCHEMAS[PERFORMANCES_TABLE]))
+    os.remove(os.path.join(store_dir, MANIFEST_FILE_NAME))
+    for table_name, data_frame in changed_tables.items():
+        partition_years = None
+        if table_name == MOVIES_TABLE:
+            partition_years = movie_years
+        elif table_name == PERFORMANCES_TABLE:
+            partition_years = get_performance_years(movie_ids, movie_years, data_frame['tconst'].to_numpy())
+        manifest['tables'][table_name] = write_table(store_dir, table_name, data_frame, partition_years)
+    if {MOVIES_TABLE, PERFORMANCES_TABLE} & set(changed_tables):
+        manifest['indexes'][INCIDENCE_INDEX] = write_incidence_index(store_dir)
+        manifest['indexes'][FILMOGRAPHY_INDEX] = write_filmography_index(store_dir)
+    manifest['refreshed'] = datetime.now().isoformat(timespec='seconds')
+    manifest['last_refresh'] = refresh_summary
+    write_manifest(store_dir, manifest)
+    return manifest
+
+
+def read_data_table(table_name, tsv_file=None, store_dir=None, mmap=False, years=None):
+    """Reads a table from the data store if there is one, else from its TSV file.
+
+    The years are only a hint: the TSV files are always read in full, so callers still filter on them. The side
+    columns are left in the store, but as there is no reading just a few rows of a TSV file, are read in from one.
+    """
+    if is_data_store(store_dir):
+        print("Reading the {} table from the data store at {}".format(table_name, store_dir))
+        return read_table(store_dir, table_name, mmap=mmap, years=years)
+    if store_dir:
+        print("No usable data store found at {} - falling back to {}".format(store_dir, tsv_file))
+    return read_tsv_table(table_name, tsv_file)
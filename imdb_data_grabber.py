@@ -1,14 +1,42 @@
 import argparse
+import gzip
 import hashlib
+import json
 import os
-import pathlib
-import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 
+import numpy as np
 import pandas as pd
 import requests
-from rich.progress import Progress, BarColumn, SpinnerColumn
+from rich.progress import Progress, BarColumn, DownloadColumn, SpinnerColumn
 
 from cli import SmartFormatter
+from data_store import write_data_store, is_data_store, read_table, read_tsv_table, to_store_representation, \
+    update_data_store, DEFAULT_STORE_DIR_NAME, MOVIES_TABLE, PERFORMANCES_TABLE, ACTORS_TABLE
+from movie_clues import movie_title_to_clues_pattern
+from profiler import profile_stage, profiling
+
+IMDB_BASE_URL = 'https://datasets.imdbws.com'
+MOVIES_FILE_NAME = 'title.basics.tsv.gz'
+REVIEWS_FILE_NAME = 'title.ratings.tsv.gz'
+PERFORMANCES_FILE_NAME = 'title.principals.tsv.gz'
+ACTORS_FILE_NAME = 'name.basics.tsv.gz'
+IMDB_FILE_NAMES = [MOVIES_FILE_NAME, REVIEWS_FILE_NAME, PERFORMANCES_FILE_NAME, ACTORS_FILE_NAME]
+RAW_DIR_NAME = 'raw'
+DOWNLOAD_MANIFEST_FILE_NAME = 'downloads.json'
+DOWNLOAD_BLOCK_SIZE = 1024 * 1024
+DOWNLOAD_TIMEOUT_SECONDS = 60
+DEFAULT_DOWNLOAD_WORKERS = 4
+DEFAULT_MEMORY_LIMIT_MB = 512
+REFRESH_MODES = ['incremental', 'full']
+MEMORY_SAMPLE_ROWS = 10000
+# parsing buffers, the filtered copy and the TSV formatting of each chunk all need memory on top of the chunk itself
+CHUNK_MEMORY_OVERHEAD = 4
+
+# the download threads all update the one manifest file
+download_manifest_lock = threading.Lock()
 
 
 def parse_args():
@@ -21,67 +49,209 @@ def parse_args():
                                          formatter_class=SmartFormatter)
     arg_parser.add_argument('-o',
                             '--output-dir',
-                            help="R|the full path to a local directory to write the downloaded files to.\n"
-                                 "Mandatory.",
+                            help="R|the full path to a local directory to write the filtered files to. The raw\n"
+                                 "downloads are kept in its '{}' sub-directory, so later runs only need to\n"
+                                 "download the files that have changed since.\n"
+                                 "Mandatory.".format(RAW_DIR_NAME),
                             required=True)
+    arg_parser.add_argument('-m',
+                            '--memory-limit',
+                            help="R|the rough memory, in MB, to read and filter each chunk of a raw IMDb file\n"
+                                 "in. This bounds the reading of the raw files, not the whole run: the rows\n"
+                                 "kept, and the building of the data store from them, still take memory in\n"
+                                 "proportion to the filtered data. Optional, default is {}."
+                                 .format(DEFAULT_MEMORY_LIMIT_MB),
+                            type=int,
+                            default=DEFAULT_MEMORY_LIMIT_MB)
+    arg_parser.add_argument('-w',
+                            '--download-workers',
+                            help="R|the number of files to download at the same time. Optional, default is {}."
+                                 .format(DEFAULT_DOWNLOAD_WORKERS),
+                            type=int,
+                            default=DEFAULT_DOWNLOAD_WORKERS)
+    arg_parser.add_argument('-u',
+                            '--base-url',
+                            help="R|the URL to download the IMDb data files from. Optional, default is\n{}."
+                                 .format(IMDB_BASE_URL),
+                            default=IMDB_BASE_URL)
+    arg_parser.add_argument('-r',
+                            '--refresh-mode',
+                            help="R|how to bring an existing data store up to date with changed IMDb files:\n"
+                                 "'incremental' only refilters the tables whose raw files changed, and applies\n"
+                                 "the differences (added and removed titles, changed ratings, new performances)\n"
+                                 "to the store; 'full' refilters every file and rewrites the whole store.\n"
+                                 "Optional, default is '{}'.".format(REFRESH_MODES[0]),
+                            choices=REFRESH_MODES,
+                            default=REFRESH_MODES[0])
+    arg_parser.add_argument('-p',
+                            '--profile',
+                            help="R|the full path to a directory to write a profile of the run out to. Optional.\n"
+                                 "The time taken by each stage (downloading, filtering each file and building\n"
+                                 "or refreshing the store), the rows it produced and the peak memory are\n"
+                                 "written as profile.json, as a Chrome trace in trace.json and as\n"
+                                 "Prometheus-style counters in metrics.prom.")
     return vars(arg_parser.parse_args())
 
 
-def file_md5(file_path):
-    return hashlib.md5(pathlib.Path(file_path).read_bytes()).hexdigest()
+def read_download_manifest(raw_dir):
+    manifest_path = os.path.join(raw_dir, DOWNLOAD_MANIFEST_FILE_NAME)
+    if not os.path.isfile(manifest_path):
+        return {}
+    with open(manifest_path) as manifest_file:
+        return json.load(manifest_file)
 
 
-def download_file(local_path, url):
-    print("Looking for {}...".format(local_path))
-    if not pathlib.Path.exists(pathlib.Path(local_path)):
-        print("\t{} Not found".format(local_path))
-        with Progress("\tDownloading {}".format(url), BarColumn(), transient=True) as progress:
-            task = progress.add_task("Downloading", start=False)
-            with requests.get(url, stream=True) as r:
-                with open(local_path, 'wb') as f:
-                    shutil.copyfileobj(r.raw, f)
-            progress.update(task)
-        print("\tDownloaded {}".format(url))
-        return True
-    else:
-        print("\t{} already exists with eTag {} - will not download".format(local_path, file_md5(local_path)))
-        return False
-
-
-def filter_movies_file(movies_file_path):
-    movies_data_frame = pd.read_csv(movies_file_path, sep='\t')
-
-    print("\tRead in {:,} rows - filtering out non-movies...".format(movies_data_frame.shape[0]))
-    movies_data_frame = movies_data_frame[movies_data_frame.titleType == "movie"]
-    print("\tFiltered down to {:,} movie titles".format(movies_data_frame.shape[0]))
-
-    print("\tRemoving unnecessary columns...")
-    movies_data_frame.drop(['titleType', 'originalTitle', 'isAdult', 'endYear', 'runtimeMinutes', 'genres'],
-                           axis='columns',
-                           inplace=True)
-    print("\tFinished Removing unnecessary columns")
+def get_download_record(raw_dir, file_name):
+    with download_manifest_lock:
+        return read_download_manifest(raw_dir).get(file_name)
 
-    print("\tWriting filtered file to {}...".format(movies_file_path))
-    movies_data_frame.to_csv(movies_file_path, sep='\t', compression='gzip', index=False)
-    print("\tFinished writing filtered file to {}".format(movies_file_path))
-    return movies_data_frame
 
+def update_download_record(raw_dir, file_name, download_record):
+    with download_manifest_lock:
+        download_manifest = read_download_manifest(raw_dir)
+        if download_record:
+            download_manifest[file_name] = download_record
+        else:
+            download_manifest.pop(file_name, None)
+        manifest_path = os.path.join(raw_dir, DOWNLOAD_MANIFEST_FILE_NAME)
+        with open("{}.new".format(manifest_path), 'w') as manifest_file:
+            json.dump(download_manifest, manifest_file, indent=2)
+        os.replace("{}.new".format(manifest_path), manifest_path)
 
-def filter_reviews_file(reviews_file_path, movies_dataframe):
-    reviews_data_frame = pd.read_csv(reviews_file_path, sep='\t')
-    print("\tRead in {:,} rows - filtering out reviews for non-movies...".format(reviews_data_frame.shape[0]))
-    reviews_data_frame = \
-        reviews_data_frame[reviews_data_frame.tconst.isin(movies_dataframe.tconst)]
-    print("\tFiltered down to {:,} movie titles".format(reviews_data_frame.shape[0]))
 
-    print("\tRemoving unnecessary columns...")
-    reviews_data_frame.drop(['numVotes'], axis='columns', inplace=True)
-    print("\tFinished Removing unnecessary columns")
-
-    print("\tWriting filtered file to {}...".format(reviews_file_path))
-    reviews_data_frame.to_csv(reviews_file_path, sep='\t', compression='gzip', index=False)
-    print("\tFinished writing filtered file to {}".format(reviews_file_path))
-    return reviews_data_frame
+def download_file(local_path, url, progress=None):
+    print("Looking for {}...".format(local_path))
+    raw_dir, file_name = os.path.split(local_path)
+    partial_file_name = "{}.part".format(file_name)
+    partial_path = os.path.join(raw_dir, partial_file_name)
+    previous_download = get_download_record(raw_dir, file_name)
+    headers = {}
+    if previous_download and os.path.isfile(local_path):
+        # only fetch the file if it has changed since we last downloaded it
+        if previous_download.get('etag'):
+            headers['If-None-Match'] = previous_download['etag']
+        if previous_download.get('last_modified'):
+            headers['If-Modified-Since'] = previous_download['last_modified']
+    partial_size = os.path.getsize(partial_path) if os.path.isfile(partial_path) else 0
+    partial_download = get_download_record(raw_dir, partial_file_name) or {}
+    partial_validator = partial_download.get('etag') or partial_download.get('last_modified')
+    if partial_size and partial_validator:
+        # resume an interrupted download, provided the server still has the same version of the file
+        headers['Range'] = "bytes={}-".format(partial_size)
+        headers['If-Range'] = partial_validator
+
+    with requests.get(url, stream=True, headers=headers, timeout=DOWNLOAD_TIMEOUT_SECONDS) as response:
+        if response.status_code == 304:
+            print("\t{} has not changed since it was downloaded on {} - will not download"
+                  .format(url, previous_download['fetched']))
+            return None
+        if response.status_code == 416:
+            print("\tCannot resume the download of {} - starting again".format(url))
+            os.remove(partial_path)
+            update_download_record(raw_dir, partial_file_name, None)
+            return download_file(local_path, url, progress)
+        response.raise_for_status()
+        resuming = response.status_code == 206
+        if resuming:
+            print("\tResuming the download of {} from byte {:,}".format(url, partial_size))
+        else:
+            partial_size = 0
+        download_record = {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+        }
+        update_download_record(raw_dir, partial_file_name, download_record)
+        content_length = int(response.headers.get('Content-Length', 0))
+        task = progress.add_task(file_name, total=partial_size + content_length or None, completed=partial_size) \
+            if progress else None
+        md5 = hashlib.md5()
+        with open(partial_path, 'a+b' if resuming else 'w+b') as downloaded_file:
+            if resuming:
+                downloaded_file.seek(0)
+                for block in iter(lambda: downloaded_file.read(DOWNLOAD_BLOCK_SIZE), b''):
+                    md5.update(block)
+            # read the raw stream, so a gzip Content-Encoding is never unpacked into the .gz file
+            for block in response.raw.stream(DOWNLOAD_BLOCK_SIZE, decode_content=False):
+                md5.update(block)
+                downloaded_file.write(block)
+                if task is not None:
+                    progress.update(task, advance=len(block))
+    os.replace(partial_path, local_path)
+    download_record['md5'] = md5.hexdigest()
+    download_record['size'] = os.path.getsize(local_path)
+    download_record['fetched'] = datetime.now().isoformat(timespec='seconds')
+    update_download_record(raw_dir, file_name, download_record)
+    update_download_record(raw_dir, partial_file_name, None)
+    print("\tDownloaded {} ({:,} bytes, md5 {})".format(url, download_record['size'], download_record['md5']))
+    return download_record
+
+
+def download_files(raw_dir, file_urls, max_workers=DEFAULT_DOWNLOAD_WORKERS):
+    with Progress("\tDownloading {task.description}", BarColumn(), DownloadColumn(), transient=True) as progress, \
+            ThreadPoolExecutor(max_workers=max_workers) as executor, \
+            profile_stage('download_files') as stage:
+        downloads = {
+            file_name: executor.submit(download_file, os.path.join(raw_dir, file_name), url, progress)
+            for file_name, url in file_urls.items()
+        }
+        changed_files = {file_name for file_name, download in downloads.items() if download.result()}
+        stage['rows'] = len(changed_files)
+        return changed_files
+
+
+def rows_per_chunk(file_path, column_types, memory_limit_mb):
+    sample_df = pd.read_csv(file_path, sep='\t', usecols=list(column_types), dtype=column_types,
+                            nrows=MEMORY_SAMPLE_ROWS)
+    bytes_per_row = max(sample_df.memory_usage(deep=True).sum() / max(sample_df.shape[0], 1), 1)
+    return max(int(memory_limit_mb * 1024 * 1024 / (bytes_per_row * CHUNK_MEMORY_OVERHEAD)), 1)
+
+
+def filter_file_in_chunks(file_path, column_types, chunk_filter, output_columns, memory_limit_mb,
+                          returned_columns=None, output_file_path=None):
+    output_file_path = output_file_path or file_path
+    chunk_rows = rows_per_chunk(file_path, column_types, memory_limit_mb)
+    print("\tReading in chunks of {:,} rows, each filtered within {:,}MB of memory..."
+          .format(chunk_rows, memory_limit_mb))
+    filtering_file_path = "{}.filtering".format(output_file_path)
+    rows_read = 0
+    kept_chunks = []
+    with gzip.open(filtering_file_path, 'wt', encoding='utf-8', newline='') as filtered_file:
+        chunks = pd.read_csv(file_path, sep='\t', usecols=list(column_types), dtype=column_types,
+                             chunksize=chunk_rows)
+        for chunk_number, chunk in enumerate(chunks):
+            rows_read += chunk.shape[0]
+            chunk = chunk_filter(chunk)[output_columns]
+            chunk.to_csv(filtered_file, sep='\t', header=chunk_number == 0, index=False)
+            kept_chunks.append(chunk[returned_columns or output_columns])
+    os.replace(filtering_file_path, output_file_path)
+    filtered_df = pd.concat(kept_chunks, ignore_index=True) if kept_chunks \
+        else pd.DataFrame(columns=returned_columns or output_columns)
+    print("\tRead in {:,} rows and kept {:,} of them".format(rows_read, filtered_df.shape[0]))
+    print("\tFinished writing filtered file to {}".format(output_file_path))
+    return filtered_df
+
+
+def filter_movies_file(movies_file_path, memory_limit_mb=DEFAULT_MEMORY_LIMIT_MB, output_file_path=None):
+    print("\tFiltering out non-movies and unnecessary columns...")
+    return filter_file_in_chunks(movies_file_path,
+                                 {'tconst': str, 'titleType': 'category', 'primaryTitle': str, 'startYear': str},
+                                 lambda chunk: chunk[chunk.titleType == "movie"],
+                                 ['tconst', 'primaryTitle', 'startYear'],
+                                 memory_limit_mb,
+                                 output_file_path=output_file_path)
+
+
+def filter_reviews_file(reviews_file_path, movies_dataframe, memory_limit_mb=DEFAULT_MEMORY_LIMIT_MB,
+                        output_file_path=None):
+    print("\tFiltering out reviews for non-movies and unnecessary columns...")
+    movie_ids = pd.Index(movies_dataframe.tconst)
+    return filter_file_in_chunks(reviews_file_path,
+                                 {'tconst': str, 'averageRating': np.float64},
+                                 lambda chunk: chunk[chunk.tconst.isin(movie_ids)],
+                                 ['tconst', 'averageRating'],
+                                 memory_limit_mb,
+                                 output_file_path=output_file_path)
 
 
 def augment_movies_file_with_review_scores(movies_file_path, movies_dataframe, reviews_dataframe):
@@ -100,100 +270,240 @@ def augment_movies_file_with_review_scores(movies_file_path, movies_dataframe, r
     return full_df
 
 
-def filter_actors_file(actors_file_path, performances_dataframe=None):
-    actors_data_frame = pd.read_csv(actors_file_path, sep='\t')
-
-    print("\tRead in {:,} rows - filtering out non-actors...".format(actors_data_frame.shape[0]))
-    actors_data_frame = actors_data_frame[(actors_data_frame.primaryProfession.str.contains("actor")) |
-                                          (actors_data_frame.primaryProfession.str.contains("actress"))]
-    print("\tFiltered down to {:,} actors".format(actors_data_frame.shape[0]))
-
+def filter_actors_file(actors_file_path, performances_dataframe=None, memory_limit_mb=DEFAULT_MEMORY_LIMIT_MB,
+                       output_file_path=None):
     if performances_dataframe is not None:
-        print("\tFiltering out people we don't have performances for, using dataframe containing {:,} performances"
+        print("\tFiltering out non-actors and people we don't have performances for, using {:,} performances"
               .format(performances_dataframe.shape[0]))
-        actors_data_frame = \
-            actors_data_frame[actors_data_frame.nconst.isin(performances_dataframe.nconst)]
-    print("\tFiltered down to {:,} actors".format(actors_data_frame.shape[0]))
-
-    print("\tRemoving unnecessary columns...")
-    actors_data_frame.drop(['birthYear', 'deathYear', 'primaryProfession', 'knownForTitles'],
-                           axis='columns',
-                           inplace=True)
-    print("\tFinished Removing unnecessary columns")
+        actor_ids = pd.Index(performances_dataframe.nconst.unique())
+    else:
+        print("\tFiltering out non-actors...")
+        actor_ids = None
 
-    print("\tWriting filtered file to {}...".format(actors_file_path))
-    actors_data_frame.to_csv(actors_file_path, sep='\t', compression='gzip', index=False)
-    print("\tFinished writing filtered file to {}".format(actors_file_path))
+    def actors_in_chunk(chunk):
+        chunk = chunk[chunk.primaryProfession.str.contains("actor|actress", na=False)]
+        return chunk if actor_ids is None else chunk[chunk.nconst.isin(actor_ids)]
 
+    return filter_file_in_chunks(actors_file_path,
+                                 {'nconst': str, 'primaryName': str, 'primaryProfession': str},
+                                 actors_in_chunk,
+                                 ['nconst', 'primaryName'],
+                                 memory_limit_mb,
+                                 output_file_path=output_file_path)
 
-def filter_performances_file(performances_file_path, movies_dataframe=None):
-    performances_df = pd.read_csv(performances_file_path, sep='\t')
 
-    print("\tRead in {:,} rows - filtering out non-acting categories...".format(performances_df.shape[0]))
-    performances_df = \
-        performances_df[(performances_df.category == "actor") |
-                        (performances_df.category == "actress")]
-    print("\tRemoved non-acting categories - we now have {:,} rows".format(performances_df.shape[0]))
+def filter_performances_file(performances_file_path, movies_dataframe=None, memory_limit_mb=DEFAULT_MEMORY_LIMIT_MB,
+                             output_file_path=None):
     if movies_dataframe is not None:
-        print("\tFiltering out performances in unknown using movies dataframe containing {:,} movies"
+        print("\tFiltering out non-acting categories and performances in non-movies, using {:,} movies"
               .format(movies_dataframe.shape[0]))
-        performances_df = \
-            performances_df[performances_df.tconst.isin(movies_dataframe.tconst)]
-    print("\tFiltered down to {:,} movie performances".format(performances_df.shape[0]))
-
-    print("\tRemoving unnecessary columns...")
-    performances_df.drop(['ordering', 'category', 'job'], axis='columns', inplace=True)
-    print("\tFinished Removing unnecessary columns")
-
-    print("\tWriting filtered file to {}...".format(performances_file_path))
-    performances_df.to_csv(performances_file_path, sep='\t', compression='gzip', index=False)
-    print("\tFinished writing filtered file to {}".format(performances_file_path))
+        movie_ids = pd.Index(movies_dataframe.tconst)
+    else:
+        print("\tFiltering out non-acting categories...")
+        movie_ids = None
+
+    def performances_in_chunk(chunk):
+        chunk = chunk[(chunk.category == "actor") | (chunk.category == "actress")]
+        return chunk if movie_ids is None else chunk[chunk.tconst.isin(movie_ids)]
+
+    # only the IDs are kept in memory, as the free-text characters column is by far the biggest
+    return filter_file_in_chunks(performances_file_path,
+                                 {'tconst': str, 'nconst': str, 'category': 'category', 'characters': str},
+                                 performances_in_chunk,
+                                 ['tconst', 'nconst', 'characters'],
+                                 memory_limit_mb,
+                                 returned_columns=['tconst', 'nconst'],
+                                 output_file_path=output_file_path)
+
+
+def build_data_store(store_dir, movies_file_path, performances_file_path, actors_file_path):
+    with profile_stage('read_filtered_files') as stage:
+        print("\tReading the filtered TSV files back in...")
+        movies_df = read_tsv_table(MOVIES_TABLE, movies_file_path)
+        performances_df = read_tsv_table(PERFORMANCES_TABLE, performances_file_path)
+        actors_df = read_tsv_table(ACTORS_TABLE, actors_file_path)
+        print("\tPrecomputing clue patterns for {:,} movie titles...".format(movies_df.shape[0]))
+        movies_df['titlePattern'] = movies_df['primaryTitle'].map(movie_title_to_clues_pattern)
+        stage['rows'] = movies_df.shape[0] + performances_df.shape[0] + actors_df.shape[0]
+    with profile_stage('write_data_store') as stage:
+        stage['rows'] = movies_df.shape[0] + performances_df.shape[0] + actors_df.shape[0]
+        return write_data_store(store_dir, movies_df, performances_df, actors_df)
+
+
+def filter_downloaded_file(raw_dir, data_dir, file_name, filter_function, memory_limit_mb, *filter_args):
+    raw_file, processed_file = os.path.join(raw_dir, file_name), os.path.join(data_dir, file_name)
+    print('-----------------------------------')
+    print("Filtering {} into {}".format(raw_file, processed_file))
+    with Progress("\tFiltering {}".format(raw_file), SpinnerColumn(), transient=True) as progress, \
+            profile_stage("filter_{}".format(file_name.split('.tsv')[0])) as stage:
+        task = progress.add_task("Filtering", start=False)
+        filtered_df = filter_function(raw_file, *filter_args, memory_limit_mb, processed_file)
+        stage['rows'] = filtered_df.shape[0]
+        progress.update(task)
+    return filtered_df
+
+
+def filter_movies_with_review_scores(raw_dir, data_dir, memory_limit_mb=DEFAULT_MEMORY_LIMIT_MB):
+    movies_df = filter_downloaded_file(raw_dir, data_dir, MOVIES_FILE_NAME, filter_movies_file, memory_limit_mb)
+    reviews_df = filter_downloaded_file(raw_dir, data_dir, REVIEWS_FILE_NAME, filter_reviews_file, memory_limit_mb,
+                                        movies_df)
+    return augment_movies_file_with_review_scores(os.path.join(data_dir, MOVIES_FILE_NAME), movies_df, reviews_df)
+
+
+def filter_downloaded_files(raw_dir, data_dir, memory_limit_mb=DEFAULT_MEMORY_LIMIT_MB):
+    movies_df = filter_movies_with_review_scores(raw_dir, data_dir, memory_limit_mb)
+    performances_df = filter_downloaded_file(raw_dir, data_dir, PERFORMANCES_FILE_NAME, filter_performances_file,
+                                             memory_limit_mb, movies_df)
+    filter_downloaded_file(raw_dir, data_dir, ACTORS_FILE_NAME, filter_actors_file, memory_limit_mb, performances_df)
+
+
+def diff_table(old_df, new_df, key_columns, value_columns=()):
+    value_columns = list(value_columns)
+    merged_df = pd.merge(old_df[key_columns + value_columns], new_df[key_columns + value_columns],
+                         on=key_columns, how='outer', suffixes=('_old', ''), indicator=True)
+    in_both = merged_df[merged_df['_merge'] == 'both']
+    changed = np.zeros(in_both.shape[0], dtype=bool)
+    for column_name in value_columns:
+        changed |= (in_both[column_name + '_old'] != in_both[column_name]).to_numpy()
+    return {
+        'added': merged_df.loc[merged_df['_merge'] == 'right_only', key_columns + value_columns].copy(),
+        'removed': merged_df.loc[merged_df['_merge'] == 'left_only', key_columns].copy(),
+        'changed': in_both.loc[changed, key_columns + value_columns].copy(),
+        'changed_old': in_both.loc[changed, [column_name + '_old' for column_name in value_columns]].copy(),
+    }
+
+
+def apply_table_delta(old_df, table_delta, key_columns):
+    replaced_keys = pd.concat([table_delta['removed'][key_columns], table_delta['changed'][key_columns]])
+    kept = ~pd.MultiIndex.from_frame(old_df[key_columns]).isin(pd.MultiIndex.from_frame(replaced_keys))
+    return pd.concat([old_df[kept], table_delta['changed'], table_delta['added']],
+                     ignore_index=True)[old_df.columns]
+
+
+def with_occurrence_numbers(data_frame, columns):
+    # the performances have no key of their own, so identical rows are told apart by how often they have been seen
+    return data_frame.assign(occurrence=data_frame.groupby(columns, sort=False).cumcount())
+
+
+def refresh_data_store(store_dir, raw_dir, data_dir, changed_files, memory_limit_mb=DEFAULT_MEMORY_LIMIT_MB):
+    """Brings an existing data store up to date with the changed raw files by applying only the differences.
+
+    Each table is only refiltered from the raw files when one of its inputs has changed, and only the tables
+    that turn out to differ from the store are rewritten.
+    """
+    changed_tables = {}
+    refresh_summary = {'changed_files': sorted(changed_files)}
+
+    movie_set_changed = False
+    if {MOVIES_FILE_NAME, REVIEWS_FILE_NAME} & set(changed_files):
+        new_movies_df = to_store_representation(MOVIES_TABLE,
+                                                filter_movies_with_review_scores(raw_dir, data_dir, memory_limit_mb))
+        old_movies_df = read_table(store_dir, MOVIES_TABLE)
+        movies_delta = diff_table(old_movies_df, new_movies_df, ['tconst'],
+                                  ['primaryTitle', 'startYear', 'averageRating'])
+        for rows in (movies_delta['added'], movies_delta['changed']):
+            rows['titlePattern'] = rows['primaryTitle'].map(movie_title_to_clues_pattern)
+        ratings_changed = movies_delta['changed']['averageRating'].to_numpy() != \
+            movies_delta['changed_old']['averageRating_old'].to_numpy()
+        refresh_summary[MOVIES_TABLE] = {
+            'added': len(movies_delta['added']),
+            'removed': len(movies_delta['removed']),
+            'changed': len(movies_delta['changed']),
+            'ratings_changed': int(ratings_changed.sum()),
+        }
+        if len(movies_delta['added']) or len(movies_delta['removed']) or len(movies_delta['changed']):
+            changed_tables[MOVIES_TABLE] = apply_table_delta(old_movies_df, movies_delta, ['tconst'])
+        movie_set_changed = bool(len(movies_delta['added']) or len(movies_delta['removed']))
+
+    actor_set_changed = False
+    performances_df = None
+    if PERFORMANCES_FILE_NAME in changed_files or movie_set_changed:
+        # the raw performances are filtered on the movies' IDs as they are written in the IMDb files
+        movies_df = pd.read_csv(os.path.join(data_dir, MOVIES_FILE_NAME), sep='\t', usecols=['tconst'],
+                                dtype={'tconst': str})
+        performances_df = filter_downloaded_file(raw_dir, data_dir, PERFORMANCES_FILE_NAME, filter_performances_file,
+                                                 memory_limit_mb, movies_df)
+        performance_columns = ['tconst', 'nconst', 'characters']
+        new_performances_df = with_occurrence_numbers(
+            read_tsv_table(PERFORMANCES_TABLE, os.path.join(data_dir, PERFORMANCES_FILE_NAME)), performance_columns)
+        old_performances_df = with_occurrence_numbers(
+            read_table(store_dir, PERFORMANCES_TABLE, columns=performance_columns), performance_columns)
+        performances_delta = diff_table(old_performances_df, new_performances_df,
+                                        performance_columns + ['occurrence'])
+        refresh_summary[PERFORMANCES_TABLE] = {
+            'added': len(performances_delta['added']),
+            'removed': len(performances_delta['removed']),
+        }
+        if len(performances_delta['added']) or len(performances_delta['removed']):
+            changed_tables[PERFORMANCES_TABLE] = apply_table_delta(
+                old_performances_df, performances_delta, performance_columns + ['occurrence'])[performance_columns]
+        actor_set_changed = set(old_performances_df.nconst) != set(new_performances_df.nconst)
+
+    if ACTORS_FILE_NAME in changed_files or actor_set_changed:
+        if performances_df is None:
+            performances_df = pd.read_csv(os.path.join(data_dir, PERFORMANCES_FILE_NAME), sep='\t',
+                                          usecols=['nconst'], dtype={'nconst': str})
+        new_actors_df = to_store_representation(
+            ACTORS_TABLE,
+            filter_downloaded_file(raw_dir, data_dir, ACTORS_FILE_NAME, filter_actors_file, memory_limit_mb,
+                                   performances_df))
+        old_actors_df = read_table(store_dir, ACTORS_TABLE)
+        actors_delta = diff_table(old_actors_df, new_actors_df, ['nconst'], ['primaryName'])
+        refresh_summary[ACTORS_TABLE] = {
+            'added': len(actors_delta['added']),
+            'removed': len(actors_delta['removed']),
+            'changed': len(actors_delta['changed']),
+        }
+        if len(actors_delta['added']) or len(actors_delta['removed']) or len(actors_delta['changed']):
+            changed_tables[ACTORS_TABLE] = apply_table_delta(old_actors_df, actors_delta, ['nconst'])
 
-    return performances_df
+    print('-----------------------------------')
+    print("Refresh summary: {}".format(json.dumps(refresh_summary)))
+    with profile_stage('update_data_store') as stage:
+        stage['rows'] = sum(table_df.shape[0] for table_df in changed_tables.values())
+        return update_data_store(store_dir, changed_tables, refresh_summary)
 
 
 if __name__ == '__main__':
     args = parse_args()
-    data_dir = args['output_dir']
-    print("Downloading IMDb data files to {} directory".format(data_dir))
-
-    base_url = "https://datasets.imdbws.com"
-
-    movies_file = 'title.basics.tsv.gz'
-    movies_df = None
-    local_movies_file = os.path.abspath(os.path.join(data_dir, movies_file))
-    print('-----------------------------------')
-    if download_file(local_movies_file, "{}/{}".format(base_url, movies_file)):
-        with Progress("\tFiltering {}".format(local_movies_file), SpinnerColumn(), transient=True) as progress:
-            task = progress.add_task("Filtering", start=False)
-            movies_df = filter_movies_file(local_movies_file)
-            progress.update(task)
-
-    reviews_file = 'title.ratings.tsv.gz'
-    reviews_df = None
-    local_reviews_file = os.path.abspath(os.path.join(data_dir, reviews_file))
-    print('-----------------------------------')
-    if download_file(local_reviews_file, "{}/{}".format(base_url, reviews_file)):
-        with Progress("\tFiltering {}".format(local_reviews_file), SpinnerColumn(), transient=True) as progress:
-            task = progress.add_task("Filtering", start=False)
-            reviews_df = filter_reviews_file(local_reviews_file, movies_df)
-            progress.update(task)
-    movies_df = augment_movies_file_with_review_scores(local_movies_file, movies_df, reviews_df)
-
-    performances_file = 'title.principals.tsv.gz'
-    local_performances_file = os.path.abspath(os.path.join(data_dir, performances_file))
-    print('-----------------------------------')
-    if download_file(local_performances_file, "{}/{}".format(base_url, performances_file)):
-        with Progress("\tFiltering {}".format(local_performances_file), SpinnerColumn(), transient=True) as progress:
-            task = progress.add_task("Filtering", start=False)
-            performances_data_frame = filter_performances_file(local_performances_file, movies_dataframe=movies_df)
-            progress.update(task)
-
-    actors_file = 'name.basics.tsv.gz'
-    local_actors_file = os.path.abspath(os.path.join(data_dir, actors_file))
-    print('-----------------------------------')
-    if download_file(local_actors_file, "{}/{}".format(base_url, actors_file)):
-        with Progress("\tFiltering {}".format(local_actors_file), SpinnerColumn(), transient=True) as progress:
-            task = progress.add_task("Filtering", start=False)
-            filter_actors_file(local_actors_file, performances_dataframe=performances_data_frame)
-            progress.update(task)
+    with profiling('imdb_data_grabber', args['profile']):
+        data_dir = args['output_dir']
+        raw_dir = os.path.abspath(os.path.join(data_dir, RAW_DIR_NAME))
+        os.makedirs(raw_dir, exist_ok=True)
+        print("Downloading IMDb data files to {} directory".format(raw_dir))
+        print('-----------------------------------')
+        changed_files = download_files(raw_dir,
+                                       {file_name: "{}/{}".format(args['base_url'], file_name)
+                                        for file_name in IMDB_FILE_NAMES},
+                                       args['download_workers'])
+
+        processed_files = [os.path.abspath(os.path.join(data_dir, file_name)) for file_name in IMDB_FILE_NAMES]
+        local_store_dir = os.path.abspath(os.path.join(data_dir, DEFAULT_STORE_DIR_NAME))
+        can_refresh_incrementally = args['refresh_mode'] == 'incremental' and is_data_store(local_store_dir) and \
+            all(os.path.isfile(processed_file) for processed_file in processed_files)
+        if can_refresh_incrementally:
+            if changed_files:
+                print("Incrementally refreshing the data store at {}".format(local_store_dir))
+                refresh_data_store(local_store_dir, raw_dir, data_dir, changed_files, args['memory_limit'])
+            else:
+                print("None of the IMDb data files have changed - the data store at {} is up to date"
+                      .format(local_store_dir))
+        else:
+            if changed_files or not all(os.path.isfile(processed_file) for processed_file in processed_files):
+                # every other file is filtered against the movies and performances, so any change means refiltering
+                # them all
+                filter_downloaded_files(raw_dir, data_dir, args['memory_limit'])
+            else:
+                print("None of the IMDb data files have changed - will not filter them")
+
+            print('-----------------------------------')
+            if changed_files or not is_data_store(local_store_dir):
+                with Progress("\tBuilding {}".format(local_store_dir), SpinnerColumn(), transient=True) as progress:
+                    task = progress.add_task("Building", start=False)
+                    build_data_store(local_store_dir,
+                                     os.path.join(data_dir, MOVIES_FILE_NAME),
+                                     os.path.join(data_dir, PERFORMANCES_FILE_NAME),
+                                     os.path.join(data_dir, ACTORS_FILE_NAME))
+                    progress.update(task)
+            else:
+                print("The data store at {} is up to date".format(local_store_dir))
@@ -1,12 +1,18 @@
+import os
 import pprint
+import time
 from dataclasses import dataclass
 from datetime import datetime
 
-from bs4 import BeautifulSoup
-from chromedriver_py import binary_path
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
+ACTORLE_URL = 'https://actorle.com/'
+# the user's cache directory, as the clues-files directory holds only the curated puzzles the accuracy test solves
+DEFAULT_CLUES_CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or
+                                       os.path.join(os.path.expanduser('~'), '.cache'),
+                                       'knacktorle', 'clues')
+CLUES_FILE_NAME_FORMAT = 'actorle-{}.txt'
+DEFAULT_FETCH_TIMEOUT_SECONDS = 30
+# the clue table is only worth parsing once its first row of clue cells has been rendered
+CLUES_TABLE_SELECTOR = 'table tr td'
 
 
 @dataclass(eq=True, frozen=True)
@@ -40,19 +46,97 @@ def read_movie_clues_file(clues_file_path):
     return movies_to_find
 
 
-def get_todays_clues_from_website():
-    url = 'https://actorle.com/'
-    print("Requesting {} via selenium".format(url))
+def make_headless_chrome_driver():
+    # selenium and the chromedriver binary are only imported when the website is actually requested, so solving
+    # from a clues file does not pay for them at start-up
+    from chromedriver_py import binary_path
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
     service_object = Service(binary_path)
     driver_options = Options()
-    driver_options.headless = True
-    driver = webdriver.Chrome(service=service_object, options=driver_options)
-    driver.get(url)
-    print("Retrieved a web page with the title '{}'".format(driver.title))
-    return parse_clues_from_html(driver.page_source)
+    driver_options.add_argument('--headless=new')
+    return webdriver.Chrome(service=service_object, options=driver_options)
+
+
+def get_clues_file_path(clues_cache_dir, puzzle_date):
+    return os.path.join(clues_cache_dir, CLUES_FILE_NAME_FORMAT.format(puzzle_date))
+
+
+class CluesFetcher:
+    """Fetches the day's clues, keeping one headless browser warm between fetches and caching the clues to
+    dated clues files. Use it as a context manager, or call close(), so that the browser is shut down."""
+
+    def __init__(self, url=ACTORLE_URL, clues_cache_dir=DEFAULT_CLUES_CACHE_DIR,
+                 timeout=DEFAULT_FETCH_TIMEOUT_SECONDS, driver_factory=make_headless_chrome_driver):
+        self.url = url
+        self.clues_cache_dir = clues_cache_dir
+        self.timeout = timeout
+        self.driver_factory = driver_factory
+        self.driver = None
+        # seconds spent in each stage of the most recent fetch
+        self.timings = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self.driver is not None:
+            self.driver.quit()
+            self.driver = None
+
+    def get_driver(self):
+        if self.driver is None:
+            start = time.perf_counter()
+            self.driver = self.driver_factory()
+            self.timings['driver_start'] = time.perf_counter() - start
+        return self.driver
+
+    def fetch_page_source(self):
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions
+        from selenium.webdriver.support.ui import WebDriverWait
+        driver = self.get_driver()
+        print("Requesting {} via selenium".format(self.url))
+        start = time.perf_counter()
+        driver.get(self.url)
+        WebDriverWait(driver, self.timeout).until(
+            expected_conditions.presence_of_element_located((By.CSS_SELECTOR, CLUES_TABLE_SELECTOR)))
+        self.timings['page_load'] = time.perf_counter() - start
+        print("Retrieved a web page with the title '{}'".format(driver.title))
+        return driver.page_source
+
+    def fetch(self, puzzle_date=None):
+        puzzle_date = puzzle_date or datetime.today().strftime('%Y-%m-%d')
+        self.timings = {}
+        start = time.perf_counter()
+        clues_file_path = get_clues_file_path(self.clues_cache_dir, puzzle_date) if self.clues_cache_dir else None
+        if clues_file_path and os.path.isfile(clues_file_path):
+            clues = read_movie_clues_file(clues_file_path)
+        else:
+            page_source = self.fetch_page_source()
+            parse_start = time.perf_counter()
+            clues = parse_clues_from_html(page_source)
+            self.timings['parse'] = time.perf_counter() - parse_start
+            if clues_file_path:
+                os.makedirs(self.clues_cache_dir, exist_ok=True)
+                write_movie_clues_file(clues_file_path, clues)
+        self.timings['total'] = time.perf_counter() - start
+        print("Fetched the clues for {} in {}".format(
+            puzzle_date, ', '.join("{} {:.3f}s".format(stage, seconds) for stage, seconds in self.timings.items())))
+        return clues
+
+
+def get_todays_clues_from_website(clues_cache_dir=DEFAULT_CLUES_CACHE_DIR):
+    with CluesFetcher(clues_cache_dir=clues_cache_dir) as fetcher:
+        return fetcher.fetch()
 
 
 def parse_clues_from_html(clues_html):
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup(clues_html, 'html.parser')
     clues_table = soup.find('table')
     clues_rows = clues_table.find_all('tr')[1:]
@@ -74,14 +158,14 @@ def parse_clues_from_html(clues_html):
     return clues_list
 
 
-def read_puzzle_clues(puzzle):
+def read_puzzle_clues(puzzle, clues_cache_dir=DEFAULT_CLUES_CACHE_DIR):
     if puzzle:
         print("Solving the puzzle contained in the clues file at {}".format(puzzle))
         clues = read_movie_clues_file(puzzle)
     else:
         print("No clues file supplied; solving today's puzzle from https://actorle.com/")
         puzzle = datetime.today().strftime('%Y-%m-%d')
-        clues = get_todays_clues_from_website()
+        clues = get_todays_clues_from_website(clues_cache_dir)
     print("Found {} clues for the puzzle from {}:".format(len(clues), puzzle))
     pprint.pprint(clues)
     return clues
@@ -115,6 +199,11 @@ def make_movie_title_word_regex(movie_title_word):
     return word_regex
 
 
+def normalise_title_pattern(movie_title_pattern):
+    # collapse runs of whitespace, just as make_movie_title_regex does when it splits the pattern into words
+    return ' '.join(movie_title_pattern.split())
+
+
 def movie_title_to_clues_pattern(movie_title):
     pattern = ''
     for character in movie_title:
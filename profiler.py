@@ -0,0 +1,151 @@
+import contextlib
+import json
+import os
+import resource
+import sys
+import threading
+import time
+
+PROFILE_FILE_NAME = 'profile.json'
+CHROME_TRACE_FILE_NAME = 'trace.json'
+PROMETHEUS_FILE_NAME = 'metrics.prom'
+METRIC_PREFIX = 'knacktorle'
+
+# the profile that stages are recorded into, or None while profiling is switched off
+_active_profile = None
+
+
+def get_peak_rss_bytes():
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports the peak resident set size in kilobytes, macOS in bytes
+    return peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+
+
+class Profile:
+    """The stages timed during a run, each with its duration, the peak RSS once it finished and, for stages that
+    produce a table, the number of rows."""
+
+    def __init__(self, name):
+        self.name = name
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.stages = []
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        # the caller may add details such as a row count to the stage while it runs
+        stage = {'name': name}
+        start = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            end = time.perf_counter()
+            stage['start_seconds'] = start - self.start
+            stage['duration_seconds'] = end - start
+            stage['peak_rss_bytes'] = get_peak_rss_bytes()
+            stage['thread'] = threading.get_native_id()
+            self.stages.append(stage)
+
+    def get_stage_counters(self):
+        stage_counters = {}
+        for stage in self.stages:
+            counters = stage_counters.setdefault(stage['name'], {'calls': 0, 'seconds': 0.0, 'rows': 0})
+            counters['calls'] += 1
+            counters['seconds'] += stage['duration_seconds']
+            counters['rows'] += stage.get('rows', 0)
+        return stage_counters
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'started_at': self.started_at,
+            'duration_seconds': time.perf_counter() - self.start,
+            'peak_rss_bytes': get_peak_rss_bytes(),
+            'stages': sorted(self.stages, key=lambda stage: stage['start_seconds']),
+            'counters': self.get_stage_counters(),
+        }
+
+    def to_chrome_trace(self):
+        """The stages as complete events in the Chrome trace event format, for chrome://tracing or Perfetto."""
+        trace_events = []
+        for stage in self.stages:
+            trace_events.append({
+                'name': stage['name'],
+                'cat': self.name,
+                'ph': 'X',
+                'ts': stage['start_seconds'] * 1e6,
+                'dur': stage['duration_seconds'] * 1e6,
+                'pid': os.getpid(),
+                'tid': stage['thread'],
+                'args': {key: value for key, value in stage.items()
+                         if key not in ('name', 'start_seconds', 'duration_seconds', 'thread')},
+            })
+        return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+    def to_prometheus(self):
+        """The stage counters and peak RSS in the Prometheus text exposition format."""
+        lines = []
+        metrics = [('calls', 'Number of times each stage ran.'),
+                   ('seconds', 'Time spent in each stage.'),
+                   ('rows', 'Rows produced by each stage.')]
+        stage_counters = self.get_stage_counters()
+        for counter_name, help_text in metrics:
+            metric_name = "{}_stage_{}_total".format(METRIC_PREFIX, counter_name)
+            lines.append("# HELP {} {}".format(metric_name, help_text))
+            lines.append("# TYPE {} counter".format(metric_name))
+            for stage_name, counters in stage_counters.items():
+                labels = 'run="{}",stage="{}"'.format(self.name, stage_name)
+                lines.append("{}{{{}}} {}".format(metric_name, labels, counters[counter_name]))
+        metric_name = "{}_peak_rss_bytes".format(METRIC_PREFIX)
+        lines.append("# HELP {} Peak resident set size of the run.".format(metric_name))
+        lines.append("# TYPE {} gauge".format(metric_name))
+        lines.append('{}{{run="{}"}} {}'.format(metric_name, self.name, get_peak_rss_bytes()))
+        return "\n".join(lines) + "\n"
+
+
+def start_profiling(name):
+    """Starts recording every profile_stage into a new profile, which is returned."""
+    global _active_profile
+    _active_profile = Profile(name)
+    return _active_profile
+
+
+def stop_profiling():
+    global _active_profile
+    profile, _active_profile = _active_profile, None
+    return profile
+
+
+@contextlib.contextmanager
+def profile_stage(name):
+    if _active_profile is None:
+        yield {}
+    else:
+        with _active_profile.stage(name) as stage:
+            yield stage
+
+
+def write_profile(profile, profile_dir):
+    os.makedirs(profile_dir, exist_ok=True)
+    print("Writing the profile of {} to {}".format(profile.name, profile_dir))
+    with open(os.path.join(profile_dir, PROFILE_FILE_NAME), 'w') as profile_file:
+        json.dump(profile.to_dict(), profile_file, indent=2)
+    with open(os.path.join(profile_dir, CHROME_TRACE_FILE_NAME), 'w') as trace_file:
+        json.dump(profile.to_chrome_trace(), trace_file)
+    with open(os.path.join(profile_dir, PROMETHEUS_FILE_NAME), 'w') as metrics_file:
+        metrics_file.write(profile.to_prometheus())
+
+
+@contextlib.contextmanager
+def profiling(name, profile_dir=None):
+    """Profiles the code run inside it, writing the profile out to the directory afterwards. Does nothing when no
+    directory is given."""
+    if not profile_dir:
+        yield None
+        return
+    profile = start_profiling(name)
+    try:
+        yield profile
+    finally:
+        stop_profiling()
+        write_profile(profile, profile_dir)
@@ -2,11 +2,18 @@
 
 pushd "${0%/*}/.." > /dev/null
 
+mkdir -p reports/accuracy
+
 time PYTHONPATH=$PYTHONPATH:. \
 python tests/integration/accuracy-test.py \
 --puzzle-directory clues-files \
 --answers-file data/puzzle-actual-answers.csv \
---solver-script $PWD/solve-current-actorle-puzzle.sh \
+--movies-file data/title.basics.tsv.gz \
+--performances-file data/title.principals.tsv.gz \
+--actors-file data/name.basics.tsv.gz \
+--data-store data/store \
+--json-report reports/accuracy/accuracy-results.json \
+--junit-report reports/accuracy/accuracy-results.xml \
 "$@"
 
 popd > /dev/null
\ No newline at end of file
@@ -0,0 +1,103 @@
+import contextlib
+import glob
+import hashlib
+import json
+import os
+
+from data_store import is_data_store, get_dataset_version, get_build_id
+
+RESULT_CACHE_FORMAT_VERSION = 2
+RESULT_FILE_NAME_FORMAT = '{}-{}-{}.json'
+
+
+def get_data_version(movies_file, performances_file, actors_file, data_store=None):
+    """Identifies the processed IMDb data without reading any of it in: a data store by the dataset version and build
+    ID in its manifest, which every build and refresh moves on, and the TSV files by their size and modification
+    time."""
+    if is_data_store(data_store):
+        return {'data_store': os.path.abspath(data_store), 'dataset_version': get_dataset_version(data_store),
+                'build_id': get_build_id(data_store)}
+    data_files = []
+    for data_file in [movies_file, performances_file, actors_file]:
+        file_stat = os.stat(data_file)
+        data_files.append([os.path.abspath(data_file), file_stat.st_size, file_stat.st_mtime_ns])
+    return {'data_files': data_files}
+
+
+def get_data_source(movies_file, performances_file, actors_file, data_store=None):
+    # where the data is read from, which stays the same however many times the data itself changes
+    if is_data_store(data_store):
+        return {'data_store': os.path.abspath(data_store)}
+    return {'data_files': [os.path.abspath(data_file) for data_file in [movies_file, performances_file, actors_file]]}
+
+
+def hash_json(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """Solved puzzle results kept on disk, one JSON file each, keyed by a hash of the puzzle's clues, the solve
+    parameters and the version of the data it was solved against.
+
+    The file names start with a hash of where the data is read from, then a hash of the data version, so the results
+    solved against any other version of the data are never looked up. They are deleted as soon as a result is cached
+    for the current version, but only those of the same data source, so solvers of different data can share a cache
+    directory.
+    """
+
+    def __init__(self, cache_dir, data_version, data_source=None):
+        self.cache_dir = cache_dir
+        self.data_version = data_version
+        self.data_source_hash = hash_json(data_source)[:16]
+        self.data_version_hash = hash_json([RESULT_CACHE_FORMAT_VERSION, data_version])[:16]
+        self.hits = 0
+        self.misses = 0
+        self.purged = False
+
+    def get_result_file_path(self, puzzle_clues, solve_params):
+        result_key = hash_json({
+            'clues': [[clue.title_pattern, clue.year, clue.genre_list, clue.score] for clue in puzzle_clues],
+            'solve_params': solve_params,
+        })
+        result_file_name = RESULT_FILE_NAME_FORMAT.format(self.data_source_hash, self.data_version_hash, result_key)
+        return os.path.join(self.cache_dir, result_file_name)
+
+    def get(self, puzzle_clues, solve_params):
+        result_file_path = self.get_result_file_path(puzzle_clues, solve_params)
+        try:
+            with open(result_file_path) as result_file:
+                result = json.load(result_file)['result']
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def put(self, puzzle_clues, solve_params, result):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        if not self.purged:
+            self.purge_stale_results()
+            self.purged = True
+        result_file_path = self.get_result_file_path(puzzle_clues, solve_params)
+        # written alongside and then moved into place, so a concurrent run never reads half a result
+        partial_file_path = "{}.{}.partial".format(result_file_path, os.getpid())
+        with open(partial_file_path, 'w') as result_file:
+            json.dump({'data_version': self.data_version, 'solve_params': solve_params, 'result': result},
+                      result_file, indent=2)
+        os.replace(partial_file_path, result_file_path)
+
+    def purge_stale_results(self):
+        current_prefix = "{}-{}-".format(self.data_source_hash, self.data_version_hash)
+        data_source_file_pattern = RESULT_FILE_NAME_FORMAT.format(self.data_source_hash, '*', '*')
+        stale_result_file_paths = [
+            result_file_path
+            for result_file_path in glob.glob(os.path.join(self.cache_dir, data_source_file_pattern))
+            if not os.path.basename(result_file_path).startswith(current_prefix)
+        ]
+        if stale_result_file_paths:
+            print("Removing {} cached results solved against another version of the data from {}"
+                  .format(len(stale_result_file_paths), self.cache_dir))
+        for result_file_path in stale_result_file_paths:
+            # another run may be clearing them out at the same time
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(result_file_path)
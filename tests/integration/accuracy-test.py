@@ -1,10 +1,14 @@
 import argparse
 import csv
+import json
 import os
-import subprocess
+import xml.etree.ElementTree as ElementTree
 
-from datetime import datetime
+from datetime import datetime, timedelta
+from actorle_solver import find_clues_files, load_batch_data, solve_puzzles, make_result_cache, get_solve_params, \
+    get_cached_results, cache_results
 from cli import SmartFormatter
+from data_store import is_data_store
 from movie_clues import read_movie_clues_file
 
 from rich.console import Console
@@ -21,16 +25,48 @@ def read_expected_answers(answers_csv_file_path):
     return all_answers
 
 
-def solve_puzzle(clues_file_path, solver_script_path, script_param_list):
-    script_param_string = " ".join(script_param_list)
-    shell_cmd = (
-        "bash {} --clues-file {} {} | "
-        "grep -i \"Dude - I think \" | "
-        "awk -F \"Dude - I think it's... \" '{{print $NF}}' | "
-        "awk -F '\\!' '{{print $1}}'".format(solver_script_path,
-                                             clues_file_path,
-                                             script_param_string))
-    return subprocess.getoutput(shell_cmd)
+def puzzle_result(solver_answer, expected_answer):
+    if solver_answer == expected_answer:
+        return "PASS"
+    elif expected_answer != "Unknown":
+        return "FAIL"
+    return "N/A"
+
+
+def write_json_report(report_file_path, run_details, puzzle_results_dict):
+    print("Writing JSON results to {}".format(report_file_path))
+    report = dict(run_details)
+    report['puzzles'] = [
+        dict(puzzle_detail, puzzle=puzzle_name, duration=puzzle_detail['duration'].total_seconds())
+        for puzzle_name, puzzle_detail in puzzle_results_dict.items()
+    ]
+    with open(report_file_path, 'w') as report_file:
+        json.dump(report, report_file, indent=2)
+
+
+def write_junit_report(report_file_path, run_details, puzzle_results_dict):
+    print("Writing JUnit XML results to {}".format(report_file_path))
+    results = [puzzle_detail['result'] for puzzle_detail in puzzle_results_dict.values()]
+    test_suite = ElementTree.Element('testsuite',
+                                     name='actorle-accuracy',
+                                     tests=str(len(results)),
+                                     failures=str(results.count("FAIL")),
+                                     skipped=str(results.count("N/A")),
+                                     errors='0',
+                                     time=str(run_details['duration_seconds']))
+    for puzzle_name, puzzle_detail in puzzle_results_dict.items():
+        test_case = ElementTree.SubElement(test_suite,
+                                           'testcase',
+                                           classname='accuracy',
+                                           name=puzzle_name,
+                                           time=str(puzzle_detail['duration'].total_seconds()))
+        if puzzle_detail['result'] == "FAIL":
+            ElementTree.SubElement(test_case, 'failure', message="Expected '{}' but the solver answered '{}'"
+                                   .format(puzzle_detail['expected_answer'], puzzle_detail['solver_answer']))
+        elif puzzle_detail['result'] == "N/A":
+            ElementTree.SubElement(test_case, 'skipped', message="No expected answer is known for this puzzle")
+        ElementTree.SubElement(test_case, 'system-out').text = json.dumps(puzzle_detail['options'])
+    ElementTree.ElementTree(test_suite).write(report_file_path, encoding='utf-8', xml_declaration=True)
 
 
 def print_summary(start_datetime, puzzle_results_dict, elide_correct_answers):
@@ -81,6 +117,47 @@ def print_summary(start_datetime, puzzle_results_dict, elide_correct_answers):
     console.print("")
 
 
+def summarise_tolerance_sweep(solved_puzzles, answers):
+    tolerance_results = {}
+    for solved_puzzle in solved_puzzles:
+        expected_answer = answers.get(solved_puzzle['puzzle'], "Unknown")
+        for tolerance_options in solved_puzzle['tolerance_sweep']:
+            results = tolerance_results.setdefault(tolerance_options['rating_tolerance'], [])
+            results.append(puzzle_result(tolerance_options['answer'] or "", expected_answer))
+    return [
+        {
+            'rating_tolerance': rating_tolerance,
+            'passed': results.count("PASS"),
+            'failed': results.count("FAIL"),
+            'unknown': results.count("N/A"),
+        }
+        for rating_tolerance, results in sorted(tolerance_results.items())
+    ]
+
+
+def print_tolerance_sweep(tolerance_sweep):
+    # the narrowest tolerance wins a tie, as it leaves the fewest candidate movies to go wrong
+    best_tolerance = max(tolerance_sweep, key=lambda tolerance: (tolerance['passed'], -tolerance['rating_tolerance']))
+    sweep_table = Table(show_header=True,
+                        header_style="bold magenta",
+                        title="Accuracy by Rating Tolerance",
+                        caption="Best rating tolerance is [yellow bold]{}[/yellow bold]"
+                        .format(best_tolerance['rating_tolerance']))
+    sweep_table.add_column("Rating Tolerance", justify="right")
+    sweep_table.add_column("Passed", justify="right")
+    sweep_table.add_column("Failed", justify="right")
+    sweep_table.add_column("Unknown", justify="right")
+    for tolerance in tolerance_sweep:
+        colour = "green" if tolerance is best_tolerance else "white"
+        sweep_table.add_row("[{}]{}[/{}]".format(colour, tolerance['rating_tolerance'], colour),
+                            str(tolerance['passed']),
+                            str(tolerance['failed']),
+                            str(tolerance['unknown']))
+    Console().print(sweep_table)
+    Console().print("")
+    return best_tolerance['rating_tolerance']
+
+
 def format_time_delta(time_delta):
     return str(time_delta)[:-3]
 
@@ -101,64 +178,149 @@ def parse_cli_args():
                             help="R|the full path to a CSV file containing answers to puzzles\n"
                                  "Mandatory.",
                             required=True)
-    arg_parser.add_argument('-s',
-                            '--solver-script',
-                            help="R|the full path to a shell script that solves a single puzzle\n"
-                                 "Mandatory.",
-                            required=True)
+    arg_parser.add_argument('-ds',
+                            '--data-store',
+                            help="R|the full path to a binary data store directory written by "
+                                 "imdb_data_grabber.py.\n"
+                                 "Optional; the TSV files are used as a fallback.")
+    arg_parser.add_argument('-mf',
+                            '--movies-file',
+                            help="R|the full path to a title.basics.tsv.gz file written by imdb_data_grabber.py.\n"
+                                 "Mandatory unless --data-store is set.")
+    arg_parser.add_argument('-pf',
+                            '--performances-file',
+                            help="R|the full path to a title.principals.tsv.gz file written by "
+                                 "imdb_data_grabber.py.\n"
+                                 "Mandatory unless --data-store is set.")
+    arg_parser.add_argument('-af',
+                            '--actors-file',
+                            help="R|the full path to a name.basics.tsv.gz file written by imdb_data_grabber.py.\n"
+                                 "Mandatory unless --data-store is set.")
     arg_parser.add_argument('-e',
                             '--elide-answers',
                             default=False,
                             action='store_true',
                             help="R|flag to elide puzzle answers for passing tests in the summary table\n"
                                  "Optional.")
-    arg_parser.add_argument('-l',
-                            '--param-list',
-                            nargs='*',
-                            default=[],
-                            help='Optional list of parameters to pass to the solver script')
-    return vars(arg_parser.parse_args())
+    arg_parser.add_argument('-n',
+                            '--num-options',
+                            help='The number of ranked answers to record for each puzzle. Optional, default is 3.',
+                            type=int,
+                            default=3)
+    arg_parser.add_argument('-r',
+                            '--rating-tolerance',
+                            help='The solver\'s movie review rating tolerance. Optional, default is 0.1.',
+                            type=float,
+                            default=0.1)
+    arg_parser.add_argument('-ts',
+                            '--tolerance-sweep',
+                            nargs='+',
+                            type=float,
+                            help='R|further rating tolerances to measure the accuracy of, all in the same single\n'
+                                 'run, e.g. --tolerance-sweep 0.0 0.2 0.3. Optional.')
+    arg_parser.add_argument('-j',
+                            '--workers',
+                            help='R|the number of worker processes to solve puzzles with. Optional, default is the\n'
+                                 'number of CPUs.',
+                            type=int,
+                            default=os.cpu_count())
+    arg_parser.add_argument('-rc',
+                            '--result-cache-dir',
+                            help='R|the directory to keep solved puzzle results in. Optional. Puzzles already\n'
+                                 'solved with the same clues, options and IMDb data are taken from it, along\n'
+                                 'with the time they originally took, rather than solved again.')
+    arg_parser.add_argument('--json-report',
+                            help='R|the full path to write the results out to as JSON. Optional.')
+    arg_parser.add_argument('--junit-report',
+                            help='R|the full path to write the results out to as JUnit XML. Optional.')
+    arg_parser.add_argument('--solver-log',
+                            help='R|the full path of a file to append the solver\'s own output to. Optional,\n'
+                                 'by default that output is discarded.',
+                            default=os.devnull)
+    args = arg_parser.parse_args()
+    if not args.data_store and not all([args.movies_file, args.performances_file, args.actors_file]):
+        arg_parser.error("the --movies-file, --performances-file and --actors-file arguments are required "
+                         "when no --data-store is given")
+    return vars(args)
 
 
 if __name__ == '__main__':
     cli_args = parse_cli_args()
 
-    print("Invoking the solver script at {}, with the param list '{}' "
-          "to solve puzzles from the {} directory, and validating answers using the {} file"
-          .format(cli_args['solver_script'],
-                  cli_args['param_list'],
-                  cli_args['puzzle_directory'],
-                  cli_args['answers_file']))
+    print("Solving puzzles from the {} directory in-process across {} workers, and validating answers using "
+          "the {} file".format(cli_args['puzzle_directory'], cli_args['workers'], cli_args['answers_file']))
 
-    puzzle_results = {}
-    for puzzle in sorted(os.listdir(cli_args['puzzle_directory'])):
-        puzzle_path = os.path.join(cli_args['puzzle_directory'], puzzle)
-        clues = read_movie_clues_file(puzzle_path)
-        puzzle_results[puzzle] = {"number_of_clues": len(clues)}
+    puzzles = {puzzle_path: read_movie_clues_file(puzzle_path)
+               for puzzle_path in find_clues_files([cli_args['puzzle_directory']])}
+    puzzle_results = {os.path.basename(puzzle_path): {"number_of_clues": len(clues)}
+                      for puzzle_path, clues in puzzles.items()}
 
     answers = read_expected_answers(cli_args['answers_file'])
     print("Found {} expected answers in {} file...".format(len(answers), cli_args['answers_file']))
     print("-----------------------------------------------")
 
     solving_start_time = datetime.now()
-    for puzzle in sorted(os.listdir(cli_args['puzzle_directory'])):
-        puzzle_path = os.path.join(cli_args['puzzle_directory'], puzzle)
+    result_cache = make_result_cache(cli_args)
+    solve_params = get_solve_params(cli_args)
+    cached_puzzles = get_cached_results(puzzles, result_cache, solve_params) if result_cache else {}
+    if cached_puzzles:
+        print("Found {} of the puzzles already solved against the same IMDb data in {}"
+              .format(len(cached_puzzles), cli_args['result_cache_dir']))
+    unsolved_puzzles = {puzzle_path: clues for puzzle_path, clues in puzzles.items()
+                        if puzzle_path not in cached_puzzles}
+
+    solved_puzzles = []
+    loading_duration = timedelta()
+    if unsolved_puzzles:
+        all_clues = [clue for clues in unsolved_puzzles.values() for clue in clues]
+        if cli_args['workers'] > 1 and is_data_store(cli_args['data_store']):
+            # the workers map the store for themselves, as they start up
+            batch_data = None
+        else:
+            print("Loading the IMDb data for the years of every puzzle's clues...")
+            batch_data = load_batch_data(all_clues,
+                                         cli_args['movies_file'],
+                                         cli_args['performances_file'],
+                                         cli_args['actors_file'],
+                                         cli_args['data_store'])
+            loading_duration = datetime.now() - solving_start_time
+            print("Loaded the IMDb data in {}".format(format_time_delta(loading_duration)))
+
+        solved_puzzles = solve_puzzles(unsolved_puzzles,
+                                       batch_data,
+                                       cli_args['num_options'],
+                                       cli_args['rating_tolerance'],
+                                       cli_args['workers'],
+                                       cli_args['solver_log'],
+                                       cli_args['data_store'],
+                                       cli_args['tolerance_sweep'])
+        if result_cache:
+            cache_results(unsolved_puzzles, solved_puzzles, result_cache, solve_params)
+    solved_puzzles = list(cached_puzzles.values()) + solved_puzzles
+    for solved_puzzle in solved_puzzles:
+        puzzle = solved_puzzle['puzzle']
         expected_answer = answers.get(puzzle, "Unknown")
-        expected_answer_to_show = ELIDED_STRING if cli_args['elide_answers'] else expected_answer
-        print("Solving puzzle {} and expecting the answer '{}'".format(puzzle_path, expected_answer_to_show))
-        puzzle_start_time = datetime.now()
-        solver_answer = solve_puzzle(puzzle_path, cli_args['solver_script'], cli_args['param_list'])
-        solver_answer_to_show = ELIDED_STRING if cli_args['elide_answers'] else solver_answer
-        puzzle_duration = datetime.now() - puzzle_start_time
-        print("Got answer '{}'".format(solver_answer_to_show))
-        result = "N/A"
-        if solver_answer == expected_answer:
-            result = "PASS"
-        elif expected_answer != "Unknown" and solver_answer != expected_answer:
-            result = "FAIL"
+        solver_answer = solved_puzzle['answer'] or ""
         puzzle_results[puzzle]['expected_answer'] = expected_answer
         puzzle_results[puzzle]['solver_answer'] = solver_answer
-        puzzle_results[puzzle]['result'] = result
-        puzzle_results[puzzle]['duration'] = puzzle_duration
-        print("-----------------------------------------------")
+        puzzle_results[puzzle]['result'] = puzzle_result(solver_answer, expected_answer)
+        puzzle_results[puzzle]['duration'] = timedelta(seconds=solved_puzzle['duration_seconds'])
+        puzzle_results[puzzle]['timings'] = solved_puzzle['timings']
+        puzzle_results[puzzle]['options'] = solved_puzzle['options']
     print_summary(solving_start_time, puzzle_results, cli_args['elide_answers'])
+
+    run_details = {
+        'started': solving_start_time.isoformat(timespec='seconds'),
+        'duration_seconds': (datetime.now() - solving_start_time).total_seconds(),
+        'loading_seconds': loading_duration.total_seconds(),
+        'num_options': cli_args['num_options'],
+        'rating_tolerance': cli_args['rating_tolerance'],
+        'workers': cli_args['workers'],
+    }
+    if cli_args['tolerance_sweep']:
+        run_details['tolerance_sweep'] = summarise_tolerance_sweep(solved_puzzles, answers)
+        run_details['best_rating_tolerance'] = print_tolerance_sweep(run_details['tolerance_sweep'])
+    if cli_args['json_report']:
+        write_json_report(cli_args['json_report'], run_details, puzzle_results)
+    if cli_args['junit_report']:
+        write_junit_report(cli_args['junit_report'], run_details, puzzle_results)
@@ -0,0 +1,260 @@
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from rich.console import Console
+from rich.table import Table
+
+from actorle_solver import find_clues_files, filter_movies_by_release_date, get_candidate_performances, \
+    get_most_likely_actors_for_clues, resolve_actor_names, load_batch_data, solve_puzzles
+from cli import SmartFormatter
+from imdb_data_grabber import filter_downloaded_files, build_data_store, MOVIES_FILE_NAME, PERFORMANCES_FILE_NAME, \
+    ACTORS_FILE_NAME
+from movie_clues import read_movie_clues_file
+from profiler import profiling, profile_stage
+import synthetic_imdb_data
+from synthetic_imdb_data import PUZZLES_DIR_NAME, ANSWERS_FILE_NAME, DEFAULT_PUZZLES
+
+RAW_DIR_NAME = 'raw'
+STORE_DIR_NAME = 'store'
+PROFILES_DIR_NAME = 'profiles'
+GENERATION_FILE_NAME = 'generation.json'
+DEFAULT_REGRESSION_THRESHOLD = 1.25
+# stages quicker than this, in the baseline, are too noisy to call a regression on
+MIN_COMPARABLE_SECONDS = 0.25
+
+
+def generate_data(raw_dir, scale, number_of_puzzles, seed):
+    """Generates the synthetic raw files, unless the same data was already generated by an earlier run."""
+    generation = {'scale': scale, 'puzzles': number_of_puzzles, 'seed': seed}
+    generation_file_path = os.path.join(raw_dir, GENERATION_FILE_NAME)
+    if os.path.isfile(generation_file_path):
+        with open(generation_file_path) as generation_file:
+            if json.load(generation_file) == generation:
+                print("Reusing the synthetic IMDb data already generated in {}".format(raw_dir))
+                return
+    # in a process of its own, just like each phase, so the generator's memory use does not count towards any phase
+    subprocess.run([sys.executable, synthetic_imdb_data.__file__, '--output-dir', raw_dir, '--scale', str(scale),
+                    '--puzzles', str(number_of_puzzles), '--seed', str(seed)], check=True)
+    with open(generation_file_path, 'w') as generation_file:
+        json.dump(generation, generation_file)
+
+
+def benchmark_grabber(raw_dir, data_dir, memory_limit_mb):
+    filter_downloaded_files(raw_dir, data_dir, memory_limit_mb)
+    store_dir = os.path.join(data_dir, STORE_DIR_NAME)
+    build_data_store(store_dir,
+                     os.path.join(data_dir, MOVIES_FILE_NAME),
+                     os.path.join(data_dir, PERFORMANCES_FILE_NAME),
+                     os.path.join(data_dir, ACTORS_FILE_NAME))
+    return store_dir
+
+
+def benchmark_solver(puzzles, store_dir, rating_tolerance):
+    # each puzzle is solved just as a daily puzzle is, from scratch against the store
+    answers = {}
+    for clues_file, puzzle_clues in puzzles.items():
+        movies_df = filter_movies_by_release_date(None, puzzle_clues, store_dir)
+        performances_df = get_candidate_performances(None, movies_df, store_dir)
+        most_likely_actors = get_most_likely_actors_for_clues(puzzle_clues, movies_df, performances_df, 3,
+                                                              rating_tolerance)
+        actor_names = resolve_actor_names([actor_id for actor_id, _ in most_likely_actors], None, store_dir)
+        answers[os.path.basename(clues_file)] = actor_names[0] if actor_names else None
+    return answers
+
+
+def benchmark_batch_solver(puzzles, store_dir, rating_tolerance):
+    all_clues = [clue for puzzle_clues in puzzles.values() for clue in puzzle_clues]
+    with profile_stage('load_batch_data'):
+        batch_data = load_batch_data(all_clues, None, None, None, store_dir)
+    results = solve_puzzles(puzzles, batch_data, 3, rating_tolerance)
+    return {result['puzzle']: result['answer'] for result in results}
+
+
+def run_phase(phase, profiles_dir, solver_log, phase_function, *phase_args):
+    with open(solver_log, 'a') as log_file, contextlib.redirect_stdout(log_file):
+        with profiling(phase, os.path.join(profiles_dir, phase)) as profile:
+            phase_result = phase_function(*phase_args)
+    return phase_result, profile.to_dict()
+
+
+def run_phase_in_own_process(phase, profiles_dir, solver_log, phase_function, *phase_args):
+    # in a freshly started process, so the peak RSS of each phase is its own, rather than the most of any phase so far
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        return executor.submit(run_phase, phase, profiles_dir, solver_log, phase_function, *phase_args).result()
+
+
+def run_benchmarks(args):
+    output_dir = args['output_dir']
+    raw_dir = os.path.join(output_dir, RAW_DIR_NAME)
+    profiles_dir = os.path.join(output_dir, PROFILES_DIR_NAME)
+    generate_data(raw_dir, args['scale'], args['puzzles'], args['seed'])
+    with open(os.path.join(raw_dir, ANSWERS_FILE_NAME)) as answers_file:
+        next(answers_file)  # Skip the header
+        expected_answers = dict(line.strip().split(',', 1) for line in answers_file)
+
+    profiles = {}
+    with open(args['solver_log'], 'a') as log_file, contextlib.redirect_stdout(log_file):
+        puzzles = {clues_file: read_movie_clues_file(clues_file)
+                   for clues_file in find_clues_files([os.path.join(raw_dir, PUZZLES_DIR_NAME)])}
+    store_dir, profiles['grabber'] = run_phase_in_own_process('grabber', profiles_dir, args['solver_log'],
+                                                              benchmark_grabber, raw_dir, output_dir,
+                                                              args['memory_limit'])
+    solver_answers, profiles['solver'] = run_phase_in_own_process('solver', profiles_dir, args['solver_log'],
+                                                                  benchmark_solver, puzzles, store_dir,
+                                                                  args['rating_tolerance'])
+    batch_answers, profiles['batch_solver'] = run_phase_in_own_process('batch_solver', profiles_dir,
+                                                                       args['solver_log'], benchmark_batch_solver,
+                                                                       puzzles, store_dir, args['rating_tolerance'])
+
+    return {
+        'scale': args['scale'],
+        'puzzles': len(puzzles),
+        'solver_correct': sum(solver_answers.get(puzzle) == answer for puzzle, answer in expected_answers.items()),
+        'batch_solver_correct': sum(batch_answers.get(puzzle) == answer
+                                    for puzzle, answer in expected_answers.items()),
+        'phases': {phase: {'peak_rss_bytes': profile_dict['peak_rss_bytes'], 'stages': profile_dict['counters']}
+                   for phase, profile_dict in profiles.items()},
+    }
+
+
+def compare_with_baseline(report, baseline, regression_threshold):
+    comparisons = []
+    for phase, phase_report in report['phases'].items():
+        for stage, counters in phase_report['stages'].items():
+            baseline_counters = baseline.get('phases', {}).get(phase, {}).get('stages', {}).get(stage) \
+                if baseline else None
+            comparison = {'phase': phase, 'stage': stage, 'seconds': counters['seconds'], 'rows': counters['rows'],
+                          'baseline_seconds': None, 'ratio': None, 'result': "N/A"}
+            if baseline_counters:
+                comparison['baseline_seconds'] = baseline_counters['seconds']
+                comparison['ratio'] = counters['seconds'] / max(baseline_counters['seconds'], 1e-9)
+                if baseline_counters['seconds'] < MIN_COMPARABLE_SECONDS:
+                    comparison['result'] = "N/A"
+                elif comparison['ratio'] > regression_threshold:
+                    comparison['result'] = "FAIL"
+                else:
+                    comparison['result'] = "PASS"
+            comparisons.append(comparison)
+    return comparisons
+
+
+def print_summary(report, comparisons, start_datetime):
+    regressions = [comparison for comparison in comparisons if comparison['result'] == "FAIL"]
+    table_caption = "{} regressed stages at {}x IMDb size, {}/{} puzzles solved correctly, in " \
+                    "[yellow bold]{}[/yellow bold]".format(len(regressions), report['scale'],
+                                                           report['solver_correct'], report['puzzles'],
+                                                           str(datetime.now() - start_datetime)[:-3])
+    results_table = Table(show_header=True,
+                          header_style="bold magenta",
+                          title="Benchmarks",
+                          caption=table_caption)
+    results_table.add_column("Phase", justify="left")
+    results_table.add_column("Stage", justify="left")
+    results_table.add_column("Rows", justify="right")
+    results_table.add_column("Seconds", justify="right")
+    results_table.add_column("Baseline", justify="right")
+    results_table.add_column("Ratio", justify="right")
+    results_table.add_column("Result", justify="left")
+    for comparison in comparisons:
+        colour = "green" if comparison['result'] == "PASS" \
+            else "red" if comparison['result'] == "FAIL" else "yellow"
+        results_table.add_row(comparison['phase'],
+                              comparison['stage'],
+                              "{:,}".format(comparison['rows']),
+                              "{:.3f}".format(comparison['seconds']),
+                              "{:.3f}".format(comparison['baseline_seconds'])
+                              if comparison['baseline_seconds'] is not None else "-",
+                              "{:.2f}".format(comparison['ratio']) if comparison['ratio'] is not None else "-",
+                              "[{}]{}[/{}]".format(colour, comparison['result'], colour))
+    console = Console()
+    console.print("")
+    console.print(results_table)
+    for phase, phase_report in report['phases'].items():
+        console.print("Peak RSS of the {} phase: {:,.0f}MB".format(phase, phase_report['peak_rss_bytes'] / 2 ** 20))
+    console.print("")
+    return regressions
+
+
+def parse_cli_args():
+    arg_parser = argparse.ArgumentParser(
+        description="Generate synthetic IMDb data at a multiple of today's IMDb size, then time each stage of the "
+                    "data grabber and the solver against it, optionally failing on regressions from a baseline run",
+        formatter_class=SmartFormatter)
+    arg_parser.add_argument('-o',
+                            '--output-dir',
+                            help="R|the full path to a directory to generate the data in and build the store in.\n"
+                                 "The generated data is reused by later runs with the same scale, puzzles and\n"
+                                 "seed. Mandatory.",
+                            required=True)
+    arg_parser.add_argument('-s',
+                            '--scale',
+                            help="R|the size of the synthetic data, as a multiple of today's IMDb data.\n"
+                                 "Optional, default is 0.01.",
+                            type=float,
+                            default=0.01)
+    arg_parser.add_argument('-n',
+                            '--puzzles',
+                            help="R|the number of puzzles to solve. Optional, default is {}.".format(DEFAULT_PUZZLES),
+                            type=int,
+                            default=DEFAULT_PUZZLES)
+    arg_parser.add_argument('--seed',
+                            help='R|the seed for the synthetic data. Optional, default is 0.',
+                            type=int,
+                            default=0)
+    arg_parser.add_argument('-m',
+                            '--memory-limit',
+                            help='R|the memory limit, in MB, to filter the raw files within. Optional, default\n'
+                                 'is 512.',
+                            type=int,
+                            default=512)
+    arg_parser.add_argument('-r',
+                            '--rating-tolerance',
+                            help='The solver\'s movie review rating tolerance. Optional, default is 0.1.',
+                            type=float,
+                            default=0.1)
+    arg_parser.add_argument('-b',
+                            '--baseline',
+                            help='R|the full path to a JSON report from an earlier run to compare against.\n'
+                                 'Optional.')
+    arg_parser.add_argument('-t',
+                            '--regression-threshold',
+                            help='R|how many times slower than the baseline a stage may run before it counts\n'
+                                 'as a regression. Optional, default is {}. Stages taking under {}s in the\n'
+                                 'baseline are not compared.'.format(DEFAULT_REGRESSION_THRESHOLD,
+                                                                     MIN_COMPARABLE_SECONDS),
+                            type=float,
+                            default=DEFAULT_REGRESSION_THRESHOLD)
+    arg_parser.add_argument('--json-report',
+                            help='R|the full path to write the timings out to as JSON, to use as a later\n'
+                                 'baseline. Optional.')
+    arg_parser.add_argument('--solver-log',
+                            help='R|the full path of a file to append the grabber\'s and solver\'s own output to.\n'
+                                 'Optional, by default that output is discarded.',
+                            default=os.devnull)
+    return vars(arg_parser.parse_args())
+
+
+if __name__ == '__main__':
+    start = datetime.now()
+    args = parse_cli_args()
+    benchmark_report = run_benchmarks(args)
+    baseline_report = None
+    if args['baseline']:
+        with open(args['baseline']) as baseline_file:
+            baseline_report = json.load(baseline_file)
+    stage_comparisons = compare_with_baseline(benchmark_report, baseline_report, args['regression_threshold'])
+    regressed_stages = print_summary(benchmark_report, stage_comparisons, start)
+    if args['json_report']:
+        print("Writing JSON results to {}".format(args['json_report']))
+        with open(args['json_report'], 'w') as report_file:
+            json.dump(benchmark_report, report_file, indent=2)
+    wrong_answers = benchmark_report['puzzles'] * 2 - benchmark_report['solver_correct'] - \
+        benchmark_report['batch_solver_correct']
+    sys.exit(1 if regressed_stages or wrong_answers else 0)
@@ -0,0 +1,248 @@
+import argparse
+import csv
+import os
+
+import numpy as np
+import pandas as pd
+
+from cli import SmartFormatter
+from imdb_data_grabber import MOVIES_FILE_NAME, REVIEWS_FILE_NAME, PERFORMANCES_FILE_NAME, ACTORS_FILE_NAME
+from movie_clues import MovieClue, movie_title_to_clues_pattern, write_movie_clues_file
+
+# roughly the size of the IMDb data files today, which a scale of 1 reproduces
+IMDB_TITLES = 11000000
+IMDB_NAMES = 14000000
+PRINCIPALS_PER_TITLE = 8
+# the shares of titles that are movies, and of movies and other titles that have a rating
+MOVIE_SHARE = 0.065
+RATED_MOVIE_SHARE = 0.45
+RATED_OTHER_TITLE_SHARE = 0.12
+# the share of people who act, and of principals who are actors or actresses
+ACTING_NAME_SHARE = 0.35
+ACTING_PRINCIPAL_SHARE = 0.4
+MISSING_YEAR_SHARE = 0.02
+FIRST_YEAR, LAST_YEAR = 1900, 2025
+TITLES_PER_CHUNK = 200000
+DEFAULT_PUZZLES = 20
+MIN_CLUES, MAX_CLUES = 8, 16
+PUZZLES_DIR_NAME = 'puzzles'
+ANSWERS_FILE_NAME = 'answers.csv'
+
+OTHER_TITLE_TYPES = ['short', 'tvEpisode', 'tvSeries', 'tvMovie', 'video', 'videoGame']
+OTHER_CATEGORIES = ['self', 'director', 'writer', 'producer', 'composer', 'cinematographer']
+GENRES = ['Action', 'Adventure', 'Comedy', 'Crime', 'Drama', 'Family', 'Fantasy', 'Horror', 'Mystery', 'Romance',
+          'Sci-Fi', 'Thriller', 'War', 'Western']
+TITLE_WORDS = ['The', 'A', 'Of', 'Night', 'Dark', 'Love', 'War', 'Star', 'City', 'Blue', 'Return', 'King', 'Man',
+               'Road', 'Fury', 'Last', 'House', 'Girl', 'Dead', 'Life', 'Story', 'Time', 'World', 'Day', 'Heart',
+               'Secret', 'Lost', 'Summer', 'Killer', 'Dream', 'Blood', 'Game', 'Home', 'Christmas', 'Island',
+               'Shadow', 'Wild', 'Good', 'Bad', 'Little', 'Big', 'Black', 'White', 'Red', 'Golden', 'Me', 'You']
+FIRST_NAMES = ['James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer', 'Michael', 'Linda', 'David', 'Susan',
+               'Richard', 'Karen', 'Joseph', 'Nancy', 'Thomas', 'Lisa', 'Daniel', 'Betty', 'Paul', 'Sandra']
+LAST_NAMES = ['Smith', 'Jones', 'Brown', 'Taylor', 'Wilson', 'Davies', 'Evans', 'Thomas', 'Johnson', 'Roberts',
+              'Walker', 'Wright', 'Robinson', 'Thompson', 'White', 'Hughes', 'Edwards', 'Green', 'Hall', 'Wood']
+
+
+def format_ids(prefix, numbers):
+    return prefix + pd.Series(numbers).astype(str).str.zfill(7)
+
+
+def make_titles(random, number_of_titles):
+    words = random.choice(TITLE_WORDS, (number_of_titles, 4))
+    word_counts = random.integers(1, 5, number_of_titles)
+    titles = [' '.join(title_words[:word_count]) for title_words, word_count in zip(words, word_counts)]
+    sequels = np.flatnonzero(random.random(number_of_titles) < 0.05)
+    for title_number, part in zip(sequels, random.integers(2, 6, len(sequels))):
+        titles[title_number] = "{}: Part {}".format(titles[title_number], part)
+    return titles
+
+
+def make_genres(random, number_of_titles):
+    genres = random.choice(GENRES, (number_of_titles, 3))
+    genre_counts = random.integers(1, 4, number_of_titles)
+    return [','.join(sorted(set(title_genres[:genre_count])))
+            for title_genres, genre_count in zip(genres, genre_counts)]
+
+
+def write_tsv_chunk(file_path, data_frame, first_chunk):
+    # each chunk is appended as another gzip member, which gzip readers carry straight on through. Like the real
+    # files, nothing is quoted. The quickest compression is used, as the files are generated far more than read.
+    data_frame.to_csv(file_path, sep='\t', index=False, header=first_chunk, mode='w' if first_chunk else 'a',
+                      compression={'method': 'gzip', 'compresslevel': 1}, quoting=csv.QUOTE_NONE)
+
+
+def plan_star_filmographies(random, is_movie, years, ratings, number_of_puzzles):
+    """Casts each puzzle's star in a handful of rated movies, whose clues make up the puzzle."""
+    clue_movies = np.flatnonzero(is_movie & ~np.isnan(ratings) & (years != 0))
+    number_of_clues = random.integers(MIN_CLUES, MAX_CLUES + 1, number_of_puzzles)
+    chosen_movies = random.choice(clue_movies, min(number_of_clues.sum(), len(clue_movies)), replace=False)
+    star_of_movie = {}
+    for puzzle_number, puzzle_movies in enumerate(np.split(chosen_movies, np.cumsum(number_of_clues)[:-1])):
+        for movie in puzzle_movies:
+            star_of_movie[int(movie)] = puzzle_number
+    return star_of_movie
+
+
+def generate_imdb_data(output_dir, scale, number_of_puzzles=DEFAULT_PUZZLES, seed=0):
+    """Writes raw IMDb data files at the given multiple of today's IMDb size, in the same formats as those
+    downloaded from https://datasets.imdbws.com, along with clues files for puzzles whose answers are known.
+
+    Each puzzle's answer is a 'star' cast in all of the puzzle's movies, among performances by a pool of actors
+    drawn at random. Returns the answers, keyed by clues file name.
+    """
+    random = np.random.default_rng(seed)
+    number_of_titles = max(int(IMDB_TITLES * scale), 1000)
+    number_of_names = max(int(IMDB_NAMES * scale), 1000)
+    number_of_actors = int(number_of_names * ACTING_NAME_SHARE)
+    os.makedirs(output_dir, exist_ok=True)
+    print("Generating {:,} titles and {:,} names ({}x IMDb) in {}"
+          .format(number_of_titles, number_of_names, scale, output_dir))
+
+    # the stars are the first names, so they never turn up by chance among the random performances
+    star_ids = np.arange(1, number_of_puzzles + 1)
+    is_movie = random.random(number_of_titles) < MOVIE_SHARE
+    years = random.integers(FIRST_YEAR, LAST_YEAR + 1, number_of_titles)
+    years[random.random(number_of_titles) < MISSING_YEAR_SHARE] = 0
+    rated = random.random(number_of_titles) < np.where(is_movie, RATED_MOVIE_SHARE, RATED_OTHER_TITLE_SHARE)
+    ratings = np.where(rated, np.clip(np.round(random.normal(6.2, 1.3, number_of_titles), 1), 1.0, 10.0), np.nan)
+    star_of_movie = plan_star_filmographies(random, is_movie, years, ratings, number_of_puzzles)
+    puzzle_clues = [[] for _ in range(number_of_puzzles)]
+
+    for chunk_start in range(0, number_of_titles, TITLES_PER_CHUNK):
+        chunk = slice(chunk_start, min(chunk_start + TITLES_PER_CHUNK, number_of_titles))
+        title_numbers = np.arange(chunk.start, chunk.stop)
+        chunk_size = len(title_numbers)
+        first_chunk = chunk_start == 0
+        title_ids = format_ids('tt', title_numbers + 1)
+        titles = make_titles(random, chunk_size)
+        genres = make_genres(random, chunk_size)
+        chunk_years = pd.Series(years[chunk]).astype(str).replace('0', '\\N')
+        write_tsv_chunk(os.path.join(output_dir, MOVIES_FILE_NAME), pd.DataFrame(data={
+            'tconst': title_ids,
+            'titleType': np.where(is_movie[chunk], 'movie', random.choice(OTHER_TITLE_TYPES, chunk_size)),
+            'primaryTitle': titles,
+            'originalTitle': titles,
+            'isAdult': 0,
+            'startYear': chunk_years,
+            'endYear': '\\N',
+            'runtimeMinutes': random.integers(5, 200, chunk_size),
+            'genres': genres,
+        }), first_chunk)
+
+        chunk_rated = rated[chunk]
+        write_tsv_chunk(os.path.join(output_dir, REVIEWS_FILE_NAME), pd.DataFrame(data={
+            'tconst': title_ids[chunk_rated],
+            'averageRating': ratings[chunk][chunk_rated],
+            'numVotes': random.integers(5, 100000, int(chunk_rated.sum())),
+        }), first_chunk)
+
+        principals_per_title = random.integers(1, 2 * PRINCIPALS_PER_TITLE, chunk_size)
+        principal_titles = np.repeat(title_numbers, principals_per_title)
+        number_of_principals = len(principal_titles)
+        acting = random.random(number_of_principals) < ACTING_PRINCIPAL_SHARE
+        people = np.where(acting,
+                          random.integers(number_of_puzzles + 1, number_of_actors + 1, number_of_principals),
+                          random.integers(number_of_actors + 1, number_of_names + 1, number_of_principals))
+        categories = np.where(acting,
+                              random.choice(['actor', 'actress'], number_of_principals),
+                              random.choice(OTHER_CATEGORIES, number_of_principals))
+        characters = np.where(acting, '["Role"]', '\\N')
+        chunk_stars = [(movie, star) for movie, star in star_of_movie.items() if chunk.start <= movie < chunk.stop]
+        for movie, star in chunk_stars:
+            puzzle_clues[star].append(MovieClue(movie_title_to_clues_pattern(titles[movie - chunk.start]),
+                                                str(years[movie]),
+                                                genres[movie - chunk.start],
+                                                float(ratings[movie])))
+        star_movies = np.array([movie for movie, _ in chunk_stars], dtype=np.int64)
+        principal_titles = np.concatenate([principal_titles, star_movies])
+        people = np.concatenate([people, star_ids[[star for _, star in chunk_stars]]])
+        categories = np.concatenate([categories, ['actor'] * len(chunk_stars)])
+        characters = np.concatenate([characters, ['["Star"]'] * len(chunk_stars)])
+        # like the real file, the principals are in title order, numbered within each title
+        title_order = np.argsort(principal_titles, kind='stable')
+        principal_titles, people = principal_titles[title_order], people[title_order]
+        categories, characters = categories[title_order], characters[title_order]
+        orderings = np.arange(len(principal_titles)) - np.searchsorted(principal_titles, principal_titles)
+        write_tsv_chunk(os.path.join(output_dir, PERFORMANCES_FILE_NAME), pd.DataFrame(data={
+            'tconst': format_ids('tt', principal_titles + 1),
+            'ordering': orderings + 1,
+            'nconst': format_ids('nm', people),
+            'category': categories,
+            'job': '\\N',
+            'characters': characters,
+        }), first_chunk)
+        print("\tWrote titles {:,} to {:,}".format(chunk.start + 1, chunk.stop))
+
+    for chunk_start in range(0, number_of_names, TITLES_PER_CHUNK):
+        name_numbers = np.arange(chunk_start, min(chunk_start + TITLES_PER_CHUNK, number_of_names)) + 1
+        chunk_size = len(name_numbers)
+        names = pd.Series(random.choice(FIRST_NAMES, chunk_size)) + ' ' + random.choice(LAST_NAMES, chunk_size)
+        names[name_numbers <= number_of_puzzles] = ["Synthetic Star {}".format(star)
+                                                    for star in name_numbers[name_numbers <= number_of_puzzles]]
+        professions = np.where(name_numbers <= number_of_actors,
+                               random.choice(['actor', 'actress', 'actor,producer', 'actress,soundtrack'], chunk_size),
+                               random.choice(['director', 'writer', 'producer', 'composer'], chunk_size))
+        write_tsv_chunk(os.path.join(output_dir, ACTORS_FILE_NAME), pd.DataFrame(data={
+            'nconst': format_ids('nm', name_numbers),
+            'primaryName': names,
+            'birthYear': '\\N',
+            'deathYear': '\\N',
+            'primaryProfession': professions,
+            'knownForTitles': '\\N',
+        }), chunk_start == 0)
+
+    return write_puzzles(output_dir, puzzle_clues, seed)
+
+
+def write_puzzles(output_dir, puzzle_clues, seed):
+    puzzles_dir = os.path.join(output_dir, PUZZLES_DIR_NAME)
+    os.makedirs(puzzles_dir, exist_ok=True)
+    answers = {}
+    for puzzle_number, clues in enumerate(puzzle_clues):
+        if not clues:
+            continue
+        # the clues are shuffled, so their order gives nothing away
+        clues = [clues[clue_number] for clue_number in np.random.default_rng(seed + puzzle_number)
+                 .permutation(len(clues))]
+        clues_file_name = "synthetic-{:03d}.txt".format(puzzle_number + 1)
+        write_movie_clues_file(os.path.join(puzzles_dir, clues_file_name), clues)
+        answers[clues_file_name] = "Synthetic Star {}".format(puzzle_number + 1)
+    # in the same format as the answers file read by accuracy-test.py
+    with open(os.path.join(output_dir, ANSWERS_FILE_NAME), 'w', newline='') as answers_file:
+        writer = csv.writer(answers_file)
+        writer.writerow(['puzzle', 'answer'])
+        writer.writerows(answers.items())
+    return answers
+
+
+def parse_cli_args():
+    arg_parser = argparse.ArgumentParser(description="Generate synthetic raw IMDb data files, in the formats found "
+                                                     "at https://datasets.imdbws.com, with puzzles whose answers are "
+                                                     "known.",
+                                         formatter_class=SmartFormatter)
+    arg_parser.add_argument('-o',
+                            '--output-dir',
+                            help="R|the full path to the directory to write the data files to.\n"
+                                 "Mandatory.",
+                            required=True)
+    arg_parser.add_argument('-s',
+                            '--scale',
+                            help="R|the size of the data, as a multiple of today's IMDb data. Optional, default\n"
+                                 "is 0.01.",
+                            type=float,
+                            default=0.01)
+    arg_parser.add_argument('-n',
+                            '--puzzles',
+                            help="R|the number of puzzles to write clues files for. Optional, default is {}."
+                                 .format(DEFAULT_PUZZLES),
+                            type=int,
+                            default=DEFAULT_PUZZLES)
+    arg_parser.add_argument('--seed',
+                            help='R|the seed for the random data. Optional, default is 0.',
+                            type=int,
+                            default=0)
+    return vars(arg_parser.parse_args())
+
+
+if __name__ == '__main__':
+    args = parse_cli_args()
+    generate_imdb_data(args['output_dir'], args['scale'], args['puzzles'], args['seed'])
@@ -0,0 +1,82 @@
+import asyncio
+import json
+
+import pandas as pd
+
+import pytest
+
+from actorle_server import PuzzleSolvingService
+from movie_clues import MovieClue
+
+
+@pytest.fixture()
+def solving_service():
+    movies_df = pd.DataFrame(data={
+        'tconst': [79501, 82694, 89530],
+        'primaryTitle': ['Mad Max', 'Mad Max 2: The Road Warrior', 'Mad Max Beyond Thunderdome'],
+        'startYear': ['1979', '1981', '1985'],
+        'averageRating': [6.8, 7.6, 6.3]
+    })
+    performances_df = pd.DataFrame(data={
+        'tconst': [79501, 79501, 82694, 89530, 89530],
+        'nconst': [154, 621, 154, 154, 661],
+        'characters': ['["Max"]', '["Jessie"]', '["Max"]', '["Mad Max"]', '["Aunty Entity"]']
+    })
+    actors_df = pd.DataFrame(data={
+        'nconst': [154, 621, 661],
+        'primaryName': ['Mel Gibson', 'Joanne Samuel', 'Tina Turner']
+    })
+    yield PuzzleSolvingService(movies_df, performances_df, actors_df)
+
+
+@pytest.fixture()
+def mad_max_clues():
+    yield [
+        MovieClue('xxx xxx', '1979', 'Action', 6.8),
+        MovieClue('xxx xxx x: xxx xxxx xxxxxxx', '1981', 'Action', 7.6),
+        MovieClue('xxx xxx xxxxxx xxxxxxxxxxx', '1985', 'Action', 6.3),
+    ]
+
+
+def test_identical_concurrent_solves_are_coalesced(solving_service, mad_max_clues):
+    async def solve_concurrently():
+        return await asyncio.gather(*[solving_service.solve(mad_max_clues) for _ in range(5)])
+
+    results = asyncio.run(solve_concurrently())
+
+    assert solving_service.computed_solves == 1
+    assert all(result == results[0] for result in results)
+    assert results[0]['answer'] == 'Mel Gibson'
+    assert results[0]['options'][0]['clue_matches'] == 3
+    assert not solving_service.in_flight_solves
+
+
+def test_solves_puzzle_posted_over_http(solving_service, mad_max_clues):
+    async def post_puzzle():
+        server = await asyncio.start_server(solving_service.handle_connection, host='127.0.0.1', port=0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            body = json.dumps({
+                'clues': [clue.__dict__ for clue in mad_max_clues],
+                'num_options': 2
+            }).encode('utf-8')
+            writer.write("POST /solve HTTP/1.1\r\nHost: localhost\r\nContent-Length: {}\r\n\r\n"
+                         .format(len(body)).encode('latin-1') + body)
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+        return response
+
+    status_line, _, response_body = asyncio.run(post_puzzle()).partition(b'\r\n')
+    solve_result = json.loads(response_body.split(b'\r\n\r\n', 1)[1])
+
+    assert status_line == b'HTTP/1.1 200 OK'
+    assert [option['name'] for option in solve_result['options']] == ['Mel Gibson', 'Joanne Samuel']
+
+
+def test_rejects_malformed_solve_request(solving_service):
+    status, payload = asyncio.run(solving_service.route('POST', '/solve', b'{"clues": [{"year": 1979}]}'))
+
+    assert status == 400
+    assert 'error' in payload
@@ -1,6 +1,13 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
 import pandas as pd
 
 import actorle_solver
+import data_store
+from clue_cache import ClueCache
 
 import pytest
 
@@ -10,7 +17,7 @@ from movie_clues import MovieClue, movie_title_to_clues_pattern
 @pytest.fixture()
 def single_movie_dataframe():
     movie_data = {
-        'tconst': ['tt0079501'],
+        'tconst': [79501],
         'primaryTitle': ['Mad Max'],
         'startYear': ['1979'],
         'averageRating': [6.8]
@@ -43,9 +50,9 @@ def test_matches_movie_with_exact_review_score_match(single_movie_dataframe):
     movie_data_frame, movie_data = single_movie_dataframe
     assert movie_data_frame.shape[0] == 1
 
-    matched_movies_df = actorle_solver.get_matching_movies_dataframe(movie_data_frame,
-                                                                     clue_that_should_be_matched(movie_data_frame),
-                                                                     0.0)
+    matched_movies_df = actorle_solver.get_matching_movies_dataframe(
+        movie_data_frame, clue_that_should_be_matched(movie_data_frame), 0.0,
+        actorle_solver.make_title_pattern_index(movie_data_frame))
 
     matches_list = matched_movies_df.to_dict('records')
     assert len(matches_list) == 1
@@ -63,7 +70,8 @@ def test_matches_movie_with_different_review_score_when_inside_tolerance(single_
     rating_tolerance = 0.1
     clue = change_movie_rating_in_clue(clue_that_should_be_matched(movie_data_frame), rating_tolerance)
 
-    matched_movies_df = actorle_solver.get_matching_movies_dataframe(movie_data_frame, clue, rating_tolerance)
+    matched_movies_df = actorle_solver.get_matching_movies_dataframe(
+        movie_data_frame, clue, rating_tolerance, actorle_solver.make_title_pattern_index(movie_data_frame))
 
     matches_list = matched_movies_df.to_dict('records')
     assert len(matches_list) == 1
@@ -79,7 +87,446 @@ def test_does_not_match_movie_with_review_score_outside_tolerance(single_movie_d
     # make the rating score in the clue differ from the rating score in the movie data
     clue = change_movie_rating_in_clue(clue_that_should_be_matched(movie_data_frame), 0.1)
 
-    matched_movies_df = actorle_solver.get_matching_movies_dataframe(movie_data_frame, clue, 0.0)
+    matched_movies_df = actorle_solver.get_matching_movies_dataframe(
+        movie_data_frame, clue, 0.0, actorle_solver.make_title_pattern_index(movie_data_frame))
 
     matches_list = matched_movies_df.to_dict('records')
     assert len(matches_list) == 0
+
+
+def test_title_pattern_index_only_matches_pattern_and_year():
+    movie_data_frame = pd.DataFrame(data={
+        'tconst': [79501, 82694, 1392190, 2],
+        'primaryTitle': ['Mad Max', 'Mad Max 2: The Road Warrior', 'Mad Max: Fury Road', 'Bad Cat'],
+        'startYear': ['1979', '1981', '2015', '1981'],
+        'averageRating': [6.8, 7.6, 8.1, 7.6]
+    })
+    title_index = actorle_solver.make_title_pattern_index(movie_data_frame)
+    clue = MovieClue('xxx xxx x: xxx xxxx xxxxxxx', '1981', 'Action', 7.6)
+
+    matched_movies_df = actorle_solver.get_matching_movies_dataframe(movie_data_frame, clue, 0.0, title_index)
+
+    assert matched_movies_df.to_dict('records') == [
+        {'tconst': 82694, 'primaryTitle': 'Mad Max 2: The Road Warrior'}
+    ]
+
+
+def test_title_pattern_index_of_some_years_keeps_whole_table_positions():
+    movie_data_frame = pd.DataFrame(data={
+        'tconst': [79501, 82694, 2],
+        'primaryTitle': ['Mad Max', 'Mad Max 2: The Road Warrior', 'Bad Cat'],
+        'startYear': np.array([1979, 1981, 1981], dtype=np.int16),
+        'averageRating': [6.8, 7.6, 7.6]
+    })
+
+    title_index = actorle_solver.make_title_pattern_index(movie_data_frame, movie_years={1981})
+
+    assert set(title_index.keys()) == {('xxx xxx x: xxx xxxx xxxxxxx', 1981), ('xxx xxx', 1981)}
+    positions, ratings = title_index[('xxx xxx', 1981)]
+    assert positions.tolist() == [2]
+    assert ratings.tolist() == [7.6]
+
+
+def test_finds_clues_files_in_directories_and_individual_paths(tmpdir):
+    for clues_file in ['actorle-2022-03-18.txt', 'actorle-2022-03-17.txt']:
+        tmpdir.join(clues_file).write('xxx xxx|1979|Action|6.8\n')
+    single_file = "{}/{}".format(tmpdir, 'actorle-2022-03-17.txt')
+
+    clues_files = actorle_solver.find_clues_files([str(tmpdir), single_file])
+
+    assert clues_files == [
+        "{}/{}".format(tmpdir, 'actorle-2022-03-17.txt'),
+        "{}/{}".format(tmpdir, 'actorle-2022-03-18.txt'),
+        single_file
+    ]
+
+
+def test_solves_batch_puzzle_against_shared_data(single_movie_dataframe):
+    movie_data_frame, _ = single_movie_dataframe
+    performances_df = pd.DataFrame(data={
+        'tconst': [79501, 79501],
+        'nconst': [154, 621],
+        'characters': ['["Max"]', '["Jessie"]']
+    })
+    actors_df = pd.DataFrame(data={
+        'nconst': [154, 621],
+        'primaryName': ['Mel Gibson', 'Joanne Samuel']
+    })
+    actorle_solver.init_batch_worker(movie_data_frame,
+                                     performances_df,
+                                     actorle_solver.make_actor_name_index(actors_df),
+                                     actorle_solver.make_title_pattern_index(movie_data_frame),
+                                     actorle_solver.make_incidence_matrix(movie_data_frame, performances_df))
+
+    result = actorle_solver.solve_batch_puzzle('clues-files/mad-max.txt',
+                                               [clue_that_should_be_matched(movie_data_frame)],
+                                               1,
+                                               0.0)
+
+    assert result['puzzle'] == 'mad-max.txt'
+    assert result['number_of_clues'] == 1
+    assert result['answer'] == 'Mel Gibson'
+    assert len(result['options']) == 1
+    assert result['options'][0]['nconst'] == 'nm0000154'
+
+
+def test_solve_puzzles_sends_solver_output_to_log(tmpdir, single_movie_dataframe, capsys):
+    movie_data_frame, _ = single_movie_dataframe
+    performances_df = pd.DataFrame(data={'tconst': [79501], 'nconst': [154], 'characters': ['["Max"]']})
+    actors_df = pd.DataFrame(data={'nconst': [154], 'primaryName': ['Mel Gibson']})
+    batch_data = (movie_data_frame, performances_df, actorle_solver.make_actor_name_index(actors_df),
+                  actorle_solver.make_title_pattern_index(movie_data_frame),
+                  actorle_solver.make_incidence_matrix(movie_data_frame, performances_df))
+    solver_log = "{}/{}".format(tmpdir, 'solver.log')
+
+    results = actorle_solver.solve_puzzles({'mad-max.txt': [clue_that_should_be_matched(movie_data_frame)]},
+                                           batch_data, 3, 0.1, solver_log=solver_log)
+
+    assert [result['answer'] for result in results] == ['Mel Gibson']
+    timings = results[0]['timings']
+    assert set(timings.keys()) == {'ranking_seconds', 'naming_seconds', 'roles_seconds', 'solve_seconds'}
+    assert timings['ranking_seconds'] + timings['naming_seconds'] + timings['roles_seconds'] == \
+        pytest.approx(timings['solve_seconds'], abs=1e-5)
+    assert "Working through the clues" not in capsys.readouterr().out
+    assert "Working through the clues" in tmpdir.join('solver.log').read()
+
+
+def test_top_scoring_actors_are_ranked_by_score_then_actor_id():
+    actor_ids = np.array([154, 621, 661, 1234, 5678])
+    actor_scores = np.array([3, 1, 0, 3, 2])
+
+    assert actorle_solver.get_top_scoring_actors(actor_ids, actor_scores, 3) == [(154, 3), (1234, 3), (5678, 2)]
+    assert actorle_solver.get_top_scoring_actors(actor_ids, actor_scores, 10) == [(154, 3), (1234, 3), (5678, 2),
+                                                                                 (621, 1)]
+
+
+def test_scores_actors_by_performances_in_matching_movies():
+    movie_data_frame = pd.DataFrame(data={
+        'tconst': [79501, 82694, 89530],
+        'primaryTitle': ['Mad Max', 'Mad Max 2: The Road Warrior', 'Mad Max Beyond Thunderdome'],
+        'startYear': ['1979', '1981', '1985'],
+        'averageRating': [6.8, 7.6, 6.3]
+    })
+    performances_df = pd.DataFrame(data={
+        'tconst': [79501, 79501, 82694, 89530, 89530],
+        'nconst': [154, 621, 154, 154, 661],
+        'characters': ['["Max"]', '["Jessie"]', '["Max"]', '["Mad Max"]', '["Aunty Entity"]']
+    })
+    clues = [
+        MovieClue('xxx xxx', '1979', 'Action', 6.8),
+        MovieClue('xxx xxx xxxxxx xxxxxxxxxxx', '1985', 'Action', 6.3),
+    ]
+
+    most_likely_actors = actorle_solver.get_most_likely_actors_for_clues(clues, movie_data_frame, performances_df,
+                                                                         3, 0.1)
+
+    assert most_likely_actors == [(154, 2), (621, 1), (661, 1)]
+
+
+def test_solver_solves_quietly_and_explains_its_answer(capsys):
+    movie_data_frame = pd.DataFrame(data={
+        'tconst': [79501, 82694, 89530],
+        'primaryTitle': ['Mad Max', 'Bad Cat', 'Mad Max Beyond Thunderdome'],
+        'startYear': ['1979', '1979', '1985'],
+        'averageRating': [6.8, 6.8, 6.3]
+    })
+    performances_df = pd.DataFrame(data={
+        'tconst': [79501, 79501, 82694, 89530],
+        'nconst': [154, 621, 621, 154],
+        'characters': ['["Max"]', '["Jessie"]', '["Cat"]', '["Mad Max"]']
+    })
+    actors_df = pd.DataFrame(data={'nconst': [154, 621], 'primaryName': ['Mel Gibson', 'Joanne Samuel']})
+    clues = [
+        MovieClue('xxx xxx', '1979', 'Action', 6.8),
+        MovieClue('xxx xxx xxxxxx xxxxxxxxxxx', '1985', 'Action', 6.3),
+    ]
+
+    solver = actorle_solver.Solver(movie_data_frame, performances_df, actorle_solver.make_actor_name_index(actors_df))
+    result = solver.solve(clues, 2, 0.1)
+
+    assert capsys.readouterr().out == ""
+    assert result['answer'] == 'Mel Gibson'
+    assert [clue['candidate_movies'] for clue in result['clues']] == [2, 1]
+    assert [movie['title'] for movie in result['options'][0]['matched_movies']] == \
+        ['Mad Max', 'Mad Max Beyond Thunderdome']
+    assert [movie['tconst'] for movie in result['options'][1]['matched_movies']] == ['tt0079501', 'tt0082694']
+    assert [role['Character'] for role in result['options'][1]['roles']] == ['["Jessie"]', '["Cat"]']
+
+
+def write_mad_max_store(store_dir):
+    data_store.write_data_store(store_dir, pd.DataFrame(data={
+        'tconst': ['tt0079501', 'tt0082694', 'tt0089530'],
+        'primaryTitle': ['Mad Max', 'Bad Cat', 'Mad Max Beyond Thunderdome'],
+        'titlePattern': ['xxx xxx', 'xxx xxx', 'xxx xxx xxxxxx xxxxxxxxxxx'],
+        'startYear': ['1979', '1979', '1985'],
+        'averageRating': [6.8, 6.8, 6.3]
+    }), pd.DataFrame(data={
+        'tconst': ['tt0079501', 'tt0079501', 'tt0082694', 'tt0089530'],
+        'nconst': ['nm0000154', 'nm0000621', 'nm0000621', 'nm0000154'],
+        'characters': ['["Max"]', '["Jessie"]', '["Cat"]', '["Mad Max"]']
+    }), pd.DataFrame(data={'nconst': ['nm0000154', 'nm0000621'], 'primaryName': ['Mel Gibson', 'Joanne Samuel']}))
+
+
+def test_solver_loaded_from_store_solves_against_its_mapped_titles(tmpdir):
+    store_dir = "{}/{}".format(tmpdir, 'store')
+    write_mad_max_store(store_dir)
+    clues = [
+        MovieClue('xxx xxx', '1979', 'Action', 6.8),
+        MovieClue('xxx xxx xxxxxx xxxxxxxxxxx', '1985', 'Action', 6.3),
+    ]
+
+    solver = actorle_solver.Solver.load(data_store=store_dir)
+    result = solver.solve(clues, 2, 0.1)
+
+    assert 'primaryTitle' not in solver.movies_df.columns
+    assert result['answer'] == 'Mel Gibson'
+    assert [movie['title'] for movie in result['options'][0]['matched_movies']] == \
+        ['Mad Max', 'Mad Max Beyond Thunderdome']
+    assert [role['Movie'] for role in result['options'][1]['roles']] == ['Mad Max', 'Bad Cat']
+    assert [role['Character'] for role in result['options'][1]['roles']] == ['["Jessie"]', '["Cat"]']
+
+
+def test_solver_loaded_from_store_solves_against_the_same_data_after_the_store_is_refreshed(tmpdir):
+    store_dir = "{}/{}".format(tmpdir, 'store')
+    write_mad_max_store(store_dir)
+    clues = [MovieClue('xxx xxx', '1979', 'Action', 6.8)]
+    solver = actorle_solver.Solver.load(data_store=store_dir)
+    result_before_refresh = solver.solve(clues, 2, 0.1)
+
+    # fewer performances, with different characters, and renamed actors, so rows looked up in the refreshed store
+    # would give the wrong roles and names, or none at all
+    data_store.update_data_store(store_dir, {
+        data_store.PERFORMANCES_TABLE: pd.DataFrame(data={'tconst': [89530], 'nconst': [661],
+                                                          'characters': ['["Aunty Entity"]']}),
+        data_store.ACTORS_TABLE: pd.DataFrame(data={'nconst': [661], 'primaryName': ['Tina Turner']}),
+    }, {})
+
+    assert solver.solve(clues, 2, 0.1) == result_before_refresh
+    assert [option['name'] for option in result_before_refresh['options']] == ['Joanne Samuel', 'Mel Gibson']
+    assert [role['Character'] for role in result_before_refresh['options'][0]['roles']] == ['["Jessie"]', '["Cat"]']
+
+
+def test_verbose_solver_reports_its_progress(single_movie_dataframe, capsys):
+    movie_data_frame, _ = single_movie_dataframe
+    performances_df = pd.DataFrame(data={'tconst': [79501], 'nconst': [154], 'characters': ['["Max"]']})
+    actors_df = pd.DataFrame(data={'nconst': [154], 'primaryName': ['Mel Gibson']})
+
+    solver = actorle_solver.Solver(movie_data_frame, performances_df, actorle_solver.make_actor_name_index(actors_df),
+                                   verbose=True)
+    solver.solve([clue_that_should_be_matched(movie_data_frame)])
+
+    assert "Counted 1 individual movie performances" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_cached_solves_rank_as_uncached_solves(seed):
+    movie_data_frame, performances_df, puzzle_clues = make_random_puzzle(seed)
+    title_index = actorle_solver.make_title_pattern_index(movie_data_frame)
+    actor_movie_incidence = actorle_solver.make_incidence_matrix(movie_data_frame, performances_df)
+    clue_cache = ClueCache()
+    expected_ranking = actorle_solver.get_most_likely_actors_for_clues(puzzle_clues, movie_data_frame, performances_df,
+                                                                       3, 0.5, title_index, actor_movie_incidence)
+
+    # the second solve, with the clues in another order, is answered from the cache
+    for clues in [puzzle_clues, puzzle_clues[::-1]]:
+        assert actorle_solver.get_most_likely_actors_for_clues(clues, movie_data_frame, performances_df, 3, 0.5,
+                                                               title_index, actor_movie_incidence,
+                                                               clue_cache=clue_cache) == expected_ranking
+    # every clue misses its candidate movies and, unless pruned before being scored in full, its actors' scores
+    assert clue_cache.get_stats()['misses'] <= 2 * len(puzzle_clues)
+    assert clue_cache.get_stats()['hits'] >= len(puzzle_clues)
+
+
+def test_solver_clue_cache_is_keyed_by_dataset_version(single_movie_dataframe):
+    movie_data_frame, _ = single_movie_dataframe
+    performances_df = pd.DataFrame(data={'tconst': [79501], 'nconst': [154], 'characters': ['["Max"]']})
+    actors_df = pd.DataFrame(data={'nconst': [154], 'primaryName': ['Mel Gibson']})
+    clue_cache = ClueCache()
+    clues = [clue_that_should_be_matched(movie_data_frame)]
+
+    for dataset_version in [1, 1, 2]:
+        solver = actorle_solver.Solver(movie_data_frame, performances_df,
+                                       actorle_solver.make_actor_name_index(actors_df), clue_cache=clue_cache,
+                                       dataset_version=dataset_version)
+        assert solver.solve(clues)['answer'] == 'Mel Gibson'
+
+    assert clue_cache.get_stats()['hits'] == 2
+    assert clue_cache.get_stats()['misses'] == 4
+
+
+def test_clue_cache_key_is_the_same_for_differently_written_years():
+    assert actorle_solver.get_clue_cache_key(MovieClue('xxx xxx', ' 1979', 'Action', 6.8), 0.1, 1) == \
+        actorle_solver.get_clue_cache_key(MovieClue('xxx  xxx', '1979', 'Action', 6.8), 0.1, 1)
+
+
+def test_finds_roles_of_several_actors_in_movies_matching_the_clues():
+    movie_data_frame = pd.DataFrame(data={
+        'tconst': [89530, 79501, 2],
+        'primaryTitle': ['Mad Max Beyond Thunderdome', 'Mad Max', 'Heat'],
+        'startYear': ['1985', '1979', '1995'],
+        'averageRating': [6.3, 6.8, 8.3]
+    })
+    performances_df = pd.DataFrame(data={
+        'tconst': [89530, 79501, 79501, 2, 89530],
+        'nconst': [154, 154, 621, 154, 661],
+        'characters': ['["Mad Max"]', '["Max"]', '["Jessie"]', '["Cop"]', '["Aunty Entity"]']
+    })
+    clues = [MovieClue('xxx xxx', '1979', 'Action', 6.8), MovieClue('xxx xxx xxxxxx xxxxxxxxxxx', '1985', 'Action', 6.3)]
+
+    for filmography_index in [None, actorle_solver.make_filmography_index(movie_data_frame, performances_df)]:
+        roles = actorle_solver.get_matching_roles_for_actors(clues, [154, 621, 9999], performances_df,
+                                                             movie_data_frame, filmography_index)
+
+        assert roles[154].to_dict('records') == [
+            {'Movie': 'Mad Max', 'Year': '1979', 'Character': '["Max"]'},
+            {'Movie': 'Mad Max Beyond Thunderdome', 'Year': '1985', 'Character': '["Mad Max"]'},
+        ]
+        assert roles[621].to_dict('records') == [{'Movie': 'Mad Max', 'Year': '1979', 'Character': '["Jessie"]'}]
+        assert roles[9999].empty
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_indexed_roles_are_the_same_as_scanned_roles(seed):
+    movie_data_frame, performances_df, puzzle_clues = make_random_puzzle(seed)
+    actor_ids = list(range(1, 60))
+    filmography_index = actorle_solver.make_filmography_index(movie_data_frame, performances_df)
+
+    scanned_roles = actorle_solver.get_matching_roles_for_actors(puzzle_clues, actor_ids, performances_df,
+                                                                 movie_data_frame)
+    indexed_roles = actorle_solver.get_matching_roles_for_actors(puzzle_clues, actor_ids, performances_df,
+                                                                 movie_data_frame, filmography_index)
+
+    for actor_id in actor_ids:
+        assert indexed_roles[actor_id].equals(scanned_roles[actor_id])
+
+
+def test_looks_up_batch_of_actor_names_by_id():
+    actors_df = pd.DataFrame(data={
+        'nconst': [621, 154, 661],
+        'primaryName': ['Joanne Samuel', 'Mel Gibson', 'Tina Turner']
+    })
+    actor_name_index = actorle_solver.make_actor_name_index(actors_df)
+
+    assert actorle_solver.get_actor_names([661, 154, 9999, 621], actor_name_index) == \
+        ['Tina Turner', 'Mel Gibson', None, 'Joanne Samuel']
+    assert actorle_solver.get_actor_name(154, actor_name_index) == 'Mel Gibson'
+
+
+def test_title_pattern_index_keeps_each_group_in_rating_order():
+    movie_data_frame = pd.DataFrame(data={
+        'tconst': [1, 2, 3, 4],
+        'primaryTitle': ['Mad Max', 'Bad Cat', 'Sad Dog', 'Rad Rat'],
+        'startYear': ['1979', '1979', '1979', '1979'],
+        'averageRating': [6.8, 5.1, 7.9, 6.7]
+    })
+
+    positions, ratings = actorle_solver.make_title_pattern_index(movie_data_frame)[('xxx xxx', 1979)]
+
+    assert positions.tolist() == [1, 3, 0, 2]
+    assert ratings.tolist() == [5.1, 6.7, 6.8, 7.9]
+
+
+def test_exact_rating_matches_ratings_held_as_float32():
+    movie_data_frame = pd.DataFrame(data={
+        'tconst': np.array([79501, 2], dtype=np.int32),
+        'primaryTitle': ['Mad Max', 'Bad Cat'],
+        'startYear': np.array([1979, 1979], dtype=np.int16),
+        'averageRating': np.array([6.8, 6.9], dtype=np.float32)
+    })
+    clue = MovieClue('xxx xxx', '1979', 'Action', 6.8)
+
+    matched_movies_df = actorle_solver.get_matching_movies_dataframe(
+        movie_data_frame, clue, 0.0, actorle_solver.make_title_pattern_index(movie_data_frame))
+
+    assert matched_movies_df['tconst'].to_list() == [79501]
+
+
+@pytest.mark.parametrize("rating_floor, rating_ceiling, expected_ratings",
+                         [
+                             (6.7, 6.9, [6.7, 6.8]),
+                             (6.8, 6.8, [6.8]),
+                             (5.0, 9.0, [5.1, 6.7, 6.8, 7.9]),
+                             (8.0, 9.0, []),
+                         ])
+def test_rating_window_is_inclusive_slice_of_sorted_ratings(rating_floor, rating_ceiling, expected_ratings):
+    sorted_ratings = np.array([5.1, 6.7, 6.8, 7.9])
+
+    rating_window = actorle_solver.get_rating_window(sorted_ratings, rating_floor, rating_ceiling)
+
+    assert sorted_ratings[rating_window].tolist() == expected_ratings
+
+
+def make_random_puzzle(seed):
+    random = np.random.default_rng(seed)
+    number_of_movies = 300
+    movie_data_frame = pd.DataFrame(data={
+        'tconst': np.arange(1, number_of_movies + 1),
+        'primaryTitle': random.choice(['Mad Max', 'Bad Cat', 'Heat', 'Alien', 'The Thing'], number_of_movies),
+        'startYear': random.choice(['1979', '1981', '1982'], number_of_movies),
+        'averageRating': random.choice([5.5, 5.6, 6.0, 6.1, 6.5, 7.0], number_of_movies)
+    })
+    # a small pool of actors, some in the same movie more than once, so there are plenty of tied scores
+    performances_df = pd.DataFrame(data={
+        'tconst': random.integers(1, number_of_movies + 1, 2000),
+        'nconst': random.integers(1, 60, 2000),
+        'characters': ['\\N'] * 2000
+    })
+    clue_movies = movie_data_frame.sample(n=8, random_state=seed).to_dict('records')
+    puzzle_clues = [MovieClue(movie_title_to_clues_pattern(movie['primaryTitle']), movie['startYear'], 'Action',
+                              movie['averageRating']) for movie in clue_movies]
+    return movie_data_frame, performances_df, puzzle_clues
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_pruned_ranking_is_the_same_as_the_exhaustive_ranking(seed):
+    movie_data_frame, performances_df, puzzle_clues = make_random_puzzle(seed)
+    title_index = actorle_solver.make_title_pattern_index(movie_data_frame)
+    actor_movie_incidence = actorle_solver.make_incidence_matrix(movie_data_frame, performances_df)
+
+    for num_options in [1, 3, 10]:
+        rankings = [actorle_solver.get_most_likely_actors_for_clues(puzzle_clues, movie_data_frame, performances_df,
+                                                                    num_options, 0.5, title_index,
+                                                                    actor_movie_incidence, prune=prune)
+                    for prune in [True, False]]
+        assert rankings[0] == rankings[1]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_tolerance_sweep_ranks_as_each_tolerance_would_alone(seed):
+    movie_data_frame, performances_df, puzzle_clues = make_random_puzzle(seed)
+    title_index = actorle_solver.make_title_pattern_index(movie_data_frame)
+    actor_movie_incidence = actorle_solver.make_incidence_matrix(movie_data_frame, performances_df)
+
+    tolerance_rankings = actorle_solver.get_most_likely_actors_for_tolerances(puzzle_clues, movie_data_frame,
+                                                                              performances_df, 5, [0.5, 0.0, 0.1, 1.0],
+                                                                              title_index, actor_movie_incidence)
+
+    assert list(tolerance_rankings.keys()) == [0.0, 0.1, 0.5, 1.0]
+    for rating_tolerance, most_likely_actors in tolerance_rankings.items():
+        assert most_likely_actors == actorle_solver.get_most_likely_actors_for_clues(
+            puzzle_clues, movie_data_frame, performances_df, 5, rating_tolerance, title_index, actor_movie_incidence)
+
+
+# modules that only some code paths need, so must not be paid for just by starting the solver
+DEFERRED_IMPORTS = ['pandas', 'scipy', 'selenium', 'chromedriver_py', 'bs4']
+STARTUP_IMPORT_BUDGET_SECONDS = 0.5
+
+
+def get_import_times(module_name):
+    """Imports the module in a fresh interpreter, giving the cumulative import time of each module it loads."""
+    repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import {}'.format(module_name)],
+                               cwd=repo_dir, capture_output=True, text=True, check=True)
+    import_times = {}
+    for line in completed.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line and 'cumulative' not in line:
+            _, cumulative_us, imported_module = line.split('|')
+            import_times[imported_module.strip()] = int(cumulative_us) / 1e6
+    return import_times
+
+
+@pytest.mark.parametrize("module_name", ['actorle_solver', 'movie_clues'])
+def test_solver_starts_up_within_import_budget(module_name):
+    import_times = get_import_times(module_name)
+    assert not [imported for imported in import_times if imported.split('.')[0] in DEFERRED_IMPORTS]
+    assert import_times[module_name] < STARTUP_IMPORT_BUDGET_SECONDS
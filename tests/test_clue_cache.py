@@ -0,0 +1,24 @@
+from clue_cache import ClueCache
+
+
+def test_counts_hits_and_misses():
+    clue_cache = ClueCache(2)
+
+    assert clue_cache.get('a') is None
+    clue_cache.put('a', 1)
+    assert clue_cache.get('a') == 1
+
+    assert clue_cache.get_stats() == {'entries': 1, 'max_entries': 2, 'hits': 1, 'misses': 1}
+
+
+def test_evicts_least_recently_used_entry():
+    clue_cache = ClueCache(2)
+    clue_cache.put('a', 1)
+    clue_cache.put('b', 2)
+    clue_cache.get('a')
+
+    clue_cache.put('c', 3)
+
+    assert clue_cache.get('b') is None
+    assert clue_cache.get('a') == 1
+    assert clue_cache.get('c') == 3
@@ -0,0 +1,262 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import pytest
+
+import data_store
+
+
+@pytest.fixture()
+def tables():
+    movies_df = pd.DataFrame(data={
+        'tconst': ['tt0079501', 'tt0082694', 'tt0000001'],
+        'primaryTitle': ['Mad Max', 'Mad Max 2: The Road Warrior', 'Carmencita'],
+        'titlePattern': ['xxx xxx', 'xxx xxx x: xxx xxxx xxxxxxx', 'xxxxxxxxxx'],
+        'startYear': ['1979', '1981', '\\N'],
+        'averageRating': [6.8, 7.6, 5.7]
+    })
+    performances_df = pd.DataFrame(data={
+        'tconst': ['tt0079501', 'tt0079501', 'tt0082694'],
+        'nconst': ['nm0000154', 'nm0000621', 'nm0000154'],
+        'characters': ['["Max"]', '\\N', '["Max Rockatansky"]']
+    })
+    actors_df = pd.DataFrame(data={
+        'nconst': ['nm0000154', 'nm0000621'],
+        'primaryName': ['Mel Gibson', 'Joanne Samuel']
+    })
+    yield movies_df, performances_df, actors_df
+
+
+def test_round_trip_preserves_tables(tmpdir, tables):
+    movies_df, performances_df, actors_df = tables
+    store_dir = "{}/{}".format(tmpdir, 'store')
+    data_store.write_data_store(store_dir, movies_df, performances_df, actors_df)
+    assert data_store.is_data_store(store_dir)
+
+    # the movies come back in release year order
+    round_tripped_movies = data_store.read_table(store_dir, data_store.MOVIES_TABLE)
+    assert round_tripped_movies.drop(columns='averageRating').to_dict('records') == [
+        {'tconst': 1, 'primaryTitle': 'Carmencita', 'titlePattern': 'xxxxxxxxxx', 'startYear': 0},
+        {'tconst': 79501, 'primaryTitle': 'Mad Max', 'titlePattern': 'xxx xxx', 'startYear': 1979},
+        {'tconst': 82694, 'primaryTitle': 'Mad Max 2: The Road Warrior',
+         'titlePattern': 'xxx xxx x: xxx xxxx xxxxxxx', 'startYear': 1981},
+    ]
+    assert round_tripped_movies.averageRating.to_list() == pytest.approx([5.7, 6.8, 7.6])
+    assert round_tripped_movies.dtypes.astype(str).to_dict() == {
+        'tconst': 'int32', 'primaryTitle': 'object', 'titlePattern': 'object', 'startYear': 'int16',
+        'averageRating': 'float32'
+    }
+    # the characters are a side column, only read when asked for
+    round_tripped_performances = data_store.read_table(store_dir, data_store.PERFORMANCES_TABLE)
+    assert round_tripped_performances.to_dict('list') == {
+        'tconst': [79501, 79501, 82694],
+        'nconst': [154, 621, 154]
+    }
+    assert data_store.read_table(store_dir, data_store.PERFORMANCES_TABLE,
+                                 columns=['characters']).characters.to_list() == \
+        ['["Max"]', '\\N', '["Max Rockatansky"]']
+    round_tripped_actors = data_store.read_table(store_dir, data_store.ACTORS_TABLE)
+    assert data_store.format_imdb_ids('nconst', round_tripped_actors.nconst) == actors_df.nconst.to_list()
+    assert round_tripped_actors.primaryName.to_list() == actors_df.primaryName.to_list()
+
+
+def test_reads_only_requested_columns(tmpdir, tables):
+    store_dir = "{}/{}".format(tmpdir, 'store')
+    data_store.write_data_store(store_dir, *tables)
+
+    actor_ids = data_store.read_table(store_dir, data_store.ACTORS_TABLE, columns=['nconst'])
+
+    assert actor_ids.columns.to_list() == ['nconst']
+
+
+def test_falls_back_to_tsv_file_when_there_is_no_store(tmpdir, tables):
+    _, _, actors_df = tables
+    actors_file_path = "{}/{}".format(tmpdir, 'name.basics.tsv.gz')
+    actors_df.to_csv(actors_file_path, sep='\t', compression='gzip', index=False)
+
+    read_actors_df = data_store.read_data_table(data_store.ACTORS_TABLE,
+                                                tsv_file=actors_file_path,
+                                                store_dir="{}/{}".format(tmpdir, 'no-such-store'))
+
+    assert read_actors_df.to_dict('list') == {
+        'nconst': [154, 621],
+        'primaryName': ['Mel Gibson', 'Joanne Samuel']
+    }
+
+
+def test_reads_tsv_file_into_the_same_types_as_the_store(tmpdir, tables):
+    movies_df, _, _ = tables
+    movies_file_path = "{}/{}".format(tmpdir, 'title.basics.tsv.gz')
+    movies_df.assign(titleType='movie').to_csv(movies_file_path, sep='\t', compression='gzip', index=False)
+    store_dir = "{}/{}".format(tmpdir, 'store')
+    data_store.write_data_store(store_dir, *tables)
+
+    read_movies_df = data_store.read_tsv_table(data_store.MOVIES_TABLE, movies_file_path)
+
+    assert read_movies_df.columns.to_list() == ['tconst', 'primaryTitle', 'titlePattern', 'startYear', 'averageRating']
+    assert read_movies_df.startYear.to_list() == [1979, 1981, data_store.MISSING_YEAR]
+    assert read_movies_df.dtypes.to_dict() == data_store.read_table(store_dir, data_store.MOVIES_TABLE).dtypes.to_dict()
+
+
+@pytest.mark.parametrize("column_name, imdb_id",
+                         [
+                             ('tconst', 'tt0079501'),
+                             ('tconst', 'tt10872600'),
+                             ('nconst', 'nm0000154'),
+                         ])
+def test_imdb_ids_round_trip_through_numbers(column_name, imdb_id):
+    imdb_id_number = data_store.imdb_ids_to_numbers([imdb_id])[0]
+
+    assert data_store.format_imdb_id(column_name, imdb_id_number) == imdb_id
+
+
+def test_maps_actor_names_of_sorted_store(tmpdir, tables):
+    movies_df, performances_df, _ = tables
+    actors_df = pd.DataFrame(data={
+        'nconst': ['nm0000661', 'nm0000154', 'nm0000621'],
+        'primaryName': ['Tina Turner', 'Mel Gibson', 'Joanne Samuel']
+    })
+    store_dir = "{}/{}".format(tmpdir, 'store')
+    data_store.write_data_store(store_dir, movies_df, performances_df, actors_df)
+
+    actor_ids, actor_names = data_store.map_actor_names(store_dir)
+
+    assert actor_ids.tolist() == [154, 621, 661]
+    assert [actor_names[row] for row in range(len(actor_names))] == ['Mel Gibson', 'Joanne Samuel', 'Tina Turner']
+
+
+def test_memory_maps_fixed_width_columns(tmpdir, tables):
+    store_dir = "{}/{}".format(tmpdir, 'store')
+    data_store.write_data_store(store_dir, *tables)
+
+    mapped_performances = data_store.read_table(store_dir, data_store.PERFORMANCES_TABLE, mmap=True)
+
+    assert isinstance(mapped_performances.tconst.to_numpy().base, np.memmap)
+    assert not mapped_performances.tconst.to_numpy().flags.writeable
+    assert mapped_performances.to_dict('list') == data_store.read_table(store_dir,
+                                                                        data_store.PERFORMANCES_TABLE).to_dict('list')
+
+
+def test_leaves_string_columns_mapped_and_decodes_only_rows_asked_for(tmpdir, tables):
+    store_dir = "{}/{}".format(tmpdir, 'store')
+    data_store.write_data_store(store_dir, *tables)
+
+    mapped_movies = data_store.read_table(store_dir, data_store.MOVIES_TABLE, mmap=True)
+    movies = data_store.read_table(store_dir, data_store.MOVIES_TABLE)
+
+    assert 'primaryTitle' not in mapped_movies.columns
+    assert data_store.has_string_column(mapped_movies, 'primaryTitle')
+    assert isinstance(mapped_movies.attrs[data_store.MAPPED_COLUMNS]['primaryTitle'].heap, np.memmap)
+    for rows in [[2, 0], [1], []]:
+        assert data_store.get_string_values(mapped_movies, 'primaryTitle', rows).tolist() == \
+            data_store.get_string_values(movies, 'primaryTitle', rows).tolist()
+    # the mapped columns go along with any selection of the table's rows
+    selected_movies = mapped_movies[mapped_movies.startYear > 1979]
+    assert data_store.get_string_values(selected_movies, 'titlePattern', [0]).tolist() == \
+        ['xxx xxx x: xxx xxxx xxxxxxx']
+
+
+def test_rewriting_store_leaves_mapped_columns_readable(tmpdir, tables):
+    movies_df, performances_df, actors_df = tables
+    store_dir = "{}/{}".format(tmpdir, 'store')
+    data_store.write_data_store(store_dir, movies_df, performances_df, actors_df)
+    mapped_performances = data_store.read_table(store_dir, data_store.PERFORMANCES_TABLE, mmap=True)
+
+    # fewer performances, so a column file rewritten in place would be truncated under the mapping
+    data_store.write_data_store(store_dir, movies_df, performances_df.iloc[:1], actors_df)
+
+    assert mapped_performances.tconst.to_list() == [79501, 79501, 82694]
+    assert data_store.read_table(store_dir, data_store.PERFORMANCES_TABLE).tconst.to_list() == [79501]
+    assert not [file_name for _, _, file_names in os.walk(store_dir) for file_name in file_names
+                if file_name.endswith('.partial')]
+
+
+def test_writes_incidence_index_against_stored_movie_rows(tmpdir, tables):
+    store_dir = "{}/{}".format(tmpdir, 'store')
+    data_store.write_data_store(store_dir, *tables)
+
+    incidence_arrays = data_store.read_index(store_dir, data_store.INCIDENCE_INDEX)
+
+    assert incidence_arrays['actor_ids'].tolist() == [154, 621]
+    # Mel Gibson is in the second and third stored movies, Joanne Samuel only the second
+    assert incidence_arrays['indptr'].tolist() == [0, 2, 3]
+    assert incidence_arrays['indices'].tolist() == [1, 2, 1]
+    assert incidence_arrays['indices'].dtype == incidence_arrays['indptr'].dtype
+
+
+def test_writes_filmography_index_against_stored_rows(tmpdir, tables):
+    store_dir = "{}/{}".format(tmpdir, 'store')
+    data_store.write_data_store(store_dir, *tables)
+
+    filmography_arrays = data_store.read_index(store_dir, data_store.FILMOGRAPHY_INDEX)
+
+    assert filmography_arrays['actor_ids'].tolist() == [154, 621]
+    # Mel Gibson gave the first and third stored performances, in the second and third stored movies
+    assert filmography_arrays['indptr'].tolist() == [0, 2, 3]
+    assert filmography_arrays['performance_rows'].tolist() == [0, 2, 1]
+    assert filmography_arrays['movie_rows'].tolist() == [1, 2, 1]
+
+
+def test_reads_only_the_partitions_for_the_given_years(tmpdir, tables):
+    movies_df, _, actors_df = tables
+    performances_df = pd.DataFrame(data={
+        'tconst': ['tt0082694', 'tt0079501', 'tt0082694', 'tt0000001'],
+        'nconst': ['nm0000154', 'nm0000154', 'nm0000621', 'nm0000621'],
+        'characters': ['["Max Rockatansky"]', '["Max"]', '["Jessie"]', '\\N']
+    })
+    store_dir = "{}/{}".format(tmpdir, 'store')
+    data_store.write_data_store(store_dir, movies_df, performances_df, actors_df)
+
+    movies_in_years = data_store.read_table(store_dir, data_store.MOVIES_TABLE, years={1981, 1979, 2022})
+    performances_in_years = data_store.read_table(store_dir, data_store.PERFORMANCES_TABLE, years={1981})
+
+    assert movies_in_years[['tconst', 'startYear']].to_dict('list') == {
+        'tconst': [79501, 82694],
+        'startYear': [1979, 1981]
+    }
+    assert performances_in_years.to_dict('list') == {
+        'tconst': [82694, 82694],
+        'nconst': [154, 621]
+    }
+    # indexed by the rows they are stored at, so their mapped characters can be read later on
+    assert data_store.get_string_values(performances_in_years, 'characters', [0, 1]).tolist() == \
+        ['["Max Rockatansky"]', '["Jessie"]']
+    assert data_store.read_table(store_dir, data_store.MOVIES_TABLE, years=set()).shape[0] == 0
+
+
+def test_refresh_moves_performances_of_movie_that_changed_year(tmpdir, tables):
+    movies_df, performances_df, actors_df = tables
+    store_dir = "{}/{}".format(tmpdir, 'store')
+    data_store.write_data_store(store_dir, movies_df, performances_df, actors_df)
+    refreshed_movies_df = data_store.read_table(store_dir, data_store.MOVIES_TABLE)
+    refreshed_movies_df.loc[refreshed_movies_df.tconst == 82694, 'startYear'] = 1982
+
+    data_store.update_data_store(store_dir, {data_store.MOVIES_TABLE: refreshed_movies_df}, {})
+
+    assert data_store.read_table(store_dir, data_store.PERFORMANCES_TABLE, years={1982},
+                                 columns=['tconst', 'nconst', 'characters']).to_dict('list') == {
+        'tconst': [82694],
+        'nconst': [154],
+        'characters': ['["Max Rockatansky"]']
+    }
+    assert data_store.read_table(store_dir, data_store.PERFORMANCES_TABLE, years={1981}).shape[0] == 0
+
+
+def test_stores_movies_in_rating_order_within_each_year(tmpdir, tables):
+    _, performances_df, actors_df = tables
+    movies_df = pd.DataFrame(data={
+        'tconst': ['tt0000003', 'tt0000002', 'tt0000001', 'tt0000004'],
+        'primaryTitle': ['C', 'B', 'A', 'D'],
+        'titlePattern': ['x', 'x', 'x', 'x'],
+        'startYear': ['1981', '1979', '1981', '1979'],
+        'averageRating': [7.6, 6.8, 5.2, 6.1]
+    })
+    store_dir = "{}/{}".format(tmpdir, 'store')
+    manifest = data_store.write_data_store(store_dir, movies_df, performances_df, actors_df)
+
+    stored_movies = data_store.read_table(store_dir, data_store.MOVIES_TABLE)
+
+    assert stored_movies.primaryTitle.to_list() == ['D', 'B', 'A', 'C']
+    assert manifest['tables'][data_store.MOVIES_TABLE]['partitions'] == {'1979': [0, 2], '1981': [2, 4]}
@@ -0,0 +1,247 @@
+import hashlib
+import http.server
+import os
+import threading
+
+import pandas as pd
+
+import pytest
+
+import data_store
+import imdb_data_grabber
+
+# small enough to force the raw files to be read a row or two at a time
+TINY_MEMORY_LIMIT_MB = 0.001
+
+
+@pytest.fixture()
+def raw_movies_file(tmpdir):
+    movies_file_path = "{}/{}".format(tmpdir, 'title.basics.tsv.gz')
+    pd.DataFrame(data={
+        'tconst': ['tt0079501', 'tt0082694', 'tt0096697', 'tt0089530'],
+        'titleType': ['movie', 'movie', 'tvSeries', 'movie'],
+        'primaryTitle': ['Mad Max', 'Mad Max 2', 'The Simpsons', 'Mad Max Beyond Thunderdome'],
+        'originalTitle': ['Mad Max', 'Mad Max 2', 'The Simpsons', 'Mad Max Beyond Thunderdome'],
+        'isAdult': ['0', '0', '0', '0'],
+        'startYear': ['1979', '1981', '1989', '1985'],
+        'endYear': ['\\N', '\\N', '\\N', '\\N'],
+        'runtimeMinutes': ['88', '96', '22', '107'],
+        'genres': ['Action', 'Action', 'Animation', 'Action']
+    }).to_csv(movies_file_path, sep='\t', compression='gzip', index=False)
+    yield movies_file_path
+
+
+@pytest.fixture()
+def raw_performances_file(tmpdir):
+    performances_file_path = "{}/{}".format(tmpdir, 'title.principals.tsv.gz')
+    pd.DataFrame(data={
+        'tconst': ['tt0079501', 'tt0079501', 'tt0096697', 'tt0082694', 'tt0089530'],
+        'ordering': ['1', '2', '1', '1', '10'],
+        'nconst': ['nm0000154', 'nm0000621', 'nm0144657', 'nm0000154', 'nm0001234'],
+        'category': ['actor', 'actress', 'actor', 'actor', 'director'],
+        'job': ['\\N', '\\N', '\\N', '\\N', '\\N'],
+        'characters': ['["Max"]', '["Jessie"]', '["Homer"]', '["Max"]', '\\N']
+    }).to_csv(performances_file_path, sep='\t', compression='gzip', index=False)
+    yield performances_file_path
+
+
+def test_filters_movies_file_in_chunks(raw_movies_file):
+    movies_df = imdb_data_grabber.filter_movies_file(raw_movies_file, TINY_MEMORY_LIMIT_MB)
+
+    expected_movies = {
+        'tconst': ['tt0079501', 'tt0082694', 'tt0089530'],
+        'primaryTitle': ['Mad Max', 'Mad Max 2', 'Mad Max Beyond Thunderdome'],
+        'startYear': ['1979', '1981', '1985']
+    }
+    assert movies_df.to_dict('list') == expected_movies
+    assert pd.read_csv(raw_movies_file, sep='\t', dtype=str).to_dict('list') == expected_movies
+
+
+def test_filters_performances_file_in_chunks_against_movie_ids(raw_movies_file, raw_performances_file):
+    movies_df = imdb_data_grabber.filter_movies_file(raw_movies_file, TINY_MEMORY_LIMIT_MB)
+
+    performances_df = imdb_data_grabber.filter_performances_file(raw_performances_file,
+                                                                 movies_dataframe=movies_df,
+                                                                 memory_limit_mb=TINY_MEMORY_LIMIT_MB)
+
+    assert performances_df.to_dict('list') == {
+        'tconst': ['tt0079501', 'tt0079501', 'tt0082694'],
+        'nconst': ['nm0000154', 'nm0000621', 'nm0000154']
+    }
+    assert pd.read_csv(raw_performances_file, sep='\t', dtype=str).to_dict('list') == {
+        'tconst': ['tt0079501', 'tt0079501', 'tt0082694'],
+        'nconst': ['nm0000154', 'nm0000621', 'nm0000154'],
+        'characters': ['["Max"]', '["Jessie"]', '["Max"]']
+    }
+
+
+def test_chunk_size_shrinks_with_memory_limit(raw_performances_file):
+    column_types = {'tconst': str, 'nconst': str}
+
+    small_chunk_rows = imdb_data_grabber.rows_per_chunk(raw_performances_file, column_types, 1)
+    large_chunk_rows = imdb_data_grabber.rows_per_chunk(raw_performances_file, column_types, 100)
+
+    assert 1 < small_chunk_rows < large_chunk_rows
+
+
+class StandInImdbHandler(http.server.BaseHTTPRequestHandler):
+    files = {}
+    requests_seen = []
+
+    def do_GET(self):
+        self.requests_seen.append(dict(self.headers))
+        content = self.files[self.path.lstrip('/')]
+        etag = '"{}"'.format(hashlib.md5(content).hexdigest())
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        start = 0
+        if self.headers.get('Range') and self.headers.get('If-Range') == etag:
+            start = int(self.headers['Range'].split('=')[1].rstrip('-'))
+            self.send_response(206)
+            self.send_header('Content-Range', "bytes {}-{}/{}".format(start, len(content) - 1, len(content)))
+        else:
+            self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(content) - start))
+        self.end_headers()
+        self.wfile.write(content[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def stand_in_imdb_server():
+    StandInImdbHandler.files = {'title.ratings.tsv.gz': os.urandom(100000)}
+    StandInImdbHandler.requests_seen = []
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StandInImdbHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield "http://127.0.0.1:{}".format(server.server_address[1])
+    server.shutdown()
+
+
+def test_downloads_file_and_records_it_in_manifest(tmpdir, stand_in_imdb_server):
+    downloaded_files = imdb_data_grabber.download_files(str(tmpdir), {
+        'title.ratings.tsv.gz': "{}/title.ratings.tsv.gz".format(stand_in_imdb_server)
+    })
+
+    content = StandInImdbHandler.files['title.ratings.tsv.gz']
+    assert downloaded_files == {'title.ratings.tsv.gz'}
+    assert tmpdir.join('title.ratings.tsv.gz').read_binary() == content
+    download_record = imdb_data_grabber.read_download_manifest(str(tmpdir))['title.ratings.tsv.gz']
+    assert download_record['md5'] == hashlib.md5(content).hexdigest()
+    assert download_record['etag'] == '"{}"'.format(hashlib.md5(content).hexdigest())
+    assert download_record['size'] == len(content)
+
+
+def test_does_not_download_unchanged_file_again(tmpdir, stand_in_imdb_server):
+    file_urls = {'title.ratings.tsv.gz': "{}/title.ratings.tsv.gz".format(stand_in_imdb_server)}
+    imdb_data_grabber.download_files(str(tmpdir), file_urls)
+
+    assert imdb_data_grabber.download_files(str(tmpdir), file_urls) == set()
+    assert StandInImdbHandler.requests_seen[-1]['If-None-Match'] is not None
+
+    StandInImdbHandler.files['title.ratings.tsv.gz'] = os.urandom(1000)
+    assert imdb_data_grabber.download_files(str(tmpdir), file_urls) == {'title.ratings.tsv.gz'}
+    assert tmpdir.join('title.ratings.tsv.gz').read_binary() == StandInImdbHandler.files['title.ratings.tsv.gz']
+
+
+def test_resumes_interrupted_download(tmpdir, stand_in_imdb_server):
+    content = StandInImdbHandler.files['title.ratings.tsv.gz']
+    tmpdir.join('title.ratings.tsv.gz.part').write_binary(content[:40000])
+    imdb_data_grabber.update_download_record(str(tmpdir), 'title.ratings.tsv.gz.part', {
+        'etag': '"{}"'.format(hashlib.md5(content).hexdigest())
+    })
+
+    imdb_data_grabber.download_file(str(tmpdir.join('title.ratings.tsv.gz')),
+                                    "{}/title.ratings.tsv.gz".format(stand_in_imdb_server))
+
+    assert StandInImdbHandler.requests_seen[-1]['Range'] == 'bytes=40000-'
+    assert tmpdir.join('title.ratings.tsv.gz').read_binary() == content
+    assert not tmpdir.join('title.ratings.tsv.gz.part').exists()
+    assert imdb_data_grabber.read_download_manifest(str(tmpdir))['title.ratings.tsv.gz']['md5'] == \
+        hashlib.md5(content).hexdigest()
+
+
+def write_raw_imdb_files(raw_dir, ratings, performances):
+    os.makedirs(raw_dir, exist_ok=True)
+    pd.DataFrame(data={
+        'tconst': ['tt0079501', 'tt0082694', 'tt0089530'],
+        'titleType': ['movie', 'movie', 'movie'],
+        'primaryTitle': ['Mad Max', 'Mad Max 2', 'Mad Max Beyond Thunderdome'],
+        'startYear': ['1979', '1981', '1985'],
+    }).to_csv(os.path.join(raw_dir, imdb_data_grabber.MOVIES_FILE_NAME), sep='\t', compression='gzip', index=False)
+    pd.DataFrame(data={
+        'tconst': list(ratings.keys()),
+        'averageRating': list(ratings.values()),
+    }).to_csv(os.path.join(raw_dir, imdb_data_grabber.REVIEWS_FILE_NAME), sep='\t', compression='gzip', index=False)
+    pd.DataFrame(data={
+        'tconst': [tconst for tconst, _, _ in performances],
+        'nconst': [nconst for _, nconst, _ in performances],
+        'category': ['actor'] * len(performances),
+        'characters': [characters for _, _, characters in performances],
+    }).to_csv(os.path.join(raw_dir, imdb_data_grabber.PERFORMANCES_FILE_NAME), sep='\t', compression='gzip',
+              index=False)
+    pd.DataFrame(data={
+        'nconst': ['nm0000154', 'nm0000621', 'nm0000661'],
+        'primaryName': ['Mel Gibson', 'Joanne Samuel', 'Tina Turner'],
+        'primaryProfession': ['actor', 'actress', 'actress,soundtrack'],
+    }).to_csv(os.path.join(raw_dir, imdb_data_grabber.ACTORS_FILE_NAME), sep='\t', compression='gzip', index=False)
+
+
+def build_store_from_raw_files(raw_dir, data_dir):
+    os.makedirs(data_dir, exist_ok=True)
+    imdb_data_grabber.filter_downloaded_files(raw_dir, data_dir, TINY_MEMORY_LIMIT_MB)
+    store_dir = os.path.join(data_dir, 'store')
+    imdb_data_grabber.build_data_store(store_dir,
+                                       os.path.join(data_dir, imdb_data_grabber.MOVIES_FILE_NAME),
+                                       os.path.join(data_dir, imdb_data_grabber.PERFORMANCES_FILE_NAME),
+                                       os.path.join(data_dir, imdb_data_grabber.ACTORS_FILE_NAME))
+    return store_dir
+
+
+def sorted_table(store_dir, table_name):
+    table_df = data_store.read_table(store_dir, table_name)
+    return table_df.sort_values(table_df.columns.to_list()).reset_index(drop=True).to_dict('list')
+
+
+def test_incremental_refresh_matches_full_rebuild(tmpdir):
+    data_dir, raw_dir = str(tmpdir.join('data')), str(tmpdir.join('data', 'raw'))
+    write_raw_imdb_files(raw_dir,
+                         {'tt0079501': 6.8, 'tt0082694': 7.6},
+                         [('tt0079501', 'nm0000154', '["Max"]'), ('tt0082694', 'nm0000154', '["Max"]')])
+    store_dir = build_store_from_raw_files(raw_dir, data_dir)
+
+    # a rating changes, and a newly rated movie brings a new performance by a new actor with it
+    write_raw_imdb_files(raw_dir,
+                         {'tt0079501': 6.9, 'tt0082694': 7.6, 'tt0089530': 6.3},
+                         [('tt0079501', 'nm0000154', '["Max"]'), ('tt0082694', 'nm0000154', '["Max"]'),
+                          ('tt0089530', 'nm0000661', '["Aunty Entity"]')])
+    manifest = imdb_data_grabber.refresh_data_store(store_dir, raw_dir, data_dir,
+                                                    {imdb_data_grabber.REVIEWS_FILE_NAME,
+                                                     imdb_data_grabber.PERFORMANCES_FILE_NAME},
+                                                    TINY_MEMORY_LIMIT_MB)
+
+    assert manifest['dataset_version'] == 2
+    assert manifest['last_refresh']['movies'] == {'added': 1, 'removed': 0, 'changed': 1, 'ratings_changed': 1}
+    assert manifest['last_refresh']['performances'] == {'added': 1, 'removed': 0}
+    assert manifest['last_refresh']['actors'] == {'added': 1, 'removed': 0, 'changed': 0}
+    rebuilt_store_dir = build_store_from_raw_files(raw_dir, str(tmpdir.join('rebuilt')))
+    for table_name in [data_store.MOVIES_TABLE, data_store.PERFORMANCES_TABLE, data_store.ACTORS_TABLE]:
+        assert sorted_table(store_dir, table_name) == sorted_table(rebuilt_store_dir, table_name)
+
+
+def test_refresh_without_differences_rewrites_no_tables(tmpdir):
+    data_dir, raw_dir = str(tmpdir.join('data')), str(tmpdir.join('data', 'raw'))
+    write_raw_imdb_files(raw_dir, {'tt0079501': 6.8}, [('tt0079501', 'nm0000154', '["Max"]')])
+    store_dir = build_store_from_raw_files(raw_dir, data_dir)
+    movies_column_file = os.path.join(store_dir, data_store.MOVIES_TABLE, 'tconst.npy')
+    os.utime(movies_column_file, (0, 0))
+
+    manifest = imdb_data_grabber.refresh_data_store(store_dir, raw_dir, data_dir,
+                                                    {imdb_data_grabber.REVIEWS_FILE_NAME}, TINY_MEMORY_LIMIT_MB)
+
+    assert manifest['last_refresh']['movies'] == {'added': 0, 'removed': 0, 'changed': 0, 'ratings_changed': 0}
+    assert os.path.getmtime(movies_column_file) == 0
@@ -1,6 +1,13 @@
+import functools
+import http.server
 import os
+import re
+import shutil
+import threading
+import urllib.request
 
 import pytest
+from selenium.common.exceptions import NoSuchElementException, TimeoutException
 
 import movie_clues
 from movie_clues import MovieClue
@@ -76,3 +83,81 @@ def test_round_trip_serialisation_preserves_clues_list(tmpdir):
 
     round_tripped_clues = movie_clues.read_movie_clues_file(clues_file_path)
     assert round_tripped_clues == clues_list
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+FIXTURE_CLUES = [
+    MovieClue('xxx xxxxxxxxxxx', '2002', 'Action,Crime,Thriller', 7.1),
+    MovieClue('xxxxx xxx', '1996', 'Comedy', 5.4)
+]
+
+
+class FixtureDriver:
+    """Stands in for a browser, reading pages straight from the fixture server."""
+    instances = []
+
+    def __init__(self):
+        self.page_source = ''
+        self.title = ''
+        self.requested_urls = []
+        self.quit_called = False
+        FixtureDriver.instances.append(self)
+
+    def get(self, url):
+        self.requested_urls.append(url)
+        with urllib.request.urlopen(url) as response:
+            self.page_source = response.read().decode('utf-8')
+        self.title = re.search('<title>(.*)</title>', self.page_source).group(1)
+
+    def find_element(self, by, value):
+        if '<td' not in self.page_source:
+            raise NoSuchElementException(value)
+        return value
+
+    def quit(self):
+        self.quit_called = True
+
+
+@pytest.fixture
+def fixture_server_url():
+    handler = functools.partial(http.server.SimpleHTTPRequestHandler, directory=FIXTURES_DIR)
+    server = http.server.HTTPServer(('127.0.0.1', 0), handler)
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    yield "http://127.0.0.1:{}/actorle.html".format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+
+def test_clues_fetcher_reuses_driver_and_caches_clues_by_date(tmpdir, fixture_server_url):
+    FixtureDriver.instances = []
+    with movie_clues.CluesFetcher(fixture_server_url, str(tmpdir), driver_factory=FixtureDriver) as fetcher:
+        assert fetcher.fetch('2022-03-17') == FIXTURE_CLUES
+        assert 'page_load' in fetcher.timings
+        assert os.path.isfile(movie_clues.get_clues_file_path(str(tmpdir), '2022-03-17'))
+
+        # a second day's fetch goes back to the website, but through the same browser
+        assert fetcher.fetch('2022-03-18') == FIXTURE_CLUES
+        # while a day that has already been fetched is read from its clues file
+        assert fetcher.fetch('2022-03-17') == FIXTURE_CLUES
+        assert 'page_load' not in fetcher.timings
+
+    assert len(FixtureDriver.instances) == 1
+    driver = FixtureDriver.instances[0]
+    assert driver.requested_urls == [fixture_server_url, fixture_server_url]
+    assert driver.quit_called
+
+
+def test_clues_fetcher_times_out_when_clue_table_never_renders(tmpdir, fixture_server_url):
+    missing_page_url = fixture_server_url.replace('actorle.html', '')
+    with movie_clues.CluesFetcher(missing_page_url, str(tmpdir), timeout=0.2, driver_factory=FixtureDriver) as fetcher:
+        with pytest.raises(TimeoutException):
+            fetcher.fetch('2022-03-17')
+    assert not os.listdir(str(tmpdir))
+
+
+@pytest.mark.skipif(not shutil.which('google-chrome') and not shutil.which('chromium'),
+                    reason="needs a Chrome browser to drive")
+def test_clues_fetcher_reads_clues_with_headless_chrome(tmpdir, fixture_server_url):
+    with movie_clues.CluesFetcher(fixture_server_url, str(tmpdir)) as fetcher:
+        assert fetcher.fetch('2022-03-17') == FIXTURE_CLUES
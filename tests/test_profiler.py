@@ -0,0 +1,82 @@
+import json
+import os
+
+import pandas as pd
+
+import actorle_solver
+import profiler
+from movie_clues import MovieClue
+
+
+def test_stages_are_not_recorded_when_profiling_is_off():
+    with profiler.profile_stage('read_movies') as stage:
+        stage['rows'] = 10
+    profile = profiler.start_profiling('test')
+    profiler.stop_profiling()
+    assert profile.stages == []
+
+
+def test_profile_records_stages_with_row_counts_and_peak_memory():
+    profile = profiler.start_profiling('test')
+    try:
+        with profiler.profile_stage('read_movies') as stage:
+            stage['rows'] = 10
+        with profiler.profile_stage('read_movies') as stage:
+            stage['rows'] = 5
+        with profiler.profile_stage('resolve_names'):
+            pass
+    finally:
+        profiler.stop_profiling()
+
+    profile_dict = profile.to_dict()
+    assert [stage['name'] for stage in profile_dict['stages']] == ['read_movies', 'read_movies', 'resolve_names']
+    assert all(stage['peak_rss_bytes'] > 0 for stage in profile_dict['stages'])
+    assert profile_dict['counters']['read_movies']['calls'] == 2
+    assert profile_dict['counters']['read_movies']['rows'] == 15
+    assert profile_dict['counters']['resolve_names']['rows'] == 0
+
+
+def test_profile_exports_chrome_trace_and_prometheus_counters():
+    profile = profiler.start_profiling('test')
+    try:
+        with profiler.profile_stage('read_movies') as stage:
+            stage['rows'] = 10
+    finally:
+        profiler.stop_profiling()
+
+    trace_event = profile.to_chrome_trace()['traceEvents'][0]
+    assert trace_event['name'] == 'read_movies'
+    assert trace_event['ph'] == 'X'
+    assert trace_event['dur'] >= 0
+    assert trace_event['args']['rows'] == 10
+
+    metrics = profile.to_prometheus().splitlines()
+    assert '# TYPE knacktorle_stage_rows_total counter' in metrics
+    assert 'knacktorle_stage_rows_total{run="test",stage="read_movies"} 10' in metrics
+    assert 'knacktorle_stage_calls_total{run="test",stage="read_movies"} 1' in metrics
+    assert any(line.startswith('knacktorle_peak_rss_bytes{run="test"} ') for line in metrics)
+
+
+def test_profiling_a_solve_writes_its_stages_out(tmpdir):
+    movies_df = pd.DataFrame(data={
+        'tconst': [1, 2, 3],
+        'primaryTitle': ['Mad Max', 'Bad Cat', 'Heat'],
+        'startYear': ['1979', '1979', '1995'],
+        'averageRating': [6.8, 6.8, 8.3]
+    })
+    performances_df = pd.DataFrame(data={
+        'tconst': [1, 2, 3],
+        'nconst': [10, 10, 20],
+    })
+    puzzle_clues = [MovieClue('xxx xxx', '1979', 'Action', 6.8)]
+    profile_dir = os.path.join(str(tmpdir), 'profile')
+
+    with profiler.profiling('actorle_solver', profile_dir):
+        actorle_solver.get_most_likely_actors_for_clues(puzzle_clues, movies_df, performances_df, 3, 0.1)
+
+    assert sorted(os.listdir(profile_dir)) == ['metrics.prom', 'profile.json', 'trace.json']
+    with open(os.path.join(profile_dir, profiler.PROFILE_FILE_NAME)) as profile_file:
+        stages = {stage['name']: stage for stage in json.load(profile_file)['stages']}
+    assert set(stages) == {'build_title_index', 'build_incidence_matrix', 'match_titles', 'count_performances'}
+    assert stages['match_titles']['rows'] == 2
+    assert stages['count_performances']['rows'] == 2
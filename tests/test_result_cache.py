@@ -0,0 +1,113 @@
+import os
+import shutil
+
+import pandas as pd
+
+import actorle_solver
+import data_store
+from movie_clues import MovieClue, write_movie_clues_file
+from result_cache import ResultCache, get_data_version
+
+PUZZLE_CLUES = [MovieClue('xxx xxx', '1979', 'Action', 6.8)]
+SOLVE_PARAMS = {'num_options': 3, 'rating_tolerance': 0.1}
+
+
+def test_cached_result_is_only_found_for_the_same_clues_and_parameters(tmpdir):
+    result_cache = ResultCache(str(tmpdir), {'dataset_version': 1})
+
+    result_cache.put(PUZZLE_CLUES, SOLVE_PARAMS, {'answer': 'Mel Gibson'})
+
+    assert result_cache.get(PUZZLE_CLUES, SOLVE_PARAMS) == {'answer': 'Mel Gibson'}
+    assert result_cache.get(PUZZLE_CLUES, dict(SOLVE_PARAMS, num_options=5)) is None
+    assert result_cache.get([MovieClue('xxx xxx', '1979', 'Action', 6.9)], SOLVE_PARAMS) is None
+    assert (result_cache.hits, result_cache.misses) == (1, 2)
+
+
+def test_new_data_version_invalidates_cached_results(tmpdir):
+    ResultCache(str(tmpdir), {'dataset_version': 1}).put(PUZZLE_CLUES, SOLVE_PARAMS, {'answer': 'Mel Gibson'})
+    refreshed_result_cache = ResultCache(str(tmpdir), {'dataset_version': 2})
+
+    assert refreshed_result_cache.get(PUZZLE_CLUES, SOLVE_PARAMS) is None
+    refreshed_result_cache.put(PUZZLE_CLUES, SOLVE_PARAMS, {'answer': 'Tina Turner'})
+    assert len(os.listdir(str(tmpdir))) == 1
+
+
+def test_new_data_version_leaves_cached_results_of_other_data_sources(tmpdir):
+    ResultCache(str(tmpdir), {'dataset_version': 1}, {'data_store': '/data/store'}) \
+        .put(PUZZLE_CLUES, SOLVE_PARAMS, {'answer': 'Mel Gibson'})
+    other_result_cache = ResultCache(str(tmpdir), {'dataset_version': 1}, {'data_store': '/data/other-store'})
+    other_result_cache.put(PUZZLE_CLUES, SOLVE_PARAMS, {'answer': 'Tina Turner'})
+
+    ResultCache(str(tmpdir), {'dataset_version': 2}, {'data_store': '/data/store'}) \
+        .put(PUZZLE_CLUES, SOLVE_PARAMS, {'answer': 'Joanne Samuel'})
+
+    assert len(os.listdir(str(tmpdir))) == 2
+    assert other_result_cache.get(PUZZLE_CLUES, SOLVE_PARAMS) == {'answer': 'Tina Turner'}
+
+
+def test_data_version_of_tsv_files_changes_when_they_are_rewritten(tmpdir):
+    data_files = [str(tmpdir.join(file_name)) for file_name in ['movies.tsv', 'performances.tsv', 'actors.tsv']]
+    for data_file in data_files:
+        tmpdir.join(os.path.basename(data_file)).write('tconst\n')
+    data_version = get_data_version(*data_files)
+
+    tmpdir.join('movies.tsv').write('tconst\n79501\n')
+
+    assert get_data_version(*data_files) != data_version
+
+
+def make_single_solve_args(tmpdir):
+    # the data files are not valid IMDb data, so reading them in would fail
+    data_files = [str(tmpdir.join(file_name)) for file_name in ['movies.tsv', 'performances.tsv', 'actors.tsv']]
+    for data_file in data_files:
+        tmpdir.join(os.path.basename(data_file)).write('not IMDb data')
+    clues_file = str(tmpdir.join('actorle-2022-03-18.txt'))
+    write_movie_clues_file(clues_file, PUZZLE_CLUES)
+    return {'clues_file': clues_file, 'clues_cache_dir': str(tmpdir), 'write_clues_file': None,
+            'movies_file': data_files[0], 'performances_file': data_files[1], 'actors_file': data_files[2],
+            'data_store': None, 'num_options': 3, 'rating_tolerance': 0.1, 'tolerance_sweep': None,
+            'result_cache_dir': str(tmpdir.join('results'))}
+
+
+def test_cached_puzzle_is_answered_without_loading_any_imdb_data(tmpdir, capsys):
+    args = make_single_solve_args(tmpdir)
+    cached_result = {'number_of_clues': 1, 'answer': 'Mel Gibson',
+                     'options': [{'nconst': 'nm0000154', 'name': 'Mel Gibson', 'clue_matches': 1,
+                                  'percent_match': 100.0}],
+                     'actor_roles': [{'Movie': 'Mad Max', 'Year': '1979', 'Character': '["Max"]'}]}
+    actorle_solver.make_result_cache(args).put(PUZZLE_CLUES, actorle_solver.get_solve_params(args),
+                                               cached_result)
+
+    assert actorle_solver.solve_single_puzzle(args) == cached_result
+    assert "Dude - I think it's... Mel Gibson!" in capsys.readouterr().out
+
+
+def test_puzzle_solved_in_a_batch_is_answered_from_the_cache_when_solved_alone(tmpdir):
+    args = make_single_solve_args(tmpdir)
+    roles = [{'Movie': 'Mad Max', 'Year': '1979', 'Character': '["Max"]'}]
+    answer = {'number_of_clues': 1, 'answer': 'Mel Gibson',
+              'options': [{'nconst': 'nm0000154', 'name': 'Mel Gibson', 'clue_matches': 1, 'percent_match': 100.0,
+                           'roles': roles}],
+              'actor_roles': roles}
+    batch_result = dict(answer, puzzle='mad-max.txt', clues_file='clues/mad-max.txt', duration_seconds=1.5,
+                        timings={'ranking_seconds': 1.0, 'naming_seconds': 0.5})
+    actorle_solver.cache_results({'clues/mad-max.txt': PUZZLE_CLUES}, [batch_result],
+                                 actorle_solver.make_result_cache(args), actorle_solver.get_solve_params(args))
+
+    assert actorle_solver.solve_single_puzzle(args) == answer
+
+
+def test_data_version_of_store_changes_when_it_is_deleted_and_rebuilt(tmpdir):
+    tables = (pd.DataFrame(data={'tconst': ['tt0079501'], 'primaryTitle': ['Mad Max'], 'titlePattern': ['xxx xxx'],
+                                 'startYear': ['1979'], 'averageRating': [6.8]}),
+              pd.DataFrame(data={'tconst': ['tt0079501'], 'nconst': ['nm0000154'], 'characters': ['["Max"]']}),
+              pd.DataFrame(data={'nconst': ['nm0000154'], 'primaryName': ['Mel Gibson']}))
+    store_dir = str(tmpdir.join('store'))
+    data_store.write_data_store(store_dir, *tables)
+    data_version = get_data_version(None, None, None, store_dir)
+
+    shutil.rmtree(store_dir)
+    data_store.write_data_store(store_dir, *tables)
+
+    assert data_store.get_dataset_version(store_dir) == data_version['dataset_version']
+    assert get_data_version(None, None, None, store_dir) != data_version